@@ -5,3 +5,12 @@ class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
 
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .timing import install_query_timer
+
+        if 'api.middleware.RequestTimingMiddleware' in settings.MIDDLEWARE:
+            connection_created.connect(install_query_timer)
@@ -0,0 +1,186 @@
+"""
+Native async versions of the read-heavy GET endpoints, for ASGI servers.
+
+The services and barber lists, barber availability and dashboard stats read
+through Django's async ORM and cache APIs, so a request waiting on the
+database gives the event loop back instead of holding a worker thread. They
+return the same bodies, validators and cache headers as the DRF views they
+stand in for; other methods on the same URLs are passed on to those views.
+They are routed when ASYNC_READ_VIEWS is on (see api.urls).
+"""
+from datetime import datetime
+from functools import wraps
+from math import ceil
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response
+from rest_framework import exceptions
+from rest_framework.authentication import get_authorization_header
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from users.availability import SLOT_MINUTES, aget_availability_index
+from users.models import BarberProfile, Service
+from users.stats import aget_dashboard_stats
+from .authentication import CachedTokenAuthentication
+from .mixins import list_state_aggregates, list_etag, patch_list_headers
+from .serializers import BarberProfileSerializer, ServiceSerializer
+from .views import (
+    BarberProfileViewSet, ServiceViewSet, availability_data, service_durations,
+    visible_barber_profiles, visible_services
+)
+
+
+async def aauthenticate(request):
+    """
+    User of the request, from its token (through the token cache) or its
+    session, like the default DRF authentication classes
+    """
+    authentication = CachedTokenAuthentication()
+    header = get_authorization_header(request).split()
+    if header and header[0].lower() == authentication.keyword.lower().encode():
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        user, _ = await sync_to_async(authentication.authenticate_credentials)(
+            header[1].decode(errors='replace')
+        )
+        return user
+    return await sync_to_async(get_user)(request)
+
+
+def async_api_view(view):
+    """Turn API exceptions and Http404 into DRF-style JSON errors"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            response = JsonResponse({'detail': str(exc.detail)}, status=exc.status_code)
+            if exc.status_code == 401:
+                response['WWW-Authenticate'] = CachedTokenAuthentication.keyword
+            return response
+        except Http404 as exc:
+            return JsonResponse({'detail': str(exc) or "Not found."}, status=404)
+    return wrapper
+
+
+def get_or_fallback(async_view, sync_view):
+    """
+    Serve GET and HEAD with ``async_view`` and every other method with the
+    synchronous ``sync_view``
+    """
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await run_sync_view(request, *args, **kwargs)
+
+    run_sync_view = sync_to_async(sync_view)
+    # DRF views handle CSRF themselves
+    view.csrf_exempt = True
+    # Same metric labels as the DRF view (see api.timing.view_labels)
+    view.cls = sync_view.cls
+    view.actions = sync_view.actions
+    return view
+
+
+async def paginated_list(request, user, queryset, serializer_class, validator_fields):
+    """
+    Page-number paginated list with the ETag of ConditionalListMixin;
+    the aggregate that yields them also gives the row count
+    """
+    state = await queryset.order_by().aaggregate(**list_state_aggregates(validator_fields))
+    etag = list_etag(request, user, 'json', state)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        count = state['rows']
+        page_size = api_settings.PAGE_SIZE
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError:
+            page = 0
+        if page < 1 or page > max(1, ceil(count / page_size)):
+            raise Http404("Invalid page.")
+
+        offset = (page - 1) * page_size
+        rows = [row async for row in queryset.order_by('pk')[offset:offset + page_size]]
+        url = request.build_absolute_uri()
+        previous = None
+        if page == 2:
+            previous = remove_query_param(url, 'page')
+        elif page > 2:
+            previous = replace_query_param(url, 'page', page - 1)
+        response = JsonResponse({
+            'count': count,
+            'next': replace_query_param(url, 'page', page + 1) if offset + page_size < count else None,
+            'previous': previous,
+            'results': serializer_class(rows, many=True).data,
+        })
+    patch_list_headers(response, user, etag)
+    return response
+
+
+@async_api_view
+async def service_list(request):
+    """Async GET /api/services/"""
+    user = await aauthenticate(request)
+    return await paginated_list(
+        request, user, visible_services(user),
+        ServiceSerializer, ServiceViewSet.validator_fields
+    )
+
+
+@async_api_view
+async def barber_list(request):
+    """Async GET /api/barbers/"""
+    user = await aauthenticate(request)
+    return await paginated_list(
+        request, user, visible_barber_profiles(user),
+        BarberProfileSerializer, BarberProfileViewSet.validator_fields
+    )
+
+
+@async_api_view
+async def barber_availability(request, pk):
+    """Async GET /api/barbers/{id}/availability/"""
+    user = await aauthenticate(request)
+    try:
+        barber_profile = await visible_barber_profiles(user).aget(pk=pk)
+    except (BarberProfile.DoesNotExist, ValueError):
+        raise Http404
+
+    date_str = request.GET.get('date')
+    if not date_str:
+        return JsonResponse({"error": "Parameter 'date' is required"}, status=400)
+    try:
+        appointment_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({"error": "Invalid date format. Use YYYY-MM-DD"}, status=400)
+
+    service_duration = SLOT_MINUTES
+    service_id = request.GET.get('service_id')
+    if service_id:
+        try:
+            service_duration = await service_durations().aget(id=service_id)
+        except (Service.DoesNotExist, ValueError):
+            return JsonResponse({"error": "Invalid service_id"}, status=400)
+
+    index = await aget_availability_index(barber_profile, appointment_date)
+    return JsonResponse(availability_data(
+        index, date_str, barber_profile.user.username, service_duration
+    ))
+
+
+barber_availability.cls = BarberProfileViewSet
+barber_availability.actions = {'get': 'availability'}
+
+
+@async_api_view
+async def dashboard_stats(request):
+    """Async GET /api/dashboard/stats/"""
+    user = await aauthenticate(request)
+    if not user.is_authenticated:
+        raise exceptions.NotAuthenticated
+    return JsonResponse(await aget_dashboard_stats(user))
@@ -0,0 +1,218 @@
+"""
+Token authentication with a cache in front of the token lookup.
+
+TokenAuthentication joins authtoken_token to the user table on every
+request. CachedTokenAuthentication keeps a snapshot of the token and of its
+user's fields instead, and builds fresh, unshared instances from it, so
+requests may mutate request.user freely. The password hash is left out of
+the snapshots. Snapshots live in the shared Django cache
+(TOKEN_AUTH_CACHE_BACKEND='shared', the default) or in a bounded in-process
+LRU ('local'), and expire after TOKEN_AUTH_CACHE_TTL seconds.
+
+Deleting a token (logout) or saving or deleting a user (deactivation,
+profile changes) drops the cached snapshots once the transaction commits,
+see api.signals. A local LRU only hears about the changes made in its own
+process, so gunicorn.conf.py refuses it with several workers. Both
+backends refuse the snapshot of a lookup that raced with an invalidation,
+the shared one with tombstones (see SharedTokenCache).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from barbershop import metrics
+
+
+# Never cached: loaded from the database if a request needs it
+SNAPSHOT_EXCLUDED_FIELDS = {'password'}
+
+# Seconds an invalidation blocks the snapshots of the lookups in flight,
+# far more than a lookup takes between its query and its cache write
+TOMBSTONE_TTL = 10
+
+
+def snapshot_fields(model):
+    return [
+        field.attname for field in model._meta.concrete_fields
+        if field.attname not in SNAPSHOT_EXCLUDED_FIELDS
+    ]
+
+
+class LocalTokenCache:
+    """Thread-safe LRU of token snapshots with a per-entry TTL"""
+    
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.user_keys = {}
+        # Bumped by every invalidation, so a lookup that raced with one
+        # does not store what it read before the change
+        self.generation = 0
+        self.lock = threading.Lock()
+    
+    def stamp(self):
+        return self.generation
+    
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user_id, snapshot = entry
+            if expires_at <= time.monotonic():
+                self._discard(key)
+                return None
+            self.entries.move_to_end(key)
+            return snapshot
+    
+    def set(self, key, user_id, snapshot, stamp=None):
+        with self.lock:
+            if stamp != self.generation:
+                return
+            self._discard(key)
+            self.entries[key] = (time.monotonic() + self.ttl, user_id, snapshot)
+            self.user_keys.setdefault(user_id, set()).add(key)
+            while len(self.entries) > self.max_size:
+                self._discard(next(iter(self.entries)))
+    
+    def delete(self, key):
+        with self.lock:
+            self.generation += 1
+            self._discard(key)
+    
+    def delete_user(self, user_id):
+        with self.lock:
+            self.generation += 1
+            for key in list(self.user_keys.get(user_id, ())):
+                self._discard(key)
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.user_keys.clear()
+    
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self.user_keys.get(entry[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.user_keys[entry[1]]
+
+
+class SharedTokenCache:
+    """
+    Token snapshots in the shared Django cache, visible to every worker.
+    
+    Invalidations leave tombstones for TOMBSTONE_TTL seconds instead of
+    deleting: snapshots are written with add(), which cannot replace a
+    token's tombstone, and a user's tombstone is checked again once the
+    snapshot is in place. A lookup that read the database before a logout or a user
+    change therefore never caches what it read.
+    """
+    TOMBSTONE = 'revoked'
+    
+    def __init__(self, ttl):
+        self.ttl = ttl
+    
+    @staticmethod
+    def token_key(key):
+        return f'auth_token:{key}'
+    
+    @staticmethod
+    def user_key(user_id):
+        return f'auth_token_user:{user_id}'
+    
+    @staticmethod
+    def user_tombstone_key(user_id):
+        return f'auth_token_user_changed:{user_id}'
+    
+    def stamp(self):
+        return None
+    
+    def get(self, key):
+        snapshot = cache.get(self.token_key(key))
+        return None if snapshot == self.TOMBSTONE else snapshot
+    
+    def set(self, key, user_id, snapshot, stamp=None):
+        tombstone_key = self.user_tombstone_key(user_id)
+        if cache.get(tombstone_key) or not cache.add(self.token_key(key), snapshot, self.ttl):
+            return
+        cache.set(self.user_key(user_id), key, self.ttl)
+        # The user changed since the first check: delete_user may have
+        # looked up the token before it was mapped
+        if cache.get(tombstone_key):
+            self.delete(key)
+    
+    def delete(self, key):
+        cache.set(self.token_key(key), self.TOMBSTONE, TOMBSTONE_TTL)
+    
+    def delete_user(self, user_id):
+        cache.set(self.user_tombstone_key(user_id), True, TOMBSTONE_TTL)
+        key = cache.get(self.user_key(user_id))
+        if key is not None:
+            self.delete(key)
+
+
+def build_token_cache():
+    if settings.TOKEN_AUTH_CACHE_BACKEND == 'shared':
+        return SharedTokenCache(settings.TOKEN_AUTH_CACHE_TTL)
+    return LocalTokenCache(settings.TOKEN_AUTH_CACHE_SIZE, settings.TOKEN_AUTH_CACHE_TTL)
+
+
+token_cache = build_token_cache()
+
+
+def invalidate_token(key):
+    """Forget a token once the current transaction commits"""
+    transaction.on_commit(lambda: token_cache.delete(key))
+
+
+def invalidate_user_tokens(user_id):
+    """Forget the tokens of a user once the current transaction commits"""
+    transaction.on_commit(lambda: token_cache.delete_user(user_id))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in TokenAuthentication that skips the database on cache hits"""
+    
+    def authenticate_credentials(self, key):
+        stamp = token_cache.stamp()
+        snapshot = token_cache.get(key)
+        metrics.cache_lookup('token_auth', snapshot is not None)
+        if snapshot is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user.pk, self.take_snapshot(token, user), stamp)
+            return user, token
+        
+        user, token = self.restore_snapshot(snapshot)
+        # Inactive users are never cached, this guards stale snapshots only
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return user, token
+    
+    def take_snapshot(self, token, user):
+        token_model, user_model = type(token), type(user)
+        return (
+            [getattr(token, name) for name in snapshot_fields(token_model)],
+            [getattr(user, name) for name in snapshot_fields(user_model)],
+        )
+    
+    def restore_snapshot(self, snapshot):
+        token_values, user_values = snapshot
+        token_model = self.get_model()
+        user_model = token_model._meta.get_field('user').related_model
+        user = user_model.from_db(DEFAULT_DB_ALIAS, snapshot_fields(user_model), user_values)
+        token = token_model.from_db(DEFAULT_DB_ALIAS, snapshot_fields(token_model), token_values)
+        token.user = user
+        return user, token
@@ -0,0 +1,25 @@
+"""
+Custom API exceptions
+"""
+from django.db import IntegrityError
+from psycopg2 import errorcodes
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class BookingConflict(APIException):
+    """The requested time overlaps another active appointment of the barber"""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This time slot is already booked."
+    default_code = 'booking_conflict'
+
+
+def is_booking_conflict(exc):
+    """
+    Whether a database error was raised by the exclusion constraint that
+    prevents overlapping appointments (the only exclusion constraint)
+    """
+    return (
+        isinstance(exc, IntegrityError)
+        and getattr(exc.__cause__, 'pgcode', None) == errorcodes.EXCLUSION_VIOLATION
+    )
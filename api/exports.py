@@ -0,0 +1,131 @@
+"""
+Streaming export of appointments (GET /api/appointments/export/)
+
+Rows are read as flat ``values()`` dicts, joined to the client, barber and
+service in the same query, through a server-side cursor that fetches
+EXPORT_CHUNK_SIZE rows at a time; each chunk is encoded and sent before
+the next one is read, so memory does not grow with the export. The cursor
+is read in a transaction: outside one, PostgreSQL would materialize the
+whole result before sending the first row (WITH HOLD cursors).
+
+Under ASGI, Django buffers synchronous streaming content in full, so the
+same chunks are served by an asynchronous iterator that reads each one on
+the request's thread.
+"""
+import csv
+import io
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.http import StreamingHttpResponse
+
+from users.models import Appointment
+
+
+# Rows fetched from the cursor and encoded per response chunk
+EXPORT_CHUNK_SIZE = 2000
+
+# Output name: (content type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+# Exported columns, in order: plain fields and joined ones
+EXPORT_FIELDS = [
+    'id', 'appointment_date', 'appointment_time', 'status',
+    'client_id', 'client_username', 'client_email',
+    'barber_id', 'barber_username',
+    'service_id', 'service_name', 'service_duration', 'service_price',
+    'series_id', 'notes', 'created_at', 'updated_at',
+]
+
+JOINED_FIELDS = {
+    'client_username': F('client__username'),
+    'client_email': F('client__email'),
+    'barber_username': F('barber__username'),
+    'service_name': F('service__name'),
+    'service_duration': F('service__duration'),
+    'service_price': F('service__price'),
+}
+
+
+def export_rows(date_from=None, date_to=None, statuses=None):
+    """Flat rows of the matching appointments, oldest first"""
+    appointments = Appointment.objects.all()
+    if date_from:
+        appointments = appointments.filter(appointment_date__gte=date_from)
+    if date_to:
+        appointments = appointments.filter(appointment_date__lte=date_to)
+    if statuses:
+        appointments = appointments.filter(status__in=statuses)
+    return appointments.order_by(
+        'appointment_date', 'appointment_time', 'id'
+    ).values(*[field for field in EXPORT_FIELDS if field not in JOINED_FIELDS], **JOINED_FIELDS)
+
+
+def encode_csv(rows, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows([row[field] for field in EXPORT_FIELDS] for row in rows)
+    return buffer.getvalue().encode()
+
+
+def encode_ndjson(rows, header=False):
+    return ''.join(
+        json.dumps({field: row[field] for field in EXPORT_FIELDS}, cls=DjangoJSONEncoder) + '\n'
+        for row in rows
+    ).encode()
+
+
+ENCODERS = {'csv': encode_csv, 'ndjson': encode_ndjson}
+
+
+def export_chunks(rows, output):
+    """Encoded chunks of EXPORT_CHUNK_SIZE rows read through a server-side cursor"""
+    encode = ENCODERS[output]
+    chunk = []
+    # Sent even when nothing matches, so a CSV always has its header
+    header = True
+    with transaction.atomic():
+        for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            chunk.append(row)
+            if len(chunk) == EXPORT_CHUNK_SIZE:
+                yield encode(chunk, header)
+                chunk, header = [], False
+    if chunk or header:
+        yield encode(chunk, header)
+
+
+async def aexport_chunks(rows, output):
+    """
+    export_chunks for ASGI. Every step runs on the request's thread, which
+    keeps the transaction and the cursor on its database connection.
+    """
+    chunks = export_chunks(rows, output)
+    step = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await step(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Client gone: close the cursor and the transaction on that thread
+        await sync_to_async(chunks.close, thread_sensitive=True)()
+
+
+def export_response(request, rows, output, filename):
+    content_type, extension = EXPORT_FORMATS[output]
+    if isinstance(request, ASGIRequest):
+        content = aexport_chunks(rows, output)
+    else:
+        content = export_chunks(rows, output)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    # Tell nginx not to buffer the export
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,8 +1,16 @@
 """
-Custom middleware to exempt API endpoints from CSRF verification
+Custom middleware to exempt API endpoints from CSRF verification and to
+measure and profile API requests
 """
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 
+from .profiling import Profile, profiling_requested, requested_by_admin
+from .timing import RequestTiming, current_timing
+
 
 class DisableCSRFForAPI(MiddlewareMixin):
     """
@@ -21,3 +29,115 @@ class DisableCSRFForAPI(MiddlewareMixin):
         
         return None
 
+
+class RequestTimingMiddleware:
+    """
+    Measure the API requests. Every request is added to the metrics
+    registry (latency, count and SQL queries by view and action, see
+    barbershop.metrics). A sample of them (REQUEST_TIMING_SAMPLE_RATE) also
+    gets its SQL query count, database, rendering and view time sent back
+    in a Server-Timing header and logged at DEBUG as structured fields by
+    ``api.timing``; the query shapes repeated at least
+    REQUEST_TIMING_N_PLUS_ONE_THRESHOLD times are logged as warnings.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def process_template_response(self, request, response):
+        timing = current_timing.get()
+        if timing is not None and timing.sampled:
+            timing.time_rendering(response)
+        return response
+    
+    def finish(self, timing, request, response):
+        timing.record_metrics(request, response)
+        if timing.sampled:
+            timing.finish(request, response)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not request.path.startswith('/api/'):
+            return self.get_response(request)
+        
+        timing = RequestTiming(random.random() < settings.REQUEST_TIMING_SAMPLE_RATE)
+        token = current_timing.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        self.finish(timing, request, response)
+        return response
+    
+    async def __acall__(self, request):
+        if not request.path.startswith('/api/'):
+            return await self.get_response(request)
+        
+        timing = RequestTiming(random.random() < settings.REQUEST_TIMING_SAMPLE_RATE)
+        token = current_timing.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        self.finish(timing, request, response)
+        return response
+
+
+class RequestProfilingMiddleware:
+    """
+    Profile the API requests of admins that send ``X-Profile: 1`` or
+    ``?profile=1`` (see api.profiling). Other requests only pay for a
+    lookup of the header and the query string.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not (
+            request.path.startswith('/api/') and profiling_requested(request)
+            and requested_by_admin(request)
+        ):
+            return self.get_response(request)
+        
+        profile = Profile(settings.PROFILING_INTERVAL)
+        profile.attach()
+        profile.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+            profile.detach()
+        response['X-Profile-Id'] = profile.save(request, response)
+        return response
+    
+    async def __acall__(self, request):
+        if not (
+            request.path.startswith('/api/') and profiling_requested(request)
+            and await sync_to_async(requested_by_admin)(request)
+        ):
+            return await self.get_response(request)
+        
+        # Samples the event loop thread and, attached there, the thread
+        # that runs the synchronous code and queries of this request
+        profile = Profile(settings.PROFILING_INTERVAL)
+        await sync_to_async(profile.attach)()
+        profile.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.stop()
+            await sync_to_async(profile.detach)()
+        response['X-Profile-Id'] = await sync_to_async(profile.save)(request, response)
+        return response
@@ -0,0 +1,136 @@
+"""
+Reusable view mixins
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import quote_etag
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more SQL queries than its budget allows"""
+
+
+class QueryCounter:
+    """
+    Database execute wrapper that counts the executed queries, leaving out
+    savepoints, which depend on how deeply transactions are nested
+    """
+    
+    def __init__(self):
+        self.count = 0
+    
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMixin:
+    """
+    Check that each action of a viewset runs at most a fixed number of SQL
+    queries, whatever the page size, so nested serializer fields cannot
+    silently reintroduce N+1 queries.
+    
+    ``query_budgets`` maps action names to their budget, authentication
+    included. Checks run when QUERY_BUDGET_ENFORCED is on (default: DEBUG);
+    requests over budget log a warning, or raise QueryBudgetExceeded when
+    QUERY_BUDGET_STRICT is on, which is meant for tests.
+    """
+    query_budgets = {}
+    
+    def dispatch(self, request, *args, **kwargs):
+        if not settings.QUERY_BUDGET_ENFORCED:
+            return super().dispatch(request, *args, **kwargs)
+        
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = super().dispatch(request, *args, **kwargs)
+        
+        budget = self.query_budgets.get(getattr(self, 'action', None))
+        if budget is not None and counter.count > budget:
+            message = (
+                f"{type(self).__name__}.{self.action} ran {counter.count} "
+                f"queries, budget is {budget}"
+            )
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+def list_state_aggregates(validator_fields):
+    """Aggregates whose values change whenever a list changes"""
+    return {
+        'rows': Count('pk'),
+        **{f'latest_{n}': Max(field) for n, field in enumerate(validator_fields)},
+    }
+
+
+def list_etag(request, user, response_format, state):
+    """
+    ETag of a list from its state. There is no Last-Modified: the latest
+    timestamp does not move when a row is deleted or filtered out, so a
+    date alone would answer 304 to a list that lost rows.
+    """
+    state = dict(state)
+    rows = state.pop('rows')
+    changes = [value for value in state.values() if value is not None]
+    latest = max(changes) if changes else None
+    
+    viewer = f'{user.user_type}:{user.pk}' if user.is_authenticated else 'public'
+    seed = '|'.join([
+        request.get_full_path(), response_format, viewer,
+        str(rows), latest.isoformat() if latest else '',
+    ])
+    return quote_etag(hashlib.md5(seed.encode()).hexdigest())
+
+
+def patch_list_headers(response, user, etag):
+    """Validator and cache policy of a list response"""
+    response['ETag'] = etag
+    if user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.PUBLIC_LIST_CACHE_MAX_AGE
+        )
+    patch_vary_headers(response, ['Authorization', 'Cookie'])
+
+
+class ConditionalListMixin:
+    """
+    Answer unchanged list requests with 304 Not Modified before anything
+    is serialized.
+    
+    The ETag comes from one aggregate over the filtered queryset: the row
+    count, which catches deletions, and the latest of the
+    ``validator_fields`` timestamps, which catches additions and edits.
+    It also covers the query string, the response format and who is
+    asking, since the visible rows depend on the user. Anonymous responses
+    may be stored by shared caches for PUBLIC_LIST_CACHE_MAX_AGE seconds;
+    authenticated ones must be revalidated on every request.
+    """
+    validator_fields = ('updated_at',)
+    
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        state = queryset.order_by().aggregate(**list_state_aggregates(self.validator_fields))
+        etag = list_etag(
+            request, request.user, request.accepted_renderer.format, state
+        )
+        
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        patch_list_headers(response, request.user, etag)
+        return response
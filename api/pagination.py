@@ -0,0 +1,185 @@
+"""
+Pagination classes for the API.
+
+Large, ever-growing lists (appointments, users) are paginated with a keyset
+cursor: the cursor holds the ordering key of the last row sent, and the next
+page is fetched with an indexed range condition on that key, so there is no
+COUNT(*) and no OFFSET scan. Page-number pagination remains available with
+``?pagination=page`` (or any ``?page=``) for the admin UI.
+"""
+import base64
+import json
+from collections import OrderedDict
+from functools import reduce
+from operator import and_, or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a unique composite ordering key, e.g.
+    ('-appointment_date', '-appointment_time', '-id'). Every field must be
+    a concrete field of the model and the last one must be unique.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-'))
+            for name in self.ordering
+        ]
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [self.invert(name) for name in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+
+        # One extra row tells whether there is another page
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.first_key = self.key(rows[0]) if rows else position
+        self.last_key = self.key(rows[-1]) if rows else position
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.last_key, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.first_key, reverse=True)
+
+    @staticmethod
+    def invert(name):
+        return name[1:] if name.startswith('-') else f'-{name}'
+
+    def key(self, instance):
+        """Ordering key of a row"""
+        return [field.value_from_object(instance) for field in self.fields]
+
+    def after(self, ordering, position):
+        """
+        Filter for the rows strictly after ``position`` in ``ordering``:
+        (a, b, c) > (x, y, z) expanded as a > x OR (a = x AND b > y) OR ...
+        The leading a >= x bound lets the database use an index range scan.
+        """
+        def step(name, value, strict):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            if not strict:
+                lookup += 'e'
+            return Q(**{f'{name.lstrip("-")}__{lookup}': value})
+
+        branches = []
+        for index, (name, value) in enumerate(zip(ordering, position)):
+            equal = [
+                Q(**{previous.lstrip('-'): previous_value})
+                for previous, previous_value in zip(ordering[:index], position[:index])
+            ]
+            branches.append(reduce(and_, equal + [step(name, value, strict=True)]))
+        return step(ordering[0], position[0], strict=False) & reduce(or_, branches)
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps([int(reverse), [str(value) for value in position]])
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        """Return (position, reverse) from the cursor query parameter"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+
+        try:
+            reverse, values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError
+            position = [
+                field.to_python(value) for field, value in zip(self.fields, values)
+            ]
+            # Out of range integers would fail in the database
+            for field, value in zip(self.fields, position):
+                field.run_validators(value)
+        except (TypeError, ValueError, ValidationError):
+            raise ParseError(self.invalid_cursor_message)
+        return position, bool(reverse)
+
+
+class KeysetOrPageNumberPagination(BasePagination):
+    """
+    Keyset pagination by default; ``?pagination=page`` or a ``page``
+    parameter selects page-number pagination instead
+    """
+    keyset_class = KeysetPagination
+    page_number_class = PageNumberPagination
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if params.get(self.mode_query_param) == 'page' or 'page' in params:
+            self.paginator = self.page_number_class()
+        else:
+            self.paginator = self.keyset_class()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.keyset_class().get_paginated_response_schema(schema)
+
+
+class AppointmentKeysetPagination(KeysetPagination):
+    ordering = ('-appointment_date', '-appointment_time', '-id')
+
+
+class AppointmentPagination(KeysetOrPageNumberPagination):
+    keyset_class = AppointmentKeysetPagination
+
+
+class UserKeysetPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class UserPagination(KeysetOrPageNumberPagination):
+    keyset_class = UserKeysetPagination
@@ -0,0 +1,207 @@
+"""
+On-demand profiling of single API requests (see api.middleware.RequestProfilingMiddleware)
+
+An admin adds ``X-Profile: 1`` or ``?profile=1`` to a request. A sampling
+thread then records the stacks of the threads running it, weighted by wall
+time, and an execute wrapper on their database connections records each
+SQL statement with its duration; samples taken while a statement runs get
+it as their innermost frame. The profile is stored in PROFILING_DIR and
+its id returned in the X-Profile-Id response header; the stacks download in
+the folded format of flamegraph.pl and speedscope. Profiles keep the path
+and the SQL statements without their parameters, never the query string.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .timing import PLACEHOLDER_LIST
+
+
+# Characters of a statement kept in its flame graph frame
+SQL_FRAME_LENGTH = 120
+
+# Import roots stripped from the file names in frames, longest first
+PATH_ROOTS = sorted({path for path in sys.path if path}, key=len, reverse=True)
+
+
+def profiling_requested(request):
+    """Cheap check of the flag, before anything else is done for the request"""
+    return (
+        'HTTP_X_PROFILE' in request.META
+        or 'profile=' in request.META.get('QUERY_STRING', '')
+    )
+
+
+def requested_by_admin(request):
+    """Whether the request carries the flag and authenticates as an admin"""
+    if request.headers.get('X-Profile', request.GET.get('profile')) not in ('1', 'true'):
+        return False
+    drf_request = Request(request, authenticators=[
+        authentication() for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
+    try:
+        user = drf_request.user
+    except exceptions.APIException:
+        return False
+    return user.is_authenticated and user.user_type == 'admin'
+
+
+def frame_name(frame):
+    """'function (path:line)', the path relative to the project or site-packages"""
+    path = frame.f_code.co_filename
+    for root in PATH_ROOTS:
+        if path.startswith(root + os.sep):
+            path = path[len(root) + 1:]
+            break
+    return f'{frame.f_code.co_name} ({path}:{frame.f_lineno})'
+
+
+def sql_frame(sql):
+    shape = ' '.join(PLACEHOLDER_LIST.sub('%s', sql).split())
+    if len(shape) > SQL_FRAME_LENGTH:
+        shape = shape[:SQL_FRAME_LENGTH] + '...'
+    return 'SQL ' + shape.replace(';', ',')
+
+
+class Profile:
+    """Stacks and SQL statements of one request"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        # Threads sampled: the one handling the request, then every thread
+        # whose connection the profile is attached to
+        self.threads = {threading.get_ident()}
+        self.stacks = Counter()
+        self.queries = []
+        self.running_sql = {}
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, name='request-profiler', daemon=True)
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def __call__(self, execute, sql, params, many, context):
+        ident = threading.get_ident()
+        self.running_sql[ident] = sql_frame(sql)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.running_sql.pop(ident, None)
+            self.queries.append({
+                'sql': sql,
+                'many': many,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+    def attach(self):
+        """Profile the queries and the stack of the calling thread"""
+        self.threads.add(threading.get_ident())
+        connection.execute_wrappers.append(self)
+
+    def detach(self):
+        connection.execute_wrappers.remove(self)
+
+    def start(self):
+        self.sampler.start()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+        self.stopped.set()
+        self.sampler.join()
+
+    def sample(self):
+        """Fold the stacks of the profiled threads, weighted by microseconds"""
+        names = {}
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            now = time.perf_counter()
+            weight = round((now - last) * 1000000)
+            last = now
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(names.get(ident, f'thread-{ident}'))
+                stack.reverse()
+                sql = self.running_sql.get(ident)
+                if sql is not None:
+                    stack.append(sql)
+                self.stacks[';'.join(stack)] += weight
+
+    def save(self, request, response):
+        """Write the profile to PROFILING_DIR and return its id"""
+        # Ids sort by time, like the file names listed and pruned
+        profile_id = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:6]}"
+        directory = settings.PROFILING_DIR
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'{profile_id}.json'), 'w') as stream:
+            json.dump({
+                'id': profile_id,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'pid': os.getpid(),
+                'duration_ms': round(self.duration * 1000, 3),
+                'interval_ms': self.interval * 1000,
+                'sql_ms': round(sum(query['ms'] for query in self.queries), 3),
+                'queries': self.queries,
+                'folded': [f'{stack} {weight}' for stack, weight in self.stacks.most_common()],
+            }, stream)
+        prune_profiles(directory, settings.PROFILING_KEEP)
+        return profile_id
+
+
+def prune_profiles(directory, keep):
+    """Remove all but the ``keep`` newest profiles"""
+    for filename in sorted(os.listdir(directory), reverse=True)[keep:]:
+        try:
+            os.remove(os.path.join(directory, filename))
+        except OSError:
+            pass
+
+
+def stored_profiles():
+    """Summaries of the stored profiles, newest first"""
+    directory = settings.PROFILING_DIR
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for filename in sorted(os.listdir(directory), reverse=True):
+        if not filename.endswith('.json'):
+            continue
+        profile = load_profile(filename[:-len('.json')])
+        if profile is not None:
+            profiles.append({
+                name: profile[name]
+                for name in ('id', 'method', 'path', 'status', 'duration_ms', 'sql_ms')
+            } | {'queries': len(profile['queries'])})
+    return profiles
+
+
+def load_profile(profile_id):
+    """Stored profile by id, None if there is none"""
+    if not profile_id.replace('-', '').isalnum():
+        return None
+    try:
+        with open(os.path.join(settings.PROFILING_DIR, f'{profile_id}.json')) as stream:
+            return json.load(stream)
+    except (OSError, ValueError):
+        return None
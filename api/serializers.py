@@ -1,7 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
-from users.models import CustomUser, BarberProfile, Service, Appointment
+from django.utils import timezone
+from users.models import (
+    CustomUser, BarberProfile, Service, Appointment, AppointmentSeries
+)
+from users.bulk import duration_conflicts
+from users.series import MAX_SERIES_OCCURRENCES, occurrence_dates
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -150,6 +155,17 @@ class ServiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Service
         fields = '__all__'
+    
+    def validate_duration(self, value):
+        # Upcoming bookings of the service take the new duration
+        if self.instance is not None and value != self.instance.duration:
+            conflicts = duration_conflicts(self.instance, value)
+            if conflicts:
+                raise serializers.ValidationError(
+                    "Upcoming appointments would overlap other bookings: "
+                    + ", ".join(map(str, conflicts))
+                )
+        return value
 
 
 class AppointmentSerializer(serializers.ModelSerializer):
@@ -180,15 +196,38 @@ class AppointmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Appointment
         fields = ['id', 'client', 'barber', 'service', 'appointment_date',
-                  'appointment_time', 'status', 'notes', 'created_at', 
+                  'appointment_time', 'status', 'notes', 'series', 'created_at', 
                   'updated_at', 'client_id', 'barber_id', 'service_id']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'series', 'created_at', 'updated_at']
+
+
+def validate_bookable_barber(client, barber):
+    """Check that ``client`` may book appointments with ``barber``"""
+    # Check if user is trying to book themselves
+    # If the barber is the same as the logged-in user and is a barber
+    if barber == client and client.user_type == 'barber':
+        raise serializers.ValidationError({
+            'barber_id': "You cannot book an appointment with yourself as a barber."
+        })
+    
+    # Ensure the selected barber is approved
+    try:
+        profile = getattr(barber, 'barber_profile', None)
+        if not profile or not profile.is_approved:
+            raise serializers.ValidationError({
+                'barber_id': "Selected barber is not authorized yet. Please choose another barber."
+            })
+    except Exception:
+        raise serializers.ValidationError({
+            'barber_id': "Selected barber is not authorized yet. Please choose another barber."
+        })
 
 
 class AppointmentCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating appointments"""
+    # The barber profile is needed by validate() to check the approval
     barber_id = serializers.PrimaryKeyRelatedField(
-        queryset=CustomUser.objects.filter(user_type='barber'),
+        queryset=CustomUser.objects.filter(user_type='barber').select_related('barber_profile'),
         source='barber',
         write_only=True
     )
@@ -215,28 +254,7 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
     
     def validate(self, attrs):
         """Custom validations"""
-        # Check if user is trying to book themselves
-        client = self.context['request'].user
-        barber = attrs.get('barber')
-        
-        # If the barber is the same as the logged-in user and is a barber
-        if barber == client and client.user_type == 'barber':
-            raise serializers.ValidationError({
-                'barber_id': "You cannot book an appointment with yourself as a barber."
-            })
-        
-        # Ensure the selected barber is approved
-        try:
-            profile = getattr(barber, 'barber_profile', None)
-            if not profile or not profile.is_approved:
-                raise serializers.ValidationError({
-                    'barber_id': "Selected barber is not authorized yet. Please choose another barber."
-                })
-        except Exception:
-            raise serializers.ValidationError({
-                'barber_id': "Selected barber is not authorized yet. Please choose another barber."
-            })
-        
+        validate_bookable_barber(self.context['request'].user, attrs.get('barber'))
         return attrs
     
     def create(self, validated_data):
@@ -244,3 +262,84 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
         validated_data['client'] = client
         return super().create(validated_data)
 
+
+class AppointmentSeriesSerializer(serializers.ModelSerializer):
+    """Serializer for recurring appointment series"""
+    
+    class Meta:
+        model = AppointmentSeries
+        fields = ['id', 'client', 'barber', 'service', 'frequency', 'interval',
+                  'start_date', 'end_date', 'appointment_time', 'notes', 'created_at']
+        read_only_fields = fields
+
+
+class AppointmentSeriesCreateSerializer(serializers.ModelSerializer):
+    """
+    Serializer for booking a series: a recurrence rule (frequency and
+    interval from start_date) and a horizon (end_date and/or count)
+    """
+    barber_id = serializers.PrimaryKeyRelatedField(
+        queryset=CustomUser.objects.filter(user_type='barber').select_related('barber_profile'),
+        source='barber',
+        write_only=True
+    )
+    service_id = serializers.PrimaryKeyRelatedField(
+        queryset=Service.objects.all(),
+        source='service',
+        write_only=True
+    )
+    interval = serializers.IntegerField(min_value=1, max_value=12, default=1)
+    end_date = serializers.DateField(required=False)
+    count = serializers.IntegerField(
+        min_value=1, max_value=MAX_SERIES_OCCURRENCES, required=False, write_only=True
+    )
+    # Book the free occurrences even when others conflict
+    skip_conflicts = serializers.BooleanField(default=False, write_only=True)
+    
+    class Meta:
+        model = AppointmentSeries
+        fields = ['barber_id', 'service_id', 'frequency', 'interval', 'start_date',
+                  'end_date', 'count', 'appointment_time', 'notes', 'skip_conflicts']
+    
+    def validate_start_date(self, value):
+        """Validate that the series does not start in the past"""
+        if value < timezone.now().date():
+            raise serializers.ValidationError("Cannot book appointments for past dates.")
+        return value
+    
+    def validate(self, attrs):
+        validate_bookable_barber(self.context['request'].user, attrs['barber'])
+        
+        end_date = attrs.get('end_date')
+        if end_date is None and 'count' not in attrs:
+            raise serializers.ValidationError(
+                "Either 'end_date' or 'count' is required."
+            )
+        if end_date is not None and end_date < attrs['start_date']:
+            raise serializers.ValidationError({
+                'end_date': "end_date must not be before start_date."
+            })
+        
+        attrs['dates'] = occurrence_dates(
+            attrs['start_date'], attrs.get('frequency', 'weekly'), attrs['interval'],
+            end_date=end_date, count=attrs.pop('count', None)
+        )
+        attrs['end_date'] = attrs['dates'][-1]
+        return attrs
+
+
+class AppointmentTransitionSerializer(serializers.Serializer):
+    """Bulk status action on a list of ids and/or a date and status filter"""
+    action = serializers.ChoiceField(choices=list(Appointment.TRANSITIONS))
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=500, required=False
+    )
+    date = serializers.DateField(required=False)
+    status = serializers.ChoiceField(choices=Appointment.STATUS_CHOICES, required=False)
+    
+    def validate(self, attrs):
+        if not {'ids', 'date', 'status'} & attrs.keys():
+            raise serializers.ValidationError(
+                "Provide 'ids' or at least one of 'date' and 'status'."
+            )
+        return attrs
@@ -0,0 +1,24 @@
+"""
+Signal handlers keeping the token authentication cache in sync
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from users.models import CustomUser
+from .authentication import invalidate_token, invalidate_user_tokens
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Logged out tokens stop authenticating at once"""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_changed(sender, instance, created=False, **kwargs):
+    """Deactivated users and edited fields must not be served from the cache"""
+    # A new user has no token, hence nothing cached
+    if not created:
+        invalidate_user_tokens(instance.pk)
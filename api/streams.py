@@ -0,0 +1,376 @@
+"""
+Server-sent events pushing barber availability changes, for ASGI servers.
+
+``GET /api/availability/stream/?watch=<barber id>:<YYYY-MM-DD>,...`` (barber
+profile ids, like the availability endpoint, and an optional service_id)
+answers with a ``snapshot`` event per watched day, the same body as
+``/api/barbers/{id}/availability/``, then a ``delta`` event with the slots
+whose availability changed each time the day changes, or a new snapshot
+when the working hours change. A comment line is sent every
+AVAILABILITY_STREAM_KEEPALIVE seconds.
+
+Every change of an AvailabilityIndex row is announced by a database
+trigger with NOTIFY (see the users 0011 migration). Each process keeps one
+connection listening for it in the event loop, loads the changed rows
+once per batch of notifications and hands them to the subscribers of
+those days. An idle subscriber costs its socket and a suspended task.
+When that connection is lost and cannot be opened again, every stream
+gets an ``error`` event and ends, so that clients reconnect and start
+over from fresh snapshots.
+
+The stream is served by barbershop.asgi in front of Django: Django 4.2
+does not tell streaming responses that their client went away, which
+would leak one subscription per closed tab.
+"""
+import asyncio
+import io
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime
+from importlib import import_module
+
+import psycopg2
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, connections
+from rest_framework import exceptions
+
+from users.availability import SLOT_MINUTES, compute_slots, get_availability_index
+from users.models import AvailabilityIndex, Service
+from .async_views import aauthenticate
+from .views import availability_data, service_durations, visible_barber_profiles
+
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/api/availability/stream/'
+
+# Channel of the trigger on the availability index table
+CHANNEL = 'availability_changed'
+
+# Days one stream can watch
+MAX_WATCHED = 31
+
+# Seconds between reconnection attempts of the listening connection
+RECONNECT_DELAYS = (1, 2, 5, 10, 30)
+
+
+class Subscriber:
+    """One stream: the watched days and the slots last sent for each"""
+
+    def __init__(self, watched, service_duration):
+        # (barber user id, date): barber profile
+        self.watched = watched
+        self.service_duration = service_duration
+        self.slots = {}
+        self.pending = {}
+        self.error = None
+        self.wakeup = asyncio.Event()
+
+    def notify(self, key, index):
+        self.pending[key] = index
+        self.wakeup.set()
+
+    def fail(self, message):
+        """End the stream with an error event"""
+        self.error = message
+        self.wakeup.set()
+
+    def snapshot(self, key, index):
+        profile = self.watched[key]
+        data = availability_data(
+            index, key[1].isoformat(), profile.user.username, self.service_duration
+        )
+        self.slots[key] = data.get('available_slots')
+        return 'snapshot', {'barber_id': profile.pk, 'date': key[1].isoformat(), **data}
+
+    def events(self):
+        """(event, data) of the changes received since the last call"""
+        self.wakeup.clear()
+        pending, self.pending = self.pending, {}
+        for key, index in pending.items():
+            previous = self.slots.get(key)
+            slots = None
+            if index.work_start and index.work_end:
+                slots = compute_slots(
+                    index.work_start, index.work_end, index.busy, duration=self.service_duration
+                )
+            if previous is None or slots is None or len(previous) != len(slots) or any(
+                old['time'] != new['time'] for old, new in zip(previous, slots)
+            ):
+                if previous is not None or slots is not None:
+                    yield self.snapshot(key, index)
+                continue
+            changed = [new for old, new in zip(previous, slots) if old != new]
+            if changed:
+                self.slots[key] = slots
+                yield 'delta', {
+                    'barber_id': self.watched[key].pk, 'date': key[1].isoformat(), 'slots': changed
+                }
+
+
+def load_index_rows(keys):
+    """Index rows of (barber id, date) keys, in one query"""
+    close_old_connections()
+    try:
+        rows = AvailabilityIndex.objects.filter(
+            barber_id__in={barber_id for barber_id, _ in keys},
+            date__in={day for _, day in keys}
+        )
+        return {(row.barber_id, row.date): row for row in rows if (row.barber_id, row.date) in keys}
+    finally:
+        close_old_connections()
+
+
+class AvailabilityHub:
+    """Subscribers of this process by watched day, fed by one LISTEN connection"""
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.connection = None
+        self.loop = None
+        self.started = None
+
+    async def subscribe(self, subscriber):
+        await self.start()
+        for key in subscriber.watched:
+            self.subscribers[key].add(subscriber)
+
+    def unsubscribe(self, subscriber):
+        for key in subscriber.watched:
+            subscribers = self.subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[key]
+
+    async def start(self):
+        """Listen from the running event loop, once"""
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.close()
+            self.loop = loop
+            self.started = None
+        if self.started is None or (self.started.done() and self.connection is None):
+            self.started = loop.create_task(self.connect())
+        await asyncio.shield(self.started)
+
+    async def connect(self):
+        for attempt in range(len(RECONNECT_DELAYS) + 1):
+            try:
+                self.connection = await sync_to_async(listen, thread_sensitive=False)()
+                break
+            except psycopg2.Error as exc:
+                delay = RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)]
+                logger.warning(f"Cannot listen for availability changes ({exc}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+        else:
+            raise exceptions.APIException("Availability changes are unavailable")
+        self.loop.add_reader(self.connection.fileno(), self.read)
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.loop.remove_reader(self.connection.fileno())
+            except (ValueError, RuntimeError):
+                pass
+            self.connection.close()
+            self.connection = None
+
+    def read(self):
+        try:
+            self.connection.poll()
+        except psycopg2.Error as exc:
+            logger.warning(f"Lost the availability changes connection: {exc}")
+            self.close()
+            self.loop.create_task(self.reconnect())
+            return
+        keys = set()
+        for notification in self.connection.notifies:
+            barber_id, _, day = notification.payload.partition(':')
+            keys.add((int(barber_id), datetime.strptime(day, '%Y-%m-%d').date()))
+        self.connection.notifies.clear()
+        keys &= self.subscribers.keys()
+        if keys:
+            self.loop.create_task(self.dispatch(keys))
+
+    async def reconnect(self):
+        self.started = self.loop.create_task(self.connect())
+        try:
+            await self.started
+        except exceptions.APIException as exc:
+            # No more changes will come: end the open streams. The next
+            # subscriber tries to connect again
+            logger.error("Gave up listening for availability changes, closing the streams")
+            for subscribers in list(self.subscribers.values()):
+                for subscriber in subscribers:
+                    subscriber.fail(str(exc.detail))
+            return
+        # Changes may have been missed meanwhile
+        await self.dispatch(set(self.subscribers))
+
+    async def dispatch(self, keys):
+        try:
+            rows = await sync_to_async(load_index_rows)(keys)
+        except Exception:
+            logger.exception("Cannot load the changed availability")
+            return
+        for key, index in rows.items():
+            for subscriber in self.subscribers.get(key, ()):
+                subscriber.notify(key, index)
+
+
+def listen():
+    """New autocommit connection listening on CHANNEL"""
+    connection = psycopg2.connect(**connections['default'].get_connection_params())
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute(f'LISTEN {CHANNEL}')
+    return connection
+
+
+hub = AvailabilityHub()
+
+
+def parse_watched(value):
+    """'12:2026-10-20,12:2026-10-21' -> {(12, date), ...}"""
+    watched = set()
+    for part in value.split(','):
+        profile_id, _, day = part.strip().partition(':')
+        try:
+            watched.add((int(profile_id), datetime.strptime(day, '%Y-%m-%d').date()))
+        except ValueError:
+            raise exceptions.ParseError(
+                f"Invalid watch entry '{part}'. Use <barber id>:YYYY-MM-DD"
+            )
+    return watched
+
+
+def prepare_subscriber(request, user):
+    """Subscriber for the days watched by the request, checked like availability lookups"""
+    close_old_connections()
+    try:
+        watched = parse_watched(request.GET.get('watch', ''))
+        if len(watched) > MAX_WATCHED:
+            raise exceptions.ParseError(f"At most {MAX_WATCHED} days can be watched")
+
+        service_duration = SLOT_MINUTES
+        service_id = request.GET.get('service_id')
+        if service_id:
+            try:
+                service_duration = service_durations().get(id=service_id)
+            except (Service.DoesNotExist, ValueError):
+                raise exceptions.ParseError("Invalid service_id")
+
+        profiles = visible_barber_profiles(user).in_bulk({profile_id for profile_id, _ in watched})
+        missing = {profile_id for profile_id, _ in watched} - profiles.keys()
+        if missing:
+            raise exceptions.NotFound(f"Unknown barber {min(missing)}")
+        return Subscriber({
+            (profiles[profile_id].user_id, day): profiles[profile_id]
+            for profile_id, day in watched
+        }, service_duration)
+    finally:
+        close_old_connections()
+
+
+def load_snapshots(subscriber):
+    close_old_connections()
+    try:
+        return [
+            subscriber.snapshot(key, get_availability_index(profile, key[1]))
+            for key, profile in sorted(subscriber.watched.items(), key=lambda item: item[0][1])
+        ]
+    finally:
+        close_old_connections()
+
+
+def encode_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode()
+
+
+async def send_error(send, exc):
+    body = json.dumps({'detail': str(exc.detail)}).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': exc.status_code,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def availability_stream(scope, receive, send):
+    """ASGI application serving STREAM_PATH"""
+    request = ASGIRequest(scope, io.BytesIO())
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    try:
+        if request.method != 'GET':
+            raise exceptions.MethodNotAllowed(request.method)
+        user = await aauthenticate(request)
+        subscriber = await sync_to_async(prepare_subscriber)(request, user)
+        await hub.subscribe(subscriber)
+    except exceptions.APIException as exc:
+        await send_error(send, exc)
+        return
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    changed = None
+    try:
+        snapshots = await sync_to_async(load_snapshots)(subscriber)
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Tell nginx not to buffer the stream
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': b''.join(encode_event(*snapshot) for snapshot in snapshots),
+            'more_body': True,
+        })
+        while not disconnected.done():
+            changed = asyncio.ensure_future(subscriber.wakeup.wait())
+            done, _ = await asyncio.wait(
+                {changed, disconnected}, timeout=settings.AVAILABILITY_STREAM_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if changed not in done:
+                changed.cancel()
+                if not done:
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                continue
+            if subscriber.error is not None:
+                await send({
+                    'type': 'http.response.body',
+                    'body': encode_event('error', {'detail': subscriber.error}),
+                })
+                break
+            body = b''.join(encode_event(*event) for event in subscriber.events())
+            if body:
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        hub.unsubscribe(subscriber)
+        disconnected.cancel()
+        if changed is not None:
+            changed.cancel()
+
+
+def route_availability_stream(application):
+    """ASGI application serving STREAM_PATH and passing the rest to ``application``"""
+    async def router(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+            return await availability_stream(scope, receive, send)
+        return await application(scope, receive, send)
+    return router
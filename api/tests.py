@@ -0,0 +1,436 @@
+"""
+SQL queries per API request: a page of twenty rows must cost the same as a
+page of one, so nested serializer fields cannot reintroduce N+1 queries.
+Keyset pagination: cursors round-trip, ties on the ordering key are broken
+by id, and invalid cursors are client errors.
+Conditional list requests: the ETag must change when rows leave a list.
+Cached token authentication: revocations win over racing lookups.
+Request timing: rendering is timed and the line is logged at DEBUG.
+Availability streams: snapshots and deltas, and the end of the streams.
+"""
+import asyncio
+import base64
+import json
+from datetime import date, time, timedelta
+from unittest import mock
+
+import psycopg2
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase
+
+from api.authentication import CachedTokenAuthentication, SharedTokenCache
+from api.pagination import AppointmentKeysetPagination
+from api.streams import STREAM_PATH, AvailabilityHub, Subscriber, availability_stream, hub
+
+from users.models import Appointment, AvailabilityIndex, BarberProfile, CustomUser, Service
+
+
+class QueryCountTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = timezone.now().date() + timedelta(days=1)
+        cls.service = Service.objects.create(name='Beard', duration=15, price=5)
+        cls.client_user = CustomUser.objects.create_user('client', password=None)
+        cls.barber = cls.create_barber('barber')
+
+    @classmethod
+    def create_barber(cls, username):
+        barber = CustomUser.objects.create_user(username, password=None, user_type='barber')
+        BarberProfile.objects.create(user=barber, is_approved=True)
+        return barber
+
+    def setUp(self):
+        # Cached auth and list validators would hide queries
+        cache.clear()
+
+    def book(self, count):
+        # Consecutive 15 minute slots after the existing bookings
+        booked = Appointment.objects.count()
+        return [
+            Appointment.objects.create(
+                client=self.client_user, barber=self.barber, service=self.service,
+                appointment_date=self.day, appointment_time=time(9 + n // 4, n % 4 * 15)
+            )
+            for n in range(booked, booked + count)
+        ]
+
+    def assertListQueries(self, url, queries, rows):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), rows)
+
+    def test_appointment_list(self):
+        self.client.force_authenticate(self.client_user)
+        self.book(1)
+        self.assertListQueries('/api/appointments/', 1, 1)
+        self.book(19)
+        self.assertListQueries('/api/appointments/', 1, 20)
+
+    def test_barber_list(self):
+        self.assertListQueries('/api/barbers/', 3, 1)
+        for n in range(19):
+            self.create_barber(f'barber-{n}')
+        self.assertListQueries('/api/barbers/', 3, 20)
+
+    def test_status_actions(self):
+        scheduled, confirmed, other = self.book(3)
+        Appointment.objects.filter(pk=confirmed.pk).update(status='confirmed')
+        self.client.force_authenticate(self.barber)
+        # Savepoints of the atomic actions included
+        for action, appointment, queries in [
+            ('confirm', scheduled, 6),
+            ('complete', confirmed, 7),
+            ('cancel', other, 8),
+        ]:
+            with self.subTest(action=action), self.assertNumQueries(queries):
+                response = self.client.post(f'/api/appointments/{appointment.id}/{action}/')
+                self.assertEqual(response.status_code, 200)
+        confirmed.refresh_from_db()
+        self.assertEqual(confirmed.status, 'completed')
+
+
+class BulkTransitionTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = timezone.now().date() + timedelta(days=1)
+        cls.service = Service.objects.create(name='Beard', duration=15, price=5)
+        cls.client_user = CustomUser.objects.create_user('client', password=None)
+        cls.barber = CustomUser.objects.create_user('barber', password=None, user_type='barber')
+        BarberProfile.objects.create(user=cls.barber, is_approved=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.barber)
+
+    def book(self, hour, status='scheduled'):
+        return Appointment.objects.create(
+            client=self.client_user, barber=self.barber, service=self.service,
+            appointment_date=self.day, appointment_time=time(hour), status=status
+        )
+
+    def post(self, **data):
+        response = self.client.post('/api/appointments/transition/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_outcomes_of_ids(self):
+        scheduled, cancelled = self.book(9), self.book(10, 'cancelled')
+        data = self.post(action='complete', ids=[scheduled.id, cancelled.id, 99999])
+        self.assertEqual(data['updated'], 1)
+        self.assertEqual(data['results'], [
+            {'id': scheduled.id, 'outcome': 'updated', 'from': 'scheduled', 'status': 'completed'},
+            {'id': cancelled.id, 'outcome': 'invalid_transition', 'status': 'cancelled'},
+            {'id': 99999, 'outcome': 'not_found'},
+        ])
+
+    def test_filter_reports_updated_rows_only(self):
+        scheduled, _ = self.book(9), self.book(10, 'cancelled')
+        data = self.post(action='cancel', date=self.day.isoformat())
+        self.assertEqual([row['id'] for row in data['results']], [scheduled.id])
+        self.assertFalse(data['has_more'])
+
+    def test_filter_pages(self):
+        first, second, third = self.book(9), self.book(10), self.book(11)
+        with mock.patch('api.views.MAX_BULK_TRANSITION', 2):
+            data = self.post(action='cancel', date=self.day.isoformat())
+            self.assertEqual(([row['id'] for row in data['results']], data['has_more']), ([first.id, second.id], True))
+            data = self.post(action='cancel', date=self.day.isoformat())
+            self.assertEqual(([row['id'] for row in data['results']], data['has_more']), ([third.id], False))
+
+    def test_confirm_again(self):
+        appointment = self.book(9, 'confirmed')
+        response = self.client.post(f'/api/appointments/{appointment.id}/confirm/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'confirmed')
+        self.assertEqual(self.client.post(f'/api/appointments/{self.book(10, "cancelled").id}/confirm/').status_code, 400)
+
+
+class AppointmentReportTests(APITestCase):
+
+    def test_revenue_counts_completed_appointments(self):
+        day = timezone.now().date() + timedelta(days=1)
+        service = Service.objects.create(name='Haircut', duration=30, price=20)
+        client = CustomUser.objects.create_user('client', password=None)
+        barber = CustomUser.objects.create_user('barber', password=None, user_type='barber')
+        for hour, status in [(9, 'completed'), (10, 'scheduled'), (11, 'cancelled'), (12, 'no_show')]:
+            Appointment.objects.create(
+                client=client, barber=barber, service=service,
+                appointment_date=day, appointment_time=time(hour), status=status
+            )
+        self.client.force_authenticate(
+            CustomUser.objects.create_user('admin', password=None, user_type='admin')
+        )
+
+        response = self.client.get('/api/reports/appointments/', {
+            'date_from': day.isoformat(), 'date_to': day.isoformat()
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals'], {
+            'count': 4, 'booked_minutes': 60, 'booked_revenue': '40.00', 'revenue': '20.00',
+            'status_counts': {'cancelled': 1, 'completed': 1, 'no_show': 1, 'scheduled': 1},
+        })
+
+
+class KeysetPaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        day = timezone.now().date() + timedelta(days=1)
+        service = Service.objects.create(name='Beard', duration=15, price=5)
+        cls.client_user = CustomUser.objects.create_user('client', password=None)
+        barbers = [
+            CustomUser.objects.create_user(f'barber-{n}', password=None, user_type='barber')
+            for n in range(3)
+        ]
+        # Three rows share the date and time, told apart by id only
+        slots = [(barber, day, time(9)) for barber in barbers]
+        slots += [(barbers[0], day, time(10)), (barbers[0], day + timedelta(days=1), time(9))]
+        appointments = [
+            Appointment.objects.create(
+                client=cls.client_user, barber=barber, service=service,
+                appointment_date=date, appointment_time=start
+            )
+            for barber, date, start in slots
+        ]
+        cls.expected = [
+            appointment.id for appointment in sorted(
+                appointments, reverse=True,
+                key=lambda a: (a.appointment_date, a.appointment_time, a.id)
+            )
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.client_user)
+        patcher = mock.patch.object(AppointmentKeysetPagination, 'page_size', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids(self, data):
+        return [row['id'] for row in data['results']]
+
+    def test_round_trip(self):
+        pages, url = [], '/api/appointments/'
+        while url:
+            data = self.get(url)
+            self.assertNotIn('count', data)
+            pages.append(self.ids(data))
+            url = data['next']
+        self.assertEqual(pages, [self.expected[0:2], self.expected[2:4], self.expected[4:]])
+
+    def test_previous_links(self):
+        first = self.get('/api/appointments/')
+        self.assertIsNone(first['previous'])
+        second = self.get(first['next'])
+        third = self.get(second['next'])
+        self.assertIsNone(third['next'])
+
+        self.assertEqual(self.ids(self.get(third['previous'])), self.ids(second))
+        back = self.get(second['previous'])
+        self.assertEqual(self.ids(back), self.ids(first))
+        self.assertIsNone(back['previous'])
+        self.assertEqual(self.ids(self.get(back['next'])), self.ids(second))
+
+    def test_invalid_cursors(self):
+        def encode(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        day = timezone.now().date().isoformat()
+        for cursor in [
+            'not a cursor',
+            encode(5),
+            encode([0, None]),
+            encode([0, [day, '09:00']]),
+            encode([0, ['tomorrow', '09:00', '1']]),
+            encode([0, [day, '09:00', '9' * 30]]),
+        ]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/appointments/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+    def test_page_numbers_keep_the_count(self):
+        data = self.get('/api/appointments/?pagination=page')
+        self.assertEqual(data['count'], len(self.expected))
+
+
+class ConditionalListTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.old = Service.objects.create(name='Beard', duration=15, price=5)
+        self.new = Service.objects.create(name='Haircut', duration=45, price=10)
+
+    def test_deactivated_row_changes_etag(self):
+        response = self.client.get('/api/services/')
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get('/api/services/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # The latest updated_at is unchanged, the row count is not
+        Service.objects.filter(pk=self.old.pk).update(is_active=False)
+        response = self.client.get('/api/services/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.new.id])
+
+    def test_approval_changes_etag(self):
+        admin = CustomUser.objects.create_user(
+            'admin', password=None, user_type='admin', is_staff=True
+        )
+        barber = CustomUser.objects.create_user('barber', password=None, user_type='barber')
+        profile = BarberProfile.objects.create(user=barber)
+        self.client.force_authenticate(admin)
+        etag = self.client.get('/api/barbers/')['ETag']
+
+        response = self.client.post(f'/api/barbers/{profile.id}/approve/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/barbers/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'][0]['is_approved'])
+
+    def test_modified_since_alone_is_not_a_validator(self):
+        since = http_date(timezone.now().timestamp() + 60)
+        response = self.client.get('/api/services/', HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0)
+class RequestTimingTests(APITestCase):
+
+    def test_sampled_request(self):
+        Service.objects.create(name='Beard', duration=15, price=5)
+        with self.assertLogs('api.timing', 'DEBUG') as logs:
+            response = self.client.get('/api/services/')
+        self.assertRegex(response['Server-Timing'], r'db;dur=.*, render;dur=[\d.]+, view;dur=')
+        [record] = logs.records
+        self.assertEqual((record.levelname, record.path), ('DEBUG', '/api/services/'))
+
+
+@mock.patch('api.authentication.token_cache', SharedTokenCache(300))
+class TokenRevocationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user('client', password=None)
+        self.token = Token.objects.create(user=self.user)
+        # Deleting the token clears its key, which is the primary key
+        self.key = self.token.key
+        self.authentication = CachedTokenAuthentication()
+
+    def racing_lookup(self, change):
+        """Authenticate, with ``change`` committed between the database read and the cache write"""
+        read = TokenAuthentication.authenticate_credentials
+
+        def read_then_change(authentication, key):
+            result = read(authentication, key)
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            return result
+
+        with mock.patch.object(TokenAuthentication, 'authenticate_credentials', read_then_change):
+            self.authentication.authenticate_credentials(self.key)
+
+    def test_logout_during_lookup(self):
+        self.racing_lookup(self.token.delete)
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.key)
+
+    def test_deactivation_during_lookup(self):
+        def deactivate():
+            self.user.is_active = False
+            self.user.save()
+
+        self.racing_lookup(deactivate)
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.key)
+
+    def test_cache_hit(self):
+        self.authentication.authenticate_credentials(self.key)
+        with self.assertNumQueries(0):
+            user, _ = self.authentication.authenticate_credentials(self.key)
+        self.assertEqual(user.pk, self.user.pk)
+
+
+class AvailabilityStreamTests(SimpleTestCase):
+
+    def setUp(self):
+        self.key = (1, date(2026, 1, 5))
+        profile = BarberProfile(pk=7, user=CustomUser(pk=1, username='barber'))
+        self.subscriber = Subscriber({self.key: profile}, 30)
+        self.subscriber.snapshot(self.key, self.index(time(9), time(10)))
+
+    def index(self, start, end, busy=()):
+        return AvailabilityIndex(work_start=start, work_end=end, busy=list(busy))
+
+    def events(self, index):
+        self.subscriber.notify(self.key, index)
+        return list(self.subscriber.events())
+
+    def test_booking_sends_a_delta(self):
+        self.assertEqual(self.events(self.index(time(9), time(10), [[570, 600]])), [
+            ('delta', {'barber_id': 7, 'date': '2026-01-05', 'slots': [
+                {'time': '09:30', 'available': False},
+            ]}),
+        ])
+        # Nothing changed since
+        self.assertEqual(self.events(self.index(time(9), time(10), [[570, 600]])), [])
+
+    def test_working_hours_send_a_snapshot(self):
+        [(event, data)] = self.events(self.index(time(9), time(11)))
+        self.assertEqual((event, len(data['available_slots'])), ('snapshot', 4))
+        [(event, data)] = self.events(self.index(None, None))
+        self.assertEqual((event, data['available']), ('snapshot', False))
+        self.assertEqual(self.events(self.index(None, None)), [])
+
+    async def test_lost_connection_fails_the_streams(self):
+        connection_hub = AvailabilityHub()
+        connection_hub.loop = asyncio.get_running_loop()
+        connection_hub.subscribers[self.key].add(self.subscriber)
+        with mock.patch('api.streams.RECONNECT_DELAYS', (0,)), \
+                mock.patch('api.streams.listen', side_effect=psycopg2.OperationalError), \
+                self.assertLogs('api.streams', 'WARNING'):
+            await connection_hub.reconnect()
+        self.assertTrue(self.subscriber.wakeup.is_set())
+        self.assertEqual(self.subscriber.error, 'Availability changes are unavailable')
+
+    async def test_closed_stream_leaves_no_task(self):
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': STREAM_PATH,
+            'query_string': b'', 'headers': [],
+        }
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def send(message):
+            pass
+
+        with mock.patch('api.streams.aauthenticate', return_value=AnonymousUser()), \
+                mock.patch('api.streams.prepare_subscriber', return_value=self.subscriber), \
+                mock.patch('api.streams.load_snapshots', return_value=[]), \
+                mock.patch.object(hub, 'subscribe'):
+            stream = asyncio.ensure_future(availability_stream(scope, receive, send))
+            while not hub.subscribe.called:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.01)
+            # The server cancels the application of a closed connection
+            stream.cancel()
+            await asyncio.gather(stream, return_exceptions=True)
+            await asyncio.sleep(0)
+        pending = asyncio.all_tasks() - {asyncio.current_task()}
+        self.assertEqual(pending, set())
@@ -0,0 +1,144 @@
+"""
+Per-request SQL and timing measurements (see api.middleware.RequestTimingMiddleware)
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from barbershop import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Timing of the request being handled, None outside sampled requests
+current_timing = ContextVar('request_timing', default=None)
+
+# Placeholder lists of IN clauses, whose length depends on the values
+PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+
+
+class RequestTiming:
+    """
+    Counts and times the queries of a request. Sampled requests also time
+    the rendering of their response and group their queries by shape, the
+    SQL with IN lists collapsed, so the same query run once per row of a
+    page shows up as one shape repeated.
+    """
+
+    def __init__(self, sampled):
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+            if self.sampled:
+                self.shapes[sql] += 1
+
+    def time_rendering(self, response):
+        """
+        Time the rendering of a template response, where DRF encodes the
+        serialized data. The serializers themselves run in the view.
+        """
+        started = time.perf_counter()
+
+        def rendered(response):
+            self.render_seconds += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+
+    def repeated_shapes(self, threshold):
+        """Suspected N+1 queries: (shape, count) run at least ``threshold`` times"""
+        counts = Counter()
+        for sql, count in self.shapes.items():
+            counts[PLACEHOLDER_LIST.sub('%s', sql)] += count
+        return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+    def record_metrics(self, request, response):
+        """Add the request to the latency, request and query metrics"""
+        labels = view_labels(request)
+        metrics.observe('http_request_duration_seconds', labels, time.perf_counter() - self.started)
+        metrics.inc('http_requests_total', {
+            **labels, 'method': request.method, 'status': str(response.status_code)
+        })
+        metrics.inc('db_queries_total', labels, self.queries)
+        metrics.inc('db_query_duration_seconds_total', labels, self.db_seconds)
+
+    def finish(self, request, response):
+        """Add the Server-Timing header and log the measurements"""
+        view_ms = (time.perf_counter() - self.started) * 1000
+        db_ms = self.db_seconds * 1000
+        render_ms = self.render_seconds * 1000
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{self.queries} queries", '
+            f'render;dur={render_ms:.1f}, view;dur={view_ms:.1f}'
+        )
+
+        repeated = self.repeated_shapes(settings.REQUEST_TIMING_N_PLUS_ONE_THRESHOLD)
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': self.queries,
+            'db_ms': round(db_ms, 1),
+            'render_ms': round(render_ms, 1),
+            'view_ms': round(view_ms, 1),
+            'n_plus_one': len(repeated),
+        }
+        logger.debug(
+            ' '.join(f'{name}={value}' for name, value in fields.items()), extra=fields
+        )
+        for shape, count in repeated:
+            logger.warning(
+                f"Suspected N+1: {request.method} {request.path} ran {count} times: {shape[:300]}",
+                extra={'method': request.method, 'path': request.path, 'count': count, 'sql': shape}
+            )
+
+
+def view_labels(request):
+    """
+    Metric labels of a request: the DRF view class (named after the
+    function for @api_view views) and the viewset action, or the method
+    """
+    method = request.method.lower()
+    match = request.resolver_match
+    if match is None:
+        return {'view': 'unresolved', 'action': method}
+    cls = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None) or {}
+    return {
+        'view': cls.__name__ if cls is not None else match.func.__name__,
+        'action': actions.get(method, method),
+    }
+
+
+def time_queries(execute, sql, params, many, context):
+    """Execute wrapper that hands the queries of sampled requests to their timing"""
+    timing = current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    return timing(execute, sql, params, many, context)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """
+    connection_created receiver. The wrapper stays on every connection
+    rather than being added per request: async views run their queries on
+    connections of sync_to_async threads, which only the context variable
+    reaches.
+    """
+    if time_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_queries)
+
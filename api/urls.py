@@ -1,8 +1,11 @@
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     UserViewSet, BarberProfileViewSet, ServiceViewSet, 
-    AppointmentViewSet, register_view, login_view, logout, dashboard_stats
+    AppointmentViewSet, register_view, login_view, logout, dashboard_stats,
+    availability_matrix, appointment_report, database_connections, profile_list,
+    profile_detail
 )
 
 router = DefaultRouter()
@@ -17,5 +20,30 @@ urlpatterns = [
     path('login/', login_view, name='login'),
     path('logout/', logout, name='logout'),
     path('dashboard/stats/', dashboard_stats, name='dashboard-stats'),
+    path('availability/', availability_matrix, name='availability-matrix'),
+    path('reports/appointments/', appointment_report, name='appointment-report'),
+    path('database/connections/', database_connections, name='database-connections'),
+    path('profiles/', profile_list, name='profile-list'),
+    path('profiles/<str:profile_id>/', profile_detail, name='profile-detail'),
 ]
 
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views
+
+    # Listed first so they take over the matching GET routes above
+    urlpatterns = [
+        path('services/', async_views.get_or_fallback(
+            async_views.service_list,
+            ServiceViewSet.as_view({'get': 'list', 'post': 'create'})
+        ), name='service-list'),
+        path('barbers/', async_views.get_or_fallback(
+            async_views.barber_list,
+            BarberProfileViewSet.as_view({'get': 'list', 'post': 'create'})
+        ), name='barber-profile-list'),
+        re_path(
+            r'^barbers/(?P<pk>[^/.]+)/availability/$',
+            async_views.barber_availability,
+            name='barber-profile-availability'
+        ),
+        path('dashboard/stats/', async_views.dashboard_stats, name='dashboard-stats'),
+    ] + urlpatterns
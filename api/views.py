@@ -2,24 +2,136 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.authtoken.models import Token
+from django.conf import settings
 from django.contrib.auth import login
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from datetime import datetime, timedelta
+from decimal import Decimal
+import os
 
-from users.models import CustomUser, BarberProfile, Service, Appointment
+from barbershop.db_pool.pool import pool_stats
+
+from users.models import (
+    CustomUser, BarberProfile, Service, Appointment, AppointmentRollup,
+    AppointmentSeries
+)
+from users.bulk import transition
+from users.series import cancel_upcoming, check_occurrences, create_series
+from users.stats import get_dashboard_stats
+from users.availability import (
+    SLOT_MINUTES, working_hours, compute_slots, get_availability_index,
+    load_busy_intervals_for_range, slot_bitmap
+)
+from .exceptions import BookingConflict, is_booking_conflict
+from .exports import EXPORT_FORMATS, export_response, export_rows
+from .mixins import ConditionalListMixin, QueryBudgetMixin
+from .profiling import load_profile, stored_profiles
+from .pagination import AppointmentPagination, UserPagination
 from .serializers import (
     UserSerializer, RegisterSerializer, LoginSerializer,
     BarberProfileSerializer, ServiceSerializer, 
-    AppointmentSerializer, AppointmentCreateSerializer
+    AppointmentSerializer, AppointmentCreateSerializer,
+    AppointmentSeriesSerializer, AppointmentSeriesCreateSerializer,
+    AppointmentTransitionSerializer
 )
 
+# Longest date range accepted by the availability matrix
+MAX_AVAILABILITY_DAYS = 31
+
+# Longest date range accepted by the appointment report
+MAX_REPORT_DAYS = 366
+
+# Appointments changed per bulk transition request in filter mode; the
+# response says when more match, and the same request changes the next ones
+MAX_BULK_TRANSITION = 500
+
+# Report grouping names and the rollup fields behind them
+REPORT_GROUPS = {
+    'date': ['date'],
+    'barber': ['barber_id', 'barber__username'],
+    'service': ['service_id', 'service__name'],
+    'status': ['status'],
+}
+
+# Statuses whose minutes and price count as booked in the report;
+# revenue only counts completed appointments
+REPORT_BOOKED_STATUSES = [*Appointment.ACTIVE_STATUSES, 'completed']
+
+
+def requested_service_duration(request):
+    """
+    Slot length for availability lookups: the duration of the service in
+    the ``service_id`` query parameter, or the default 30 minutes slot.
+    Returns None when the service does not exist or is inactive.
+    """
+    service_id = request.query_params.get('service_id')
+    if not service_id:
+        return SLOT_MINUTES
+    try:
+        return service_durations().get(id=service_id)
+    except (Service.DoesNotExist, ValueError):
+        return None
+
+
+def service_durations():
+    """Durations of the services that can be booked, by id"""
+    return Service.objects.filter(is_active=True).values_list('duration', flat=True)
+
+
+def availability_data(index, date_str, barber_name, service_duration):
+    """Response body of the barber availability endpoint"""
+    if not index.work_start or not index.work_end:
+        return {"available": False, "reason": "Barber doesn't work on this day"}
+    
+    available_slots = compute_slots(
+        index.work_start, index.work_end, index.busy,
+        duration=service_duration
+    )
+    
+    return {
+        'date': date_str,
+        'barber': barber_name,
+        'service_duration': service_duration,
+        'available_slots': available_slots
+    }
+
+
+def visible_barber_profiles(user):
+    """Barber profiles the user may see, with their user, in a stable order for paging"""
+    profiles = BarberProfile.objects.select_related('user').order_by('id')
+    if user.is_authenticated and user.user_type == 'admin':
+        return profiles.all()
+    elif user.is_authenticated and user.user_type == 'barber':
+        # Barbers can only see their own profile
+        return profiles.filter(user=user)
+    else:
+        # Public can see only approved barber profiles
+        return profiles.filter(is_approved=True)
+
+
+def visible_services(user):
+    """Services the user may see, in a stable order for paging"""
+    services = Service.objects.order_by('id')
+    if user.is_authenticated and user.user_type == 'admin':
+        return services
+    else:
+        # Public can only see active services
+        return services.filter(is_active=True)
 
-class UserViewSet(viewsets.ModelViewSet):
+
+class UserViewSet(QueryBudgetMixin, viewsets.ModelViewSet):
     """ViewSet for managing users"""
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
+    pagination_class = UserPagination
+    query_budgets = {'list': 3, 'retrieve': 2, 'me': 1}
     
     def get_permissions(self):
         if self.action in ['create']:
@@ -64,10 +176,15 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class BarberProfileViewSet(viewsets.ModelViewSet):
+class BarberProfileViewSet(QueryBudgetMixin, ConditionalListMixin, viewsets.ModelViewSet):
     """ViewSet for barber profiles"""
     queryset = BarberProfile.objects.all()
     serializer_class = BarberProfileSerializer
+    # Profiles embed their user
+    validator_fields = ('updated_at', 'user__updated_at')
+    query_budgets = {
+        'list': 4, 'retrieve': 2, 'my_profile': 2, 'availability': 6,
+    }
     
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -77,15 +194,7 @@ class BarberProfileViewSet(viewsets.ModelViewSet):
         return [AllowAny()]
     
     def get_queryset(self):
-        user = self.request.user
-        if user.is_authenticated and user.user_type == 'admin':
-            return BarberProfile.objects.all()
-        elif user.is_authenticated and user.user_type == 'barber':
-            # Barbers can only see their own profile
-            return BarberProfile.objects.filter(user=user)
-        else:
-            # Public can see only approved barber profiles
-            return BarberProfile.objects.filter(is_approved=True)
+        return visible_barber_profiles(self.request.user)
     
     def perform_create(self, serializer):
         # If user is a barber, automatically assign their profile
@@ -99,7 +208,8 @@ class BarberProfileViewSet(viewsets.ModelViewSet):
         """Approve a barber profile (admin only)"""
         profile = self.get_object()
         profile.is_approved = True
-        profile.save(update_fields=['is_approved'])
+        # updated_at feeds the list ETag
+        profile.save(update_fields=['is_approved', 'updated_at'])
         serializer = self.get_serializer(profile)
         return Response(serializer.data)
     
@@ -113,7 +223,7 @@ class BarberProfileViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            profile = BarberProfile.objects.get(user=request.user)
+            profile = BarberProfile.objects.select_related('user').get(user=request.user)
             serializer = self.get_serializer(profile)
             return Response(serializer.data)
         except BarberProfile.DoesNotExist:
@@ -124,7 +234,10 @@ class BarberProfileViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def availability(self, request, pk=None):
-        """Get barber availability for a specific date"""
+        """
+        Get barber availability for a specific date.
+        Pass ``service_id`` to only offer slots that fit that service.
+        """
         barber_profile = self.get_object()
         date_str = request.query_params.get('date')
         
@@ -142,68 +255,26 @@ class BarberProfileViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get barber's operating hours for the day
-        weekday = appointment_date.weekday()
-        time_fields = {
-            0: ('monday_start', 'monday_end'),
-            1: ('tuesday_start', 'tuesday_end'),
-            2: ('wednesday_start', 'wednesday_end'),
-            3: ('thursday_start', 'thursday_end'),
-            4: ('friday_start', 'friday_end'),
-            5: ('saturday_start', 'saturday_end'),
-            6: ('sunday_start', 'sunday_end'),
-        }
-        
-        start_field, end_field = time_fields[weekday]
-        start_time = getattr(barber_profile, start_field)
-        end_time = getattr(barber_profile, end_field)
-        
-        if not start_time or not end_time:
+        service_duration = requested_service_duration(request)
+        if service_duration is None:
             return Response(
-                {"available": False, "reason": "Barber doesn't work on this day"}
+                {"error": "Invalid service_id"},
+                status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get existing appointments for the day
-        appointments = Appointment.objects.filter(
-            barber=barber_profile.user,
-            appointment_date=appointment_date,
-            status__in=['scheduled', 'confirmed', 'in_progress']
-        )
-        
-        # Generate available time slots
-        available_slots = []
-        current_time = start_time
-        service_duration = 30  # Default 30 minutes slots
-        
-        while current_time < end_time:
-            slot_end = (datetime.combine(appointment_date, current_time) + 
-                       timedelta(minutes=service_duration)).time()
-            
-            # Check if slot is available
-            is_available = not appointments.filter(
-                appointment_time__lt=slot_end,
-                appointment_time__gte=current_time
-            ).exists()
-            
-            available_slots.append({
-                'time': current_time.strftime('%H:%M'),
-                'available': is_available
-            })
-            
-            # Move to next slot
-            current_time = slot_end
+        # Working hours and busy intervals come from the availability index
+        index = get_availability_index(barber_profile, appointment_date)
         
-        return Response({
-            'date': date_str,
-            'barber': barber_profile.user.username,
-            'available_slots': available_slots
-        })
+        return Response(availability_data(
+            index, date_str, barber_profile.user.username, service_duration
+        ))
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(QueryBudgetMixin, ConditionalListMixin, viewsets.ModelViewSet):
     """ViewSet for services"""
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
+    query_budgets = {'list': 4, 'retrieve': 2}
     
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -213,115 +284,278 @@ class ServiceViewSet(viewsets.ModelViewSet):
         return [AllowAny()]
     
     def get_queryset(self):
-        user = self.request.user
-        if user.is_authenticated and user.user_type == 'admin':
-            return Service.objects.all()
-        else:
-            # Public can only see active services
-            return Service.objects.filter(is_active=True)
+        return visible_services(self.request.user)
+    
+    def handle_exception(self, exc):
+        # A booking made since the duration was validated now overlaps
+        if is_booking_conflict(exc):
+            exc = BookingConflict("The new duration makes upcoming appointments overlap other bookings.")
+        return super().handle_exception(exc)
+    
+    # The upcoming appointments are retimed by the signal handler in the
+    # same transaction
+    @transaction.atomic
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(QueryBudgetMixin, viewsets.ModelViewSet):
     """ViewSet for appointments"""
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
+    pagination_class = AppointmentPagination
+    # No budget for export: its rows are read while the response streams,
+    # after dispatch has returned and the queries stopped being counted
+    query_budgets = {
+        'list': 3, 'retrieve': 2, 'create': 9,
+        'cancel': 8, 'confirm': 8, 'complete': 7, 'bulk_transition': 8,
+        'series': 11, 'cancel_series': 7,
+    }
     
     def get_permissions(self):
         return [IsAuthenticated()]
     
     def get_queryset(self):
         user = self.request.user
+        # Fetch every relation nested by AppointmentSerializer
+        appointments = Appointment.objects.select_related('client', 'barber', 'service')
         if user.user_type == 'admin':
-            return Appointment.objects.all()
+            return appointments.all()
         elif user.user_type == 'barber':
-            return Appointment.objects.filter(barber=user)
+            return appointments.filter(barber=user)
         else:
-            return Appointment.objects.filter(client=user)
+            return appointments.filter(client=user)
     
     def get_serializer_class(self):
         if self.action == 'create':
             return AppointmentCreateSerializer
         return AppointmentSerializer
     
+    def handle_exception(self, exc):
+        # Handlers run in a transaction, so it is already rolled back here
+        if is_booking_conflict(exc):
+            exc = BookingConflict()
+        return super().handle_exception(exc)
+    
+    # Appointment changes and the derived data updated by the signal
+    # handlers (availability index) are committed together
+    @transaction.atomic
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+    
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+    
+    @transaction.atomic
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
         
-        # Return full appointment data using AppointmentSerializer
-        appointment = Appointment.objects.get(id=serializer.instance.id)
-        appointment_serializer = AppointmentSerializer(appointment)
+        # Return full appointment data using AppointmentSerializer; the
+        # saved instance already holds the client, barber and service
+        appointment_serializer = AppointmentSerializer(serializer.instance)
         return Response(appointment_serializer.data, status=status.HTTP_201_CREATED, headers=headers)
     
-    @action(detail=True, methods=['post'])
-    def cancel(self, request, pk=None):
-        """Cancel an appointment"""
-        appointment = self.get_object()
+    @action(detail=False, methods=['post'])
+    @transaction.atomic
+    def series(self, request):
+        """
+        Book a recurring series. Every occurrence is checked against the
+        barber's hours and bookings at once and reported with its conflict,
+        if any. Unless skip_conflicts is set, a single conflict books nothing.
+        """
+        serializer = AppointmentSeriesCreateSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        data = dict(serializer.validated_data)
+        dates = data.pop('dates')
+        skip_conflicts = data.pop('skip_conflicts')
         
-        if appointment.status in ['cancelled', 'completed']:
+        conflicts = check_occurrences(
+            data['barber'].barber_profile, data['service'], data['appointment_time'], dates
+        )
+        occurrences = [
+            {'date': day.isoformat(), 'conflict': conflicts.get(day)} for day in dates
+        ]
+        if conflicts and (not skip_conflicts or len(conflicts) == len(dates)):
             return Response(
-                {"error": "Appointment cannot be cancelled"},
-                status=status.HTTP_400_BAD_REQUEST
+                {"error": "Some occurrences cannot be booked", "occurrences": occurrences},
+                status=status.HTTP_409_CONFLICT
             )
         
-        appointment.status = 'cancelled'
-        appointment.save()
+        series = AppointmentSeries(client=request.user, **data)
+        appointments = create_series(series, dates, conflicts)
+        
+        booked = {appointment.appointment_date: appointment.id for appointment in appointments}
+        for occurrence, day in zip(occurrences, dates):
+            occurrence['appointment_id'] = booked.get(day)
+        return Response({
+            'series': AppointmentSeriesSerializer(series).data,
+            'created': len(appointments),
+            'occurrences': occurrences
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'], url_path=r'series/(?P<series_id>\d+)/cancel')
+    @transaction.atomic
+    def cancel_series(self, request, series_id=None):
+        """Cancel the upcoming occurrences of a series with a single UPDATE"""
+        user = request.user
+        visible = AppointmentSeries.objects.all()
+        if user.user_type == 'barber':
+            visible = visible.filter(barber=user)
+        elif user.user_type != 'admin':
+            visible = visible.filter(client=user)
+        series = get_object_or_404(visible, pk=series_id)
+        
+        cancelled = cancel_upcoming(series, timezone.now().date())
+        return Response({
+            'series': series.id,
+            'cancelled': sorted(row['id'] for row in cancelled)
+        })
+    
+    def apply_transition(self, pk, action, invalid_message):
+        """
+        Run a status action on one appointment through the same
+        compare-and-set UPDATE as the bulk transitions
+        """
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise Http404
         
-        serializer = self.get_serializer(appointment)
+        result = transition(self.get_queryset(), action, ids=[pk])[pk]
+        if result['outcome'] == 'not_found':
+            raise Http404
+        if result['outcome'] == 'invalid_transition':
+            return Response(
+                {"error": invalid_message},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = self.get_serializer(self.get_object())
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
+    @transaction.atomic
+    def cancel(self, request, pk=None):
+        """Cancel an appointment"""
+        return self.apply_transition(pk, 'cancel', "Appointment cannot be cancelled")
+    
+    @action(detail=True, methods=['post'])
+    @transaction.atomic
     def confirm(self, request, pk=None):
-        """Confirm an appointment (barbers only)"""
+        """Confirm an appointment (barbers only, own appointments)"""
         if request.user.user_type != 'barber':
             return Response(
                 {"error": "Only barbers can confirm appointments"},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        appointment = self.get_object()
-        
-        if appointment.barber != request.user:
-            return Response(
-                {"error": "You can only confirm your own appointments"},
-                status=status.HTTP_403_FORBIDDEN
-            )
-        
-        appointment.status = 'confirmed'
-        appointment.save()
-        
-        serializer = self.get_serializer(appointment)
-        return Response(serializer.data)
-
+        return self.apply_transition(pk, 'confirm', "Appointment cannot be confirmed")
+    
     @action(detail=True, methods=['post'])
+    @transaction.atomic
     def complete(self, request, pk=None):
-        """Mark an appointment as completed (barbers only)"""
+        """Mark an appointment as completed (barbers only, own appointments)"""
         if request.user.user_type != 'barber':
             return Response(
                 {"error": "Only barbers can complete appointments"},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        appointment = self.get_object()
-        
-        if appointment.barber != request.user:
+        return self.apply_transition(pk, 'complete', "Appointment cannot be marked as completed")
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream every appointment matching optional date_from, date_to
+        (YYYY-MM-DD) and status (comma separated) filters, oldest first, as
+        CSV or, with ``?output=ndjson``, one JSON object per line (admins only)
+        """
+        if request.user.user_type != 'admin':
             return Response(
-                {"error": "You can only complete your own appointments"},
+                {"error": "Only admins can access this endpoint"},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if appointment.status in ['cancelled', 'completed']:
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
             return Response(
-                {"error": "Appointment cannot be marked as completed"},
+                {"error": f"Invalid output. Choose from: {', '.join(EXPORT_FORMATS)}"},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        appointment.status = 'completed'
-        appointment.save()
+        try:
+            date_from, date_to = (
+                datetime.strptime(request.query_params[name], '%Y-%m-%d').date()
+                if request.query_params.get(name) else None
+                for name in ('date_from', 'date_to')
+            )
+        except ValueError:
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        serializer = self.get_serializer(appointment)
-        return Response(serializer.data)
+        statuses = [name for name in request.query_params.get('status', '').split(',') if name]
+        valid_statuses = [choice[0] for choice in Appointment.STATUS_CHOICES]
+        if set(statuses) - set(valid_statuses):
+            return Response(
+                {"error": f"Invalid status. Choose from: {', '.join(valid_statuses)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        filename = '-'.join(
+            ['appointments'] + [day.isoformat() for day in (date_from, date_to) if day]
+        )
+        return export_response(
+            request._request, export_rows(date_from, date_to, statuses), output, filename
+        )
+    
+    @action(detail=False, methods=['post'], url_path='transition')
+    @transaction.atomic
+    def bulk_transition(self, request):
+        """
+        Apply cancel, confirm or complete to a list of ids, or to the
+        appointments matching a date and/or status filter, e.g. all of
+        today's confirmed appointments, MAX_BULK_TRANSITION at a time.
+        Returns the outcome of each one.
+        """
+        serializer = AppointmentTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        if data['action'] in ['confirm', 'complete'] and request.user.user_type != 'barber':
+            return Response(
+                {"error": f"Only barbers can {data['action']} appointments"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        appointments = self.get_queryset()
+        if 'date' in data:
+            appointments = appointments.filter(appointment_date=data['date'])
+        if 'status' in data:
+            appointments = appointments.filter(status=data['status'])
+        
+        if 'ids' in data:
+            results = transition(appointments, data['action'], ids=data['ids'])
+            has_more = False
+        else:
+            # A filter can match any number of rows: change them in pages
+            results = transition(appointments, data['action'], limit=MAX_BULK_TRANSITION)
+            has_more = len(results) == MAX_BULK_TRANSITION and appointments.filter(
+                status__in=Appointment.TRANSITIONS[data['action']][1]
+            ).exists()
+        return Response({
+            'action': data['action'],
+            'updated': sum(result['outcome'] == 'updated' for result in results.values()),
+            'has_more': has_more,
+            'results': [{'id': pk, **results[pk]} for pk in sorted(results)]
+        })
 
 
 @api_view(['POST'])
@@ -366,50 +600,245 @@ def login_view(request):
 @permission_classes([IsAuthenticated])
 def logout(request):
     """Logout endpoint"""
-    try:
-        token = request.user.auth_token
-        token.delete()
-    except:
-        pass
+    # Deleting the token also drops it from the authentication cache
+    Token.objects.filter(user=request.user).delete()
     return Response({"message": "Logout successful"})
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def availability_matrix(request):
+    """
+    Availability of every approved barber over a date range.
+
+    Barbers are paginated; for each page the schedules and the appointments
+    of the whole range are fetched with one query each. Every working day
+    is returned as its start time plus a slot bitmap ('1' free, '0' busy),
+    one character per 30 minutes slot.
+    """
+    try:
+        date_from = datetime.strptime(request.query_params['date_from'], '%Y-%m-%d').date()
+        date_to = datetime.strptime(request.query_params['date_to'], '%Y-%m-%d').date()
+    except KeyError:
+        return Response(
+            {"error": "Parameters 'date_from' and 'date_to' are required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except ValueError:
+        return Response(
+            {"error": "Invalid date format. Use YYYY-MM-DD"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    days = (date_to - date_from).days + 1
+    if days < 1 or days > MAX_AVAILABILITY_DAYS:
+        return Response(
+            {"error": f"Date range must span 1 to {MAX_AVAILABILITY_DAYS} days"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    service_duration = requested_service_duration(request)
+    if service_duration is None:
+        return Response(
+            {"error": "Invalid service_id"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    profiles = BarberProfile.objects.filter(
+        is_approved=True
+    ).select_related('user').order_by('id')
+    paginator = PageNumberPagination()
+    page = paginator.paginate_queryset(profiles, request)
+    
+    busy = load_busy_intervals_for_range(
+        [profile.user_id for profile in page], date_from, date_to
+    )
+    dates = [date_from + timedelta(days=offset) for offset in range(days)]
+    
+    results = []
+    for profile in page:
+        schedule = {}
+        for day in dates:
+            start_time, end_time = working_hours(profile, day)
+            if not start_time or not end_time:
+                schedule[day.isoformat()] = None
+                continue
+            schedule[day.isoformat()] = {
+                'start': start_time.strftime('%H:%M'),
+                'slots': slot_bitmap(
+                    start_time, end_time,
+                    busy.get((profile.user_id, day), []),
+                    duration=service_duration
+                )
+            }
+        results.append({
+            'id': profile.id,
+            'barber_id': profile.user_id,
+            'barber': profile.user.username,
+            'days': schedule
+        })
+    
+    response = paginator.get_paginated_response(results)
+    response.data['slot_minutes'] = SLOT_MINUTES
+    response.data['service_duration'] = service_duration
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def dashboard_stats(request):
     """Get dashboard statistics based on user type"""
-    user = request.user
-    
-    if user.user_type == 'admin':
-        stats = {
-            'total_users': CustomUser.objects.count(),
-            'total_clients': CustomUser.objects.filter(user_type='client').count(),
-            'total_barbers': CustomUser.objects.filter(user_type='barber').count(),
-            'total_appointments': Appointment.objects.count(),
-            'pending_appointments': Appointment.objects.filter(status='scheduled').count(),
-        }
-    elif user.user_type == 'barber':
-        appointments = Appointment.objects.filter(barber=user)
-        stats = {
-            'total_appointments': appointments.count(),
-            'today_appointments': appointments.filter(
-                appointment_date=timezone.now().date()
-            ).count(),
-            'pending_appointments': appointments.filter(status='scheduled').count(),
-            'completed_appointments': appointments.filter(status='completed').count(),
-        }
-    else:  # client
-        appointments = Appointment.objects.filter(client=user)
-        stats = {
-            'total_appointments': appointments.count(),
-            'upcoming_appointments': appointments.filter(
-                appointment_date__gte=timezone.now().date(),
-                status__in=['scheduled', 'confirmed']
-            ).count(),
-            'past_appointments': appointments.filter(
-                appointment_date__lt=timezone.now().date()
-            ).count(),
-        }
+    stats = get_dashboard_stats(request.user)
     
     return Response(stats)
 
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def appointment_report(request):
+    """
+    Appointment counts, booked minutes and revenue over a date range,
+    grouped by any of date, barber, service and status (default: date).
+
+    Reads only the daily rollup, so the cost depends on the number of
+    (date, barber, service, status) combinations, not on the appointments.
+    Minutes and revenue are at the current service durations and prices.
+    Booked minutes and revenue leave out cancelled and no-show appointments,
+    revenue only counts completed ones; the totals give the count of each
+    status.
+    """
+    if request.user.user_type != 'admin':
+        return Response(
+            {"error": "Only admins can access this endpoint"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    try:
+        date_from = datetime.strptime(request.query_params['date_from'], '%Y-%m-%d').date()
+        date_to = datetime.strptime(request.query_params['date_to'], '%Y-%m-%d').date()
+    except KeyError:
+        return Response(
+            {"error": "Parameters 'date_from' and 'date_to' are required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except ValueError:
+        return Response(
+            {"error": "Invalid date format. Use YYYY-MM-DD"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    days = (date_to - date_from).days + 1
+    if days < 1 or days > MAX_REPORT_DAYS:
+        return Response(
+            {"error": f"Date range must span 1 to {MAX_REPORT_DAYS} days"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    group_by = [
+        name for name in request.query_params.get('group_by', 'date').split(',') if name
+    ]
+    unknown = set(group_by) - set(REPORT_GROUPS)
+    if unknown:
+        return Response(
+            {"error": f"Invalid group_by. Choose from: {', '.join(REPORT_GROUPS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    fields = [field for name in group_by for field in REPORT_GROUPS[name]]
+    
+    in_range = AppointmentRollup.objects.filter(
+        date__range=(date_from, date_to), count__gt=0
+    )
+    booked = Q(status__in=REPORT_BOOKED_STATUSES)
+    rows = in_range.values(*fields).annotate(
+        count=Sum('count'),
+        booked_minutes=Coalesce(Sum('booked_minutes', filter=booked), 0),
+        booked_revenue=Coalesce(Sum('revenue', filter=booked), Decimal(0)),
+        revenue=Coalesce(Sum('revenue', filter=Q(status='completed')), Decimal(0)),
+    ).order_by(*fields)
+    
+    results = []
+    totals = {'count': 0, 'booked_minutes': 0, 'booked_revenue': 0, 'revenue': 0}
+    for row in rows:
+        for name in totals:
+            totals[name] += row[name]
+        if 'date' in row:
+            row['date'] = row['date'].isoformat()
+        row['booked_revenue'] = str(row['booked_revenue'])
+        row['revenue'] = str(row['revenue'])
+        results.append(row)
+    totals['booked_revenue'] = str(totals['booked_revenue'])
+    totals['revenue'] = str(totals['revenue'])
+    totals['status_counts'] = dict(
+        in_range.values_list('status').annotate(total=Sum('count')).order_by('status')
+    )
+    
+    return Response({
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'group_by': group_by,
+        'results': results,
+        'totals': totals,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def database_connections(request):
+    """
+    Connection settings and, with DB_POOL on, the pool metrics of the worker
+    process that answers: connections open, idle and in use, how many
+    requests had to wait for one and for how long, and wait timeouts.
+    Sustained waits mean DB_POOL_MAX_SIZE is too small for the worker.
+    """
+    if request.user.user_type != 'admin':
+        return Response(
+            {"error": "Only admins can access this endpoint"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    database = settings.DATABASES['default']
+    return Response({
+        'pid': os.getpid(),
+        'conn_max_age': database['CONN_MAX_AGE'],
+        'conn_health_checks': database['CONN_HEALTH_CHECKS'],
+        'pooled': 'POOL' in database,
+        'pools': pool_stats(),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profile_list(request):
+    """Profiles of the requests sent with X-Profile: 1 or ?profile=1, newest first"""
+    if request.user.user_type != 'admin':
+        return Response(
+            {"error": "Only admins can access this endpoint"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    return Response(stored_profiles())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profile_detail(request, profile_id):
+    """
+    A stored profile with its SQL statements and timings. ``?output=folded``
+    returns only the stacks, in the folded format that flamegraph.pl and
+    speedscope read (weights are microseconds of wall time).
+    """
+    if request.user.user_type != 'admin':
+        return Response(
+            {"error": "Only admins can access this endpoint"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    profile = load_profile(profile_id)
+    if profile is None:
+        return Response({"error": "Request profile not found"}, status=status.HTTP_404_NOT_FOUND)
+    if request.query_params.get('output') == 'folded':
+        return HttpResponse(
+            ''.join(f'{line}\n' for line in profile['folded']),
+            content_type='text/plain; charset=utf-8'
+        )
+    return Response(profile)
@@ -2,6 +2,7 @@
 ASGI config for barbershop project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Availability streams are served in front of Django (see api.streams).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,5 +14,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'barbershop.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
 
+# Imported once get_asgi_application() has loaded the apps
+from api.streams import route_availability_stream  # noqa: E402
+
+application = route_availability_stream(django_application)
@@ -0,0 +1,9 @@
+"""
+PostgreSQL backend with an in-process connection pool.
+
+Selected with DB_POOL=True (see settings.DATABASES). Instead of opening a
+connection for each request and closing it at the end, the database
+wrapper borrows an open one from a pool shared by the threads of the
+process and gives it back when Django closes it. See ``pool`` for the
+pool itself and its wait metrics.
+"""
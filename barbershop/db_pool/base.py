@@ -0,0 +1,51 @@
+"""
+DatabaseWrapper of the pooled PostgreSQL backend
+"""
+from django.db.backends.postgresql import base, creation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from .pool import close_pools, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Pooled connections to the test database would block DROP DATABASE
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL wrapper whose connections come from and go back to the
+    process pool configured by the POOL entry of the database settings
+    (MAX_SIZE, TIMEOUT, CHECK_IDLE and MAX_LIFETIME, in seconds)
+    """
+    creation_class = DatabaseCreation
+    
+    def get_pool(self, conn_params):
+        options = self.settings_dict.get('POOL', {})
+        return get_pool(
+            f"{self.alias}:{conn_params.get('dbname')}",
+            conn_params,
+            max_size=options.get('MAX_SIZE', 10),
+            timeout=options.get('TIMEOUT', 10),
+            check_idle=options.get('CHECK_IDLE', 30),
+            max_lifetime=options.get('MAX_LIFETIME', 3600),
+        )
+    
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+        )
+        # Set by the parent class on new connections only
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        return connection
+    
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
@@ -0,0 +1,195 @@
+"""
+Thread-safe pool of DB-API connections.
+
+Django keeps one connection per thread (and per async task, whose queries
+run in a thread through sync_to_async), so the pool is shared by all of
+them behind a lock: a thread that finds every connection in use waits
+until one is given back, at most ``timeout`` seconds. The time spent
+waiting is recorded, which is what tells whether ``max_size`` is too small.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from psycopg2 import OperationalError, extensions
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    """
+    No connection was given back to the pool in time; reaches views as
+    django.db.OperationalError
+    """
+
+
+class ConnectionPool:
+    """
+    At most ``max_size`` connections to one database. Connections idle
+    for more than ``check_idle`` seconds are checked with a SELECT 1 before
+    being handed out, and those older than ``max_lifetime`` seconds are
+    replaced.
+    """
+    
+    def __init__(self, name, max_size, timeout, check_idle, max_lifetime):
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.max_lifetime = max_lifetime
+        self.pid = os.getpid()
+        self.condition = threading.Condition()
+        # (connection, created at, given back at), last given back last
+        self.idle = deque()
+        self.created_at = {}
+        self.size = 0
+        self.stats = {
+            'acquired': 0,
+            'waited': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+        }
+    
+    def acquire(self, connect):
+        """
+        Hand out an idle connection, or a new one made by ``connect`` while
+        there are fewer than ``max_size``
+        """
+        started = time.monotonic()
+        waited = False
+        with self.condition:
+            while not self.idle and self.size >= self.max_size:
+                waited = True
+                remaining = started + self.timeout - time.monotonic()
+                if remaining <= 0 or not self.condition.wait(remaining):
+                    if not self.idle and self.size >= self.max_size:
+                        self.stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"No database connection available after {self.timeout}s "
+                            f"({self.max_size} in use)"
+                        )
+            wait = time.monotonic() - started
+            self.stats['acquired'] += 1
+            if waited:
+                self.stats['waited'] += 1
+                self.stats['wait_seconds_total'] += wait
+                self.stats['wait_seconds_max'] = max(self.stats['wait_seconds_max'], wait)
+            if self.idle:
+                # Most recently used first: the others may then age out
+                connection, created_at, released_at = self.idle.pop()
+            else:
+                connection = None
+                self.size += 1
+        
+        if connection is not None:
+            if self.usable(connection, created_at, released_at):
+                return connection
+            self.discard(connection, reserved=True)
+        try:
+            connection = connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.created_at[id(connection)] = time.monotonic()
+            self.stats['created'] += 1
+        return connection
+    
+    def usable(self, connection, created_at, released_at):
+        now = time.monotonic()
+        if connection.closed or now - created_at > self.max_lifetime:
+            return False
+        if now - released_at <= self.check_idle:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:
+            return False
+        return True
+    
+    def release(self, connection):
+        """Give back a connection, rolled back to a clean idle state"""
+        if not connection.closed:
+            status = connection.get_transaction_status()
+            if status in (extensions.TRANSACTION_STATUS_INTRANS, extensions.TRANSACTION_STATUS_INERROR):
+                try:
+                    connection.rollback()
+                except Exception:
+                    pass
+        if connection.closed or connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            self.discard(connection)
+            return
+        with self.condition:
+            created_at = self.created_at.get(id(connection), time.monotonic())
+            self.idle.append((connection, created_at, time.monotonic()))
+            self.condition.notify()
+    
+    def discard(self, connection, reserved=False):
+        """
+        Close a connection for good; ``reserved`` keeps its slot for the
+        replacement the caller is about to open
+        """
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self.condition:
+            self.created_at.pop(id(connection), None)
+            self.stats['discarded'] += 1
+            if not reserved:
+                self.size -= 1
+                self.condition.notify()
+    
+    def close_idle(self):
+        """Close the idle connections, e.g. before the process forks"""
+        with self.condition:
+            idle, self.idle = self.idle, deque()
+        for connection, _, _ in idle:
+            self.discard(connection)
+    
+    def snapshot(self):
+        with self.condition:
+            return {
+                **self.stats,
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': self.size - len(self.idle),
+                'max_size': self.max_size,
+            }
+
+
+def get_pool(name, conn_params, **options):
+    """
+    Pool of the current process for a set of connection parameters. A pool
+    inherited through fork is replaced: its sockets belong to the parent.
+    """
+    key = repr(sorted(conn_params.items()))
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            pool = pools[key] = ConnectionPool(name, **options)
+        return pool
+
+
+def close_pools():
+    """Close the idle connections of every pool of this process"""
+    with pools_lock:
+        current = [pool for pool in pools.values() if pool.pid == os.getpid()]
+    for pool in current:
+        pool.close_idle()
+
+
+def pool_stats():
+    """Snapshot of the pools of this process"""
+    with pools_lock:
+        current = [pool for pool in pools.values() if pool.pid == os.getpid()]
+    return [{'name': pool.name, **pool.snapshot()} for pool in current]
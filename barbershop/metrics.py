@@ -0,0 +1,274 @@
+"""
+In-process metrics registry with a Prometheus text exposition.
+
+Counters and histograms are kept in memory by each process. With several
+worker processes (gunicorn), each one also writes a snapshot of its values
+to METRICS_DIR from a background thread, every METRICS_FLUSH_INTERVAL
+seconds when they changed and at exit, and a scrape served by any worker
+sums the snapshots of all of them. The snapshots of exited workers are
+folded into an archive file, so counters keep growing across worker
+restarts as Prometheus expects.
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+
+# name: (type, help)
+METRICS = {
+    'http_requests_total': (
+        'counter', "API requests by view, action, method and status"
+    ),
+    'http_request_duration_seconds': (
+        'histogram', "API request latency by view and action"
+    ),
+    'db_queries_total': ('counter', "SQL queries run by API requests, by view and action"),
+    'db_query_duration_seconds_total': (
+        'counter', "Time spent in SQL queries by API requests, by view and action"
+    ),
+    'cache_requests_total': ('counter', "Cache lookups by cache and result (hit or miss)"),
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ARCHIVE_FILE = 'archive.json'
+
+
+class Registry:
+    """Thread-safe counters and histograms, keyed by name and label values"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        # (name, labels): [count per bucket..., +Inf count, sum]
+        self.histograms = {}
+        self.changed = False
+        # Process that runs the flusher thread; forked workers start their own
+        self.flusher_pid = None
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] += value
+            self.changed = True
+        self.ensure_flusher()
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            values = self.histograms.get(key)
+            if values is None:
+                values = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            for n, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    values[n] += 1
+                    break
+            else:
+                values[len(LATENCY_BUCKETS)] += 1
+            values[-1] += value
+            self.changed = True
+        self.ensure_flusher()
+
+    def snapshot(self):
+        with self.lock:
+            self.changed = False
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, labels, list(values)] for (name, labels), values in self.histograms.items()
+                ],
+            }
+
+    def ensure_flusher(self):
+        if self.flusher_pid == os.getpid() or not settings.METRICS_DIR:
+            return
+        with self.lock:
+            if self.flusher_pid == os.getpid():
+                return
+            self.flusher_pid = os.getpid()
+        threading.Thread(target=self.flush_periodically, daemon=True).start()
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            if self.changed:
+                self.flush()
+
+    def flush(self):
+        """Write this process' snapshot to METRICS_DIR, if set"""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        write_json(os.path.join(directory, f'{os.getpid()}.json'), self.snapshot())
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def inc(name, labels, value=1):
+    registry.inc(name, labels, value)
+
+
+def observe(name, labels, value):
+    registry.observe(name, labels, value)
+
+
+def cache_lookup(cache_name, hit):
+    registry.inc('cache_requests_total', {'cache': cache_name, 'result': 'hit' if hit else 'miss'})
+
+
+def write_json(path, data):
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as stream:
+        json.dump(data, stream)
+    os.replace(temporary, path)
+
+
+def read_json(path):
+    try:
+        with open(path) as stream:
+            return json.load(stream)
+    except (OSError, ValueError):
+        return None
+
+
+def merge(total, snapshot):
+    """Add a snapshot into ``total``, a (counters, histograms) pair of dicts"""
+    counters, histograms = total
+    for name, labels, value in snapshot['counters']:
+        counters[name, tuple(map(tuple, labels))] += value
+    for name, labels, values in snapshot['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        if key in histograms:
+            histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+        else:
+            histograms[key] = list(values)
+
+
+def as_snapshot(total):
+    counters, histograms = total
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, values] for (name, labels), values in histograms.items()],
+    }
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect():
+    """Values summed over every process sharing METRICS_DIR"""
+    total = (defaultdict(float), {})
+    directory = settings.METRICS_DIR
+    if not directory:
+        merge(total, registry.snapshot())
+        return total
+
+    registry.flush()
+    with open(os.path.join(directory, '.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = read_json(os.path.join(directory, ARCHIVE_FILE))
+        dead = (defaultdict(float), {})
+        if archive:
+            merge(dead, archive)
+        folded = []
+        for filename in os.listdir(directory):
+            pid, _, extension = filename.partition('.')
+            if extension != 'json' or not pid.isdigit():
+                continue
+            snapshot = read_json(os.path.join(directory, filename))
+            if snapshot is None:
+                continue
+            if pid_alive(int(pid)):
+                merge(total, snapshot)
+            else:
+                merge(dead, snapshot)
+                folded.append(filename)
+        if folded:
+            write_json(os.path.join(directory, ARCHIVE_FILE), as_snapshot(dead))
+            for filename in folded:
+                os.remove(os.path.join(directory, filename))
+    merge(total, as_snapshot(dead))
+    return total
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def format_labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    escaped = (
+        str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        for _, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def render():
+    """Prometheus text exposition (version 0.0.4) of the collected metrics"""
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+            continue
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), values):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_value(values[-1])}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+    # Hit ratio of each cache since the start, from the lookup counters
+    lookups = defaultdict(lambda: {'hit': 0.0, 'miss': 0.0})
+    for (metric, labels), value in counters.items():
+        if metric == 'cache_requests_total':
+            labels = dict(labels)
+            lookups[labels['cache']][labels['result']] += value
+    lines += [
+        '# HELP cache_hit_ratio Share of cache lookups that were hits, by cache',
+        '# TYPE cache_hit_ratio gauge',
+    ]
+    for cache_name, results in sorted(lookups.items()):
+        ratio = results['hit'] / (results['hit'] + results['miss'])
+        lines.append(f'cache_hit_ratio{format_labels([("cache", cache_name)])} {format_value(ratio)}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Scrape endpoint. With METRICS_AUTH_TOKEN set, requests must send it as
+    ``Authorization: Bearer <token>``.
+    """
+    token = settings.METRICS_AUTH_TOKEN
+    if token and not constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
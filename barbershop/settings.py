@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,6 +53,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
@@ -59,6 +63,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestTimingMiddleware',  # SQL and timing of API requests
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -66,6 +71,7 @@ MIDDLEWARE = [
     'api.middleware.DisableCSRFForAPI',  # Disable CSRF for API endpoints
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.RequestProfilingMiddleware',  # Profiling of API requests on demand
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -94,6 +100,9 @@ WSGI_APPLICATION = 'barbershop.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# In-process connection pool instead of per-thread connections (see below)
+DB_POOL = os.environ.get('DB_POOL', 'False') == 'True'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -102,9 +111,38 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', 'postgres'),
         'HOST': os.environ.get('DB_HOST', 'db'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        # Seconds a connection is kept open for the next requests of the same
+        # thread (0, Django's default: close after each request); checked with
+        # SELECT 1 before it is reused when CONN_HEALTH_CHECKS is on. 60 by
+        # default for threaded and sync workers only: the pool already keeps
+        # its connections, and ASGI servers run each request in a new thread,
+        # so they would never reuse them
+        'CONN_MAX_AGE': int(os.environ.get(
+            'DB_CONN_MAX_AGE',
+            '0' if DB_POOL or os.environ.get('ASYNC_READ_VIEWS', 'False') == 'True' else '60'
+        )),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 }
 
+# In-process connection pool shared by the threads of each worker process
+# (see barbershop.db_pool), for threaded and ASGI workers, where persistent
+# per-thread connections are either too many or never reused. Connections
+# go back to the pool at the end of each request; a request waits at most
+# DB_POOL_TIMEOUT seconds for one of the DB_POOL_MAX_SIZE connections, so
+# CONN_MAX_AGE stays 0 even when DB_CONN_MAX_AGE is set.
+if DB_POOL:
+    DATABASES['default'].update({
+        'ENGINE': 'barbershop.db_pool',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+            'CHECK_IDLE': float(os.environ.get('DB_POOL_CHECK_IDLE', '30')),
+            'MAX_LIFETIME': float(os.environ.get('DB_POOL_MAX_LIFETIME', '3600')),
+        },
+    })
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -169,7 +207,7 @@ AUTH_USER_MODEL = 'users.CustomUser'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -184,6 +222,112 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Serving mode: 'production' runs several gunicorn worker processes (see
+# gunicorn.conf.py and wait-for-db.sh), 'development' the single-process
+# development server
+SERVER_MODE = os.environ.get('SERVER_MODE', 'development')
+
+# Cache
+# The development server is one process and uses a memory cache. Production
+# workers must share one cache, or invalidations (dashboard stats, tokens)
+# only reach the worker that made them: Redis at CACHE_LOCATION by default,
+# or any shared backend set with CACHE_BACKEND
+PROCESS_LOCAL_CACHES = [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+]
+if 'CACHE_BACKEND' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': os.environ['CACHE_BACKEND'],
+            'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+        }
+    }
+elif SERVER_MODE == 'production':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', 'redis://redis:6379/0'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+        }
+    }
+if SERVER_MODE == 'production' and CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+    raise ImproperlyConfigured(
+        "SERVER_MODE=production needs a cache shared by the worker processes, "
+        f"not {CACHES['default']['BACKEND']}"
+    )
+
+# Seconds the dashboard statistics stay cached (see users.stats)
+DASHBOARD_STATS_CACHE_TTL = int(os.environ.get('DASHBOARD_STATS_CACHE_TTL', '60'))
+
+# Seconds shared caches may keep the public service and barber lists
+# (see api.mixins.ConditionalListMixin)
+PUBLIC_LIST_CACHE_MAX_AGE = int(os.environ.get('PUBLIC_LIST_CACHE_MAX_AGE', '60'))
+
+# Serve the read-heavy GET endpoints with the native async views of
+# api.async_views; only useful under an ASGI server
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', 'False') == 'True'
+
+# Token authentication cache (see api.authentication): 'shared' uses the
+# default cache, so logouts reach every worker; 'local' keeps an in-process
+# LRU of TOKEN_AUTH_CACHE_SIZE tokens and is only valid with one process
+TOKEN_AUTH_CACHE_BACKEND = os.environ.get('TOKEN_AUTH_CACHE_BACKEND', 'shared')
+TOKEN_AUTH_CACHE_SIZE = int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', '10000'))
+TOKEN_AUTH_CACHE_TTL = int(os.environ.get('TOKEN_AUTH_CACHE_TTL', '300'))
+
+# SQL query budgets per API action (see api.mixins.QueryBudgetMixin)
+QUERY_BUDGET_ENFORCED = os.environ.get('QUERY_BUDGET_ENFORCED', str(DEBUG)) == 'True'
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', 'False') == 'True'
+
+# Share of API requests measured by api.middleware.RequestTimingMiddleware
+# (Server-Timing header, and an 'api.timing' line logged at DEBUG, shown with
+# REQUEST_TIMING_LOG_LEVEL=DEBUG), and how many runs of the same query shape
+# in one request are reported as a suspected N+1
+REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get(
+    'REQUEST_TIMING_SAMPLE_RATE', '1.0' if DEBUG else '0.05'
+))
+REQUEST_TIMING_N_PLUS_ONE_THRESHOLD = int(os.environ.get('REQUEST_TIMING_N_PLUS_ONE_THRESHOLD', '10'))
+
+# Metrics registry (see barbershop.metrics), scraped at /metrics. With
+# several worker processes, METRICS_DIR must be a directory shared by them
+# and emptied when the server starts (gunicorn.conf.py does both)
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '1'))
+METRICS_AUTH_TOKEN = os.environ.get('METRICS_AUTH_TOKEN', '')
+
+# Requests profiled on demand by admins (see api.profiling): the stack
+# sampling interval in seconds, where the profiles are stored and how many
+# of them are kept
+PROFILING_INTERVAL = float(os.environ.get('PROFILING_INTERVAL', '0.005'))
+PROFILING_DIR = os.environ.get(
+    'PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'barbershop-profiles')
+)
+PROFILING_KEEP = int(os.environ.get('PROFILING_KEEP', '100'))
+
+# Seconds between keep-alive comments on idle availability streams (see api.streams)
+AVAILABILITY_STREAM_KEEPALIVE = float(os.environ.get('AVAILABILITY_STREAM_KEEPALIVE', '15'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.timing': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:8080",
@@ -219,4 +363,8 @@ CORS_ALLOW_METHODS = [
 
 # Email Backend (for development)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'Barbershop <no-reply@barbershop.local>')
+
+# Hours before an appointment its reminder is sent (see users.outbox)
+OUTBOX_REMINDER_HOURS = int(os.environ.get('OUTBOX_REMINDER_HOURS', '24'))
 
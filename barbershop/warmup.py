@@ -0,0 +1,22 @@
+"""
+Warm-up of the application before a preforking server starts its workers.
+
+With gunicorn's preload_app the master process imports the project once and
+the workers inherit it through fork, sharing the memory pages and starting
+ready to serve (see gunicorn.conf.py).
+"""
+from django.db import connections
+from django.urls import get_resolver
+
+from .db_pool.pool import close_pools
+
+
+def warm_up():
+    """
+    Import every view, serializer and model module by loading the URL
+    configuration, then close the database connections opened on the way,
+    pooled ones included, so no socket is shared between the forked workers
+    """
+    get_resolver().url_patterns
+    connections.close_all()
+    close_pools()
@@ -0,0 +1,16 @@
+"""
+Gunicorn worker classes
+"""
+from uvicorn.workers import UvicornWorker
+
+
+class BoundedUvicornWorker(UvicornWorker):
+    """
+    Uvicorn worker that takes gunicorn's worker_connections as its
+    concurrency limit: requests beyond it get 503 instead of queueing
+    without bound in the event loop
+    """
+    
+    @property
+    def CONFIG_KWARGS(self):
+        return {**UvicornWorker.CONFIG_KWARGS, 'limit_concurrency': self.cfg.worker_connections}
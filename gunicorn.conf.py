@@ -0,0 +1,72 @@
+"""
+Gunicorn settings for the production serving mode (SERVER_MODE=production,
+see wait-for-db.sh). Every value can be overridden from the environment.
+
+- Workers: WEB_CONCURRENCY, by default sized to the CPU count (2 * CPUs + 1
+  threaded WSGI workers, or one ASGI worker per CPU with ASYNC_READ_VIEWS)
+- The application is preloaded and warmed up in the master before the
+  workers are forked (barbershop.warmup)
+- Graceful reload: SIGHUP restarts the workers after they finish their
+  requests; as the code is preloaded, deploying new code takes SIGUSR2
+  (new master) followed by SIGTERM to the old master
+- Bounded queues: at most GUNICORN_BACKLOG pending connections in the
+  listen queue and GUNICORN_WORKER_CONNECTIONS open connections per worker
+- Metrics: the workers share METRICS_DIR (see barbershop.metrics), which
+  is emptied when the server starts
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+
+ASYNC_WORKERS = os.environ.get('ASYNC_READ_VIEWS', 'False') == 'True'
+
+# Settings load after this file (preload): several workers need the shared
+# cache of the production mode
+os.environ.setdefault('SERVER_MODE', 'production')
+
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'barbershop-metrics'))
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+if ASYNC_WORKERS:
+    wsgi_app = 'barbershop.asgi:application'
+    worker_class = 'barbershop.workers.BoundedUvicornWorker'
+    workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+else:
+    wsgi_app = 'barbershop.wsgi:application'
+    worker_class = 'gthread'
+    workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+    threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# An in-process token cache only hears about the logouts of its own worker
+if workers > 1 and os.environ.get('TOKEN_AUTH_CACHE_BACKEND') == 'local':
+    raise RuntimeError("TOKEN_AUTH_CACHE_BACKEND=local needs WEB_CONCURRENCY=1, use 'shared'")
+
+preload_app = True
+
+backlog = int(os.environ.get('GUNICORN_BACKLOG', '128'))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '100'))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+
+def on_starting(server):
+    """Drop the metrics of a previous run"""
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['METRICS_DIR'])
+
+
+def when_ready(server):
+    """Runs in the master after the preload, before the first fork"""
+    from barbershop.warmup import warm_up
+    warm_up()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+"""
+Compare sync WSGI, native async ASGI and production server throughput.
+
+Starts the app on a local port against the configured database, once per
+server: the threaded runserver used by the development container (wsgi),
+uvicorn with ASYNC_READ_VIEWS=True (asgi), and gunicorn with the settings
+of gunicorn.conf.py, i.e. the SERVER_MODE=production entrypoint, with its
+threaded WSGI workers (production) or uvicorn workers and the async views
+(production-asgi). Each server gets the same concurrent keep-alive load on
+the services and barber lists, barber availability and dashboard stats. The
+script prints requests per second, p50/p99 latency and errors per server
+and endpoint. It creates a barber, a client with a token and a service, and
+removes them at the end. The production servers use the shared cache of
+that mode: run Redis at CACHE_LOCATION, or set CACHE_BACKEND.
+
+    python scripts/asgi_benchmark.py --concurrency 200 --requests 4000
+    python scripts/asgi_benchmark.py --servers wsgi production
+"""
+import argparse
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import time as clock, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'barbershop.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.utils import timezone  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+
+from users.availability import WEEKDAY_FIELDS  # noqa: E402
+from users.models import BarberProfile, CustomUser, Service  # noqa: E402
+
+
+GUNICORN = ['{python}', '-m', 'gunicorn', '--bind', '127.0.0.1:{port}']
+
+# name: (command, ASYNC_READ_VIEWS)
+SERVERS = {
+    'wsgi': (['{python}', 'manage.py', 'runserver', '--noreload', '127.0.0.1:{port}'], False),
+    'asgi': ([
+        '{python}', '-m', 'uvicorn', 'barbershop.asgi:application',
+        '--host', '127.0.0.1', '--port', '{port}', '--workers', '{workers}',
+        '--log-level', 'warning',
+    ], True),
+    'production': (GUNICORN, False),
+    'production-asgi': (GUNICORN, True),
+}
+
+
+def create_fixtures(prefix):
+    day = timezone.now().date() + timedelta(days=1)
+    barber = CustomUser.objects.create_user(f'{prefix}-barber', password=None, user_type='barber')
+    start_field, end_field = WEEKDAY_FIELDS[day.weekday()]
+    profile = BarberProfile.objects.create(
+        user=barber, is_approved=True, **{start_field: clock(9), end_field: clock(18)}
+    )
+    Service.objects.create(name=f'{prefix}-service', duration=30, price=10)
+    client = CustomUser.objects.create_user(f'{prefix}-client', password=None)
+    token = Token.objects.create(user=client)
+    return {
+        'services': ('/api/services/', None),
+        'barbers': ('/api/barbers/', None),
+        'availability': (f'/api/barbers/{profile.pk}/availability/?date={day}', None),
+        'dashboard_stats': ('/api/dashboard/stats/', f'Token {token.key}'),
+    }
+
+
+def start_server(name, port, workers):
+    command, async_views = SERVERS[name]
+    command = [
+        part.format(python=sys.executable, port=port, workers=workers)
+        for part in command
+    ]
+    env = dict(os.environ, ASYNC_READ_VIEWS=str(async_views), DEBUG='False')
+    process = subprocess.Popen(
+        command, cwd=BASE_DIR, env=env, start_new_session=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f"{name} server did not start on port {port}")
+
+
+def stop_server(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    process.wait(timeout=30)
+
+
+def load(port, path, authorization, concurrency, requests):
+    """Send ``requests`` GETs over ``concurrency`` keep-alive connections"""
+    latencies = []
+    errors = [0]
+    remaining = [requests]
+    lock = threading.Lock()
+    headers = {'Host': 'localhost'}
+    if authorization:
+        headers['Authorization'] = authorization
+
+    def worker():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    break
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                failed = response.status >= 400
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += failed
+        connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'rps': len(latencies) / duration,
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        'errors': errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=4000, help="Per endpoint and server")
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    prefix = f'asgibench-{uuid.uuid4().hex[:8]}'
+    endpoints = create_fixtures(prefix)
+    results = {}
+    try:
+        for name in args.servers:
+            process = start_server(name, args.port, args.workers)
+            try:
+                for endpoint, (path, authorization) in endpoints.items():
+                    # Warm up connections, caches and the availability index
+                    load(args.port, path, authorization, 4, 20)
+                    results[name, endpoint] = load(
+                        args.port, path, authorization, args.concurrency, args.requests
+                    )
+            finally:
+                stop_server(process)
+    finally:
+        CustomUser.objects.filter(username__startswith=prefix).delete()
+        Service.objects.filter(name__startswith=prefix).delete()
+
+    print(f"{args.requests} requests per endpoint, {args.concurrency} concurrent connections")
+    print(f"{'server':<16} {'endpoint':<16} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for (name, endpoint), result in results.items():
+        print(
+            f"{name:<16} {endpoint:<16} {result['rps']:9.1f} {result['p50']:9.1f} "
+            f"{result['p99']:9.1f} {result['errors']:7d}"
+        )
+
+
+if __name__ == '__main__':
+    main()
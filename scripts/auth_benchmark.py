@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Compare SQL queries and latency per request with and without the token cache.
+
+Sends the same authenticated GET requests through the full Django stack,
+first with DRF's TokenAuthentication and then with
+CachedTokenAuthentication, and prints queries and mean time per request.
+Creates a temporary user and token, removed at the end.
+
+    python scripts/auth_benchmark.py --requests 500 --path /api/users/me/
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'barbershop.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from rest_framework.authentication import TokenAuthentication  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from rest_framework.views import APIView  # noqa: E402
+
+from api.authentication import CachedTokenAuthentication  # noqa: E402
+from users.models import CustomUser  # noqa: E402
+
+
+def run(client, path, requests, authentication_class):
+    """Return (queries per request, milliseconds per request)"""
+    # Every view reads the default authentication classes from APIView
+    APIView.authentication_classes = [authentication_class]
+    client.get(path)  # warm up, fills the cache
+    with CaptureQueriesContext(connection) as captured:
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = client.get(path)
+            assert response.status_code == 200, response.status_code
+        elapsed = time.perf_counter() - started
+    return len(captured.captured_queries) / requests, elapsed * 1000 / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--path', default='/api/users/me/')
+    args = parser.parse_args()
+
+    user = CustomUser.objects.create_user(
+        f'authbench-{uuid.uuid4().hex[:8]}', password=None, user_type='admin'
+    )
+    token = Token.objects.create(user=user)
+    client = APIClient(SERVER_NAME='localhost')
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    default_classes = APIView.authentication_classes
+    try:
+        results = {
+            'TokenAuthentication': run(client, args.path, args.requests, TokenAuthentication),
+            'CachedTokenAuthentication': run(
+                client, args.path, args.requests, CachedTokenAuthentication
+            ),
+        }
+    finally:
+        APIView.authentication_classes = default_classes
+        user.delete()
+
+    print(f"GET {args.path} x {args.requests}")
+    for name, (queries, milliseconds) in results.items():
+        print(f"  {name:<27} {queries:5.2f} queries/request  {milliseconds:7.3f} ms/request")
+    saved = results['TokenAuthentication'][0] - results['CachedTokenAuthentication'][0]
+    print(f"  Saved {saved:.2f} queries per request")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Fire concurrent bookings at the same slot and check that exactly one wins.
+
+Runs against the database configured in the settings (DB_* variables),
+using one connection per thread, and removes the users, barber profile
+and service it creates. Exits with status 1 when the check fails.
+
+    python scripts/booking_race.py --threads 50
+"""
+import argparse
+import os
+import sys
+import threading
+import uuid
+from collections import Counter
+from datetime import time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'barbershop.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from users.availability import WEEKDAY_FIELDS  # noqa: E402
+from users.models import BarberProfile, CustomUser, Service  # noqa: E402
+
+
+def create_fixtures(prefix, clients, day):
+    barber = CustomUser.objects.create_user(
+        f'{prefix}-barber', password=None, user_type='barber'
+    )
+    start_field, end_field = WEEKDAY_FIELDS[day.weekday()]
+    BarberProfile.objects.create(
+        user=barber, is_approved=True,
+        **{start_field: time(9), end_field: time(18)}
+    )
+    service = Service.objects.create(name=f'{prefix}-service', duration=45, price=10)
+    users = [
+        CustomUser.objects.create_user(f'{prefix}-client-{n}', password=None)
+        for n in range(clients)
+    ]
+    return barber, service, users
+
+
+def book(user, payload, barrier, results):
+    client = APIClient(SERVER_NAME='localhost')
+    client.force_authenticate(user)
+    try:
+        barrier.wait()
+        response = client.post('/api/appointments/', payload, format='json')
+        results.append(response.status_code)
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=30)
+    args = parser.parse_args()
+
+    prefix = f'race-{uuid.uuid4().hex[:8]}'
+    day = timezone.now().date() + timedelta(days=1)
+    barber, service, users = create_fixtures(prefix, args.threads, day)
+
+    # Every thread asks for a different but overlapping start time
+    payloads = [
+        {
+            'barber_id': barber.id,
+            'service_id': service.id,
+            'appointment_date': day.isoformat(),
+            'appointment_time': f'10:{n % 30:02d}',
+        }
+        for n in range(args.threads)
+    ]
+
+    results = []
+    barrier = threading.Barrier(args.threads)
+    threads = [
+        threading.Thread(target=book, args=(user, payload, barrier, results))
+        for user, payload in zip(users, payloads)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        CustomUser.objects.filter(username__startswith=prefix).delete()
+        service.delete()
+
+    outcome = Counter(results)
+    print(f"Responses: {dict(outcome)}")
+    if outcome[201] != 1 or outcome[409] != args.threads - 1:
+        print("FAIL: expected exactly one 201 and only 409 conflicts")
+        sys.exit(1)
+    print("OK: exactly one booking succeeded")
+
+
+if __name__ == '__main__':
+    main()
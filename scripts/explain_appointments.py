@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""
+Print EXPLAIN ANALYZE for the hot Appointment queries, with and without
+the composite indexes declared in Appointment.Meta.indexes.
+
+Seeds a large appointment table (users and a service prefixed with
+a random tag, removed at the end unless --keep is given), captures the SQL
+that each endpoint query runs and explains it twice: once with the indexes
+dropped inside a transaction that is rolled back, and once as is.
+
+Dropping an index locks the table, so only run this against a local or
+benchmark database.
+
+    python scripts/explain_appointments.py --rows 200000
+"""
+import argparse
+import os
+import random
+import sys
+import uuid
+from datetime import time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'barbershop.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from users.models import Appointment, CustomUser, Service  # noqa: E402
+
+
+BATCH_SIZE = 5000
+SLOTS_PER_DAY = 16
+STATUSES = ['scheduled'] * 2 + ['confirmed'] * 2 + ['completed'] * 5 + ['cancelled', 'no_show']
+
+
+def seed(prefix, rows, barbers, clients):
+    """Bulk insert ``rows`` non-overlapping appointments"""
+    rng = random.Random(42)
+    barber_users = CustomUser.objects.bulk_create([
+        CustomUser(username=f'{prefix}-barber-{n}', user_type='barber', password='!')
+        for n in range(barbers)
+    ])
+    client_users = CustomUser.objects.bulk_create([
+        CustomUser(username=f'{prefix}-client-{n}', user_type='client', password='!')
+        for n in range(clients)
+    ])
+    service = Service.objects.create(name=f'{prefix}-service', duration=30, price=10)
+
+    # Spread each barber's appointments over consecutive days around today
+    per_barber = rows // barbers
+    first_day = timezone.now().date() - timedelta(days=per_barber // SLOTS_PER_DAY // 2)
+    batch = []
+    for barber in barber_users:
+        for n in range(per_barber):
+            appointment = Appointment(
+                client=rng.choice(client_users),
+                barber=barber,
+                service=service,
+                appointment_date=first_day + timedelta(days=n // SLOTS_PER_DAY),
+                appointment_time=time(9 + (n % SLOTS_PER_DAY) // 2, 30 * (n % 2)),
+                status=rng.choice(STATUSES),
+            )
+            appointment.time_range = appointment.compute_time_range()
+            batch.append(appointment)
+            if len(batch) == BATCH_SIZE:
+                Appointment.objects.bulk_create(batch)
+                batch = []
+    Appointment.objects.bulk_create(batch)
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE users_appointment')
+    return barber_users, client_users
+
+
+def cleanup(prefix):
+    """Remove the seeded rows without firing per-row delete signals"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM users_appointment WHERE service_id IN '
+            '(SELECT id FROM users_service WHERE name LIKE %s)',
+            [f'{prefix}-%']
+        )
+    CustomUser.objects.filter(username__startswith=prefix).delete()
+    Service.objects.filter(name__startswith=prefix).delete()
+
+
+def endpoint_queries(barber, client):
+    """The ORM calls made by each endpoint, as callables"""
+    today = timezone.now().date()
+    return {
+        'availability': lambda: list(Appointment.objects.filter(
+            barber=barber, appointment_date=today,
+            status__in=Appointment.ACTIVE_STATUSES
+        ).values_list('appointment_time', 'service__duration')),
+        'dashboard_stats (admin)': lambda: (
+            Appointment.objects.count(),
+            Appointment.objects.filter(status='scheduled').count(),
+        ),
+        'dashboard_stats (barber)': lambda: (
+            Appointment.objects.filter(barber=barber).count(),
+            Appointment.objects.filter(barber=barber, appointment_date=today).count(),
+            Appointment.objects.filter(barber=barber, status='scheduled').count(),
+            Appointment.objects.filter(barber=barber, status='completed').count(),
+        ),
+        'dashboard_stats (client)': lambda: (
+            Appointment.objects.filter(client=client).count(),
+            Appointment.objects.filter(
+                client=client, appointment_date__gte=today,
+                status__in=['scheduled', 'confirmed']
+            ).count(),
+            Appointment.objects.filter(client=client, appointment_date__lt=today).count(),
+        ),
+        'appointments list (admin)': lambda: list(Appointment.objects.all()[:20]),
+        'appointments list (barber)': lambda: list(Appointment.objects.filter(barber=barber)[:20]),
+        'appointments list (client)': lambda: list(Appointment.objects.filter(client=client)[:20]),
+        'users list (barber)': lambda: list(CustomUser.objects.filter(
+            id__in=Appointment.objects.filter(barber=barber).values_list('client_id', flat=True)
+        )[:20]),
+    }
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}')
+        return '\n'.join(f'    {row[0]}' for row in cursor.fetchall())
+
+
+def explain_endpoint(run, drop_indexes):
+    with transaction.atomic():
+        if drop_indexes:
+            with connection.cursor() as cursor:
+                for index in Appointment._meta.indexes:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+        with CaptureQueriesContext(connection) as captured:
+            run()
+        plans = [explain(query['sql']) for query in captured.captured_queries]
+        transaction.set_rollback(True)
+    return plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--barbers', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--keep', action='store_true', help="Keep the seeded rows")
+    args = parser.parse_args()
+
+    prefix = f'explain-{uuid.uuid4().hex[:8]}'
+    print(f"Seeding {args.rows} appointments ({prefix})...")
+    barbers, clients = seed(prefix, args.rows, args.barbers, args.clients)
+
+    try:
+        queries = endpoint_queries(barbers[0], clients[0])
+        for name, run in queries.items():
+            for label, drop_indexes in (('before', True), ('after', False)):
+                print(f"\n=== {name} [{label}] ===")
+                for plan in explain_endpoint(run, drop_indexes):
+                    print(plan)
+                    print()
+    finally:
+        if not args.keep:
+            cleanup(prefix)
+
+
+if __name__ == '__main__':
+    main()
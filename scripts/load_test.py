@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+"""
+Load test the booking API with scripted client flows over HTTP.
+
+Runs against a server already listening on --url (runserver, uvicorn or the
+SERVER_MODE=production gunicorn) and the database configured in the
+settings, where it creates approved barbers working every day, services and
+clients sharing one password, and removes them at the end. Each virtual
+user is a thread with its own keep-alive connection: it logs in, then picks
+scenarios at random according to --mix until --duration is over, and logs
+out. Scenarios:
+
+- browse: barber list, service list, availability of a barber on a day
+- book: availability, booking of a free slot, cancellation of the booking
+- dashboard: dashboard stats
+
+The report is JSON with, per endpoint, the request count, throughput,
+error rate and p50/p95/p99 latency; save it with --output and diff it
+between commits. Errors are failed connections and unexpected statuses (a
+409 when another user took the slot first is expected).
+
+    python scripts/load_test.py --url http://127.0.0.1:8000 --users 50 \\
+        --duration 60 --mix browse=5,book=3,dashboard=2 --output load.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import time as clock, timedelta
+from urllib.parse import urlsplit
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'barbershop.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from users.availability import WEEKDAY_FIELDS  # noqa: E402
+from users.models import BarberProfile, CustomUser, Service  # noqa: E402
+
+
+PASSWORD = 'load-test'
+
+SCENARIOS = ('browse', 'book', 'dashboard')
+
+
+def create_fixtures(prefix, barbers, services, clients):
+    # Hashing once keeps the setup fast; logins still check the password
+    password = make_password(PASSWORD)
+    barber_users = CustomUser.objects.bulk_create([
+        CustomUser(username=f'{prefix}-barber-{n}', password=password, user_type='barber')
+        for n in range(barbers)
+    ])
+    every_day = {
+        field: hour
+        for fields in WEEKDAY_FIELDS.values()
+        for field, hour in zip(fields, (clock(9), clock(18)))
+    }
+    profiles = BarberProfile.objects.bulk_create([
+        BarberProfile(user=user, is_approved=True, **every_day) for user in barber_users
+    ])
+    service_objects = Service.objects.bulk_create([
+        Service(name=f'{prefix}-service-{n}', duration=30 + 15 * (n % 3), price=20 + n)
+        for n in range(services)
+    ])
+    client_users = CustomUser.objects.bulk_create([
+        CustomUser(username=f'{prefix}-client-{n}', password=password)
+        for n in range(clients)
+    ])
+    return {
+        'barbers': [(profile.pk, profile.user_id) for profile in profiles],
+        'services': [service.pk for service in service_objects],
+        'clients': [user.username for user in client_users],
+    }
+
+
+class Recorder:
+    """Latencies and failures per endpoint, shared by the virtual users"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, elapsed, status, failed):
+        with self.lock:
+            self.latencies[endpoint].append(elapsed)
+            self.errors[endpoint] += failed
+            self.statuses[endpoint][str(status)] += 1
+
+    def report(self, duration):
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            endpoints[endpoint] = {
+                'requests': len(latencies),
+                'throughput_rps': round(len(latencies) / duration, 2),
+                'error_rate': round(self.errors[endpoint] / len(latencies), 4),
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'statuses': dict(sorted(self.statuses[endpoint].items())),
+            }
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            'endpoints': endpoints,
+            'total': {
+                'requests': total,
+                'throughput_rps': round(total / duration, 2),
+                'error_rate': round(sum(self.errors.values()) / total, 4) if total else 0,
+            },
+        }
+
+
+def percentile(latencies, rank):
+    index = min(len(latencies) - 1, int(len(latencies) * rank / 100))
+    return round(latencies[index] * 1000, 2)
+
+
+class VirtualUser:
+    """One client with its own keep-alive connection and token"""
+
+    def __init__(self, url, username, fixtures, days, recorder, rng):
+        self.address = urlsplit(url)
+        self.username = username
+        self.fixtures = fixtures
+        self.days = days
+        self.recorder = recorder
+        self.rng = rng
+        self.token = None
+        self.connection = self.connect()
+
+    def connect(self):
+        return http.client.HTTPConnection(
+            self.address.hostname, self.address.port or 80, timeout=60
+        )
+
+    def request(self, method, path, endpoint, body=None, expected=(200,)):
+        """Send a request, record it under ``endpoint`` and return (status, data)"""
+        headers = {'Host': self.address.netloc, 'Accept': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = self.connect()
+            content, status = b'', 'failed'
+        self.recorder.record(
+            endpoint, time.perf_counter() - started, status, status not in expected
+        )
+        try:
+            return status, json.loads(content) if content else None
+        except ValueError:
+            return status, None
+
+    def login(self):
+        status, data = self.request(
+            'POST', '/api/login/', 'POST /api/login/',
+            {'username': self.username, 'password': PASSWORD}
+        )
+        if status == 200:
+            self.token = data['token']
+        return status == 200
+
+    def logout(self):
+        self.request('POST', '/api/logout/', 'POST /api/logout/')
+        self.connection.close()
+
+    def availability(self, profile_id, service_id):
+        day = timezone.now().date() + timedelta(days=self.rng.randint(1, self.days))
+        _, data = self.request(
+            'GET', f'/api/barbers/{profile_id}/availability/?date={day}&service_id={service_id}',
+            'GET /api/barbers/{id}/availability/'
+        )
+        return day, data
+
+    def browse(self):
+        self.request('GET', '/api/barbers/', 'GET /api/barbers/')
+        self.request('GET', '/api/services/', 'GET /api/services/')
+        profile_id, _ = self.rng.choice(self.fixtures['barbers'])
+        self.availability(profile_id, self.rng.choice(self.fixtures['services']))
+
+    def book(self):
+        profile_id, barber_id = self.rng.choice(self.fixtures['barbers'])
+        service_id = self.rng.choice(self.fixtures['services'])
+        day, data = self.availability(profile_id, service_id)
+        free = [slot['time'] for slot in (data or {}).get('available_slots', []) if slot['available']]
+        if not free:
+            return
+        status, appointment = self.request(
+            'POST', '/api/appointments/', 'POST /api/appointments/',
+            {
+                'barber_id': barber_id,
+                'service_id': service_id,
+                'appointment_date': day.isoformat(),
+                'appointment_time': self.rng.choice(free),
+            },
+            expected=(201, 409)
+        )
+        if status == 201:
+            self.request(
+                'POST', f"/api/appointments/{appointment['id']}/cancel/",
+                'POST /api/appointments/{id}/cancel/'
+            )
+
+    def dashboard(self):
+        self.request('GET', '/api/dashboard/stats/', 'GET /api/dashboard/stats/')
+
+    def run(self, mix, deadline):
+        if not self.login():
+            return
+        scenarios, weights = zip(*mix.items())
+        while time.monotonic() < deadline:
+            getattr(self, self.rng.choices(scenarios, weights)[0])()
+        self.logout()
+
+
+def parse_mix(value):
+    """'browse=5,book=3' -> {'browse': 5, 'book': 3}"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}, choose from {', '.join(SCENARIOS)}")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid weight {weight!r}")
+    return mix
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--users', type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds")
+    parser.add_argument('--mix', type=parse_mix, default='browse=5,book=3,dashboard=2')
+    parser.add_argument('--barbers', type=int, default=10)
+    parser.add_argument('--services', type=int, default=3)
+    parser.add_argument('--days', type=int, default=7, help="Days ahead to book on")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the report to this file instead of stdout")
+    args = parser.parse_args()
+
+    prefix = f'loadtest-{uuid.uuid4().hex[:8]}'
+    fixtures = create_fixtures(prefix, args.barbers, args.services, args.users)
+    recorder = Recorder()
+    try:
+        users = [
+            VirtualUser(args.url, username, fixtures, args.days, recorder, random.Random(args.seed + n))
+            for n, username in enumerate(fixtures['clients'])
+        ]
+        started = time.monotonic()
+        deadline = started + args.duration
+        threads = [threading.Thread(target=user.run, args=(args.mix, deadline)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.monotonic() - started
+    finally:
+        CustomUser.objects.filter(username__startswith=prefix).delete()
+        Service.objects.filter(name__startswith=prefix).delete()
+
+    report = {
+        'commit': current_commit(),
+        'config': {
+            'url': args.url,
+            'users': args.users,
+            'duration_s': round(duration, 2),
+            'mix': args.mix,
+            'barbers': args.barbers,
+            'services': args.services,
+            'days': args.days,
+            'seed': args.seed,
+        },
+        **recorder.report(duration),
+    }
+    output = json.dumps(report, indent=2) + '\n'
+    if args.output:
+        with open(args.output, 'w') as stream:
+            stream.write(output)
+    else:
+        sys.stdout.write(output)
+
+
+if __name__ == '__main__':
+    main()
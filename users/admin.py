@@ -1,6 +1,11 @@
+from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, BarberProfile, Service, Appointment
+from .bulk import duration_conflicts
+from .models import (
+    CustomUser, BarberProfile, Service, Appointment, AvailabilityIndex,
+    AppointmentRollup, AppointmentSeries, OutboxMessage
+)
 
 
 @admin.register(CustomUser)
@@ -25,8 +30,26 @@ class BarberProfileAdmin(admin.ModelAdmin):
     list_filter = ['is_available', 'specialization']
 
 
+class ServiceAdminForm(forms.ModelForm):
+    class Meta:
+        model = Service
+        fields = '__all__'
+    
+    def clean_duration(self):
+        duration = self.cleaned_data['duration']
+        if self.instance.pk and duration != self.instance.duration:
+            conflicts = duration_conflicts(self.instance, duration)
+            if conflicts:
+                raise forms.ValidationError(
+                    "Upcoming appointments would overlap other bookings: "
+                    + ", ".join(map(str, conflicts))
+                )
+        return duration
+
+
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
+    form = ServiceAdminForm
     list_display = ['name', 'duration', 'price', 'is_active', 'created_at']
     list_filter = ['is_active']
 
@@ -37,3 +60,31 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_filter = ['status', 'appointment_date', 'service']
     search_fields = ['client__username', 'barber__username']
 
+
+
+@admin.register(AppointmentSeries)
+class AppointmentSeriesAdmin(admin.ModelAdmin):
+    list_display = ['client', 'barber', 'service', 'frequency', 'interval', 'start_date', 'end_date', 'appointment_time']
+    list_filter = ['frequency', 'service']
+    search_fields = ['client__username', 'barber__username']
+
+
+@admin.register(AvailabilityIndex)
+class AvailabilityIndexAdmin(admin.ModelAdmin):
+    list_display = ['barber', 'date', 'work_start', 'work_end', 'updated_at']
+    list_filter = ['date']
+    search_fields = ['barber__username']
+
+
+@admin.register(AppointmentRollup)
+class AppointmentRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'barber', 'service', 'status', 'count', 'booked_minutes', 'revenue']
+    list_filter = ['status', 'date', 'service']
+    search_fields = ['barber__username']
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'recipient', 'appointment_id', 'status', 'available_at', 'attempts', 'sent_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['appointment_id']
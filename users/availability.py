@@ -0,0 +1,274 @@
+"""
+Availability engine for barbers.
+
+Free slots are computed in memory from the barber's working hours and the
+day's active appointments, which are loaded with a single query joined with
+the service duration. All times are handled as minutes since midnight.
+
+The result of each barber's day is materialized in AvailabilityIndex and
+refreshed by the signal handlers in ``users.signals``.
+"""
+import json
+from datetime import time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+
+from barbershop import metrics
+from .models import Appointment, AvailabilityIndex, BarberProfile
+
+
+# Default slot length and step, in minutes
+SLOT_MINUTES = 30
+
+# Operating hours fields of BarberProfile for each weekday
+WEEKDAY_FIELDS = {
+    0: ('monday_start', 'monday_end'),
+    1: ('tuesday_start', 'tuesday_end'),
+    2: ('wednesday_start', 'wednesday_end'),
+    3: ('thursday_start', 'thursday_end'),
+    4: ('friday_start', 'friday_end'),
+    5: ('saturday_start', 'saturday_end'),
+    6: ('sunday_start', 'sunday_end'),
+}
+
+
+def to_minutes(value):
+    """Convert a time object to minutes since midnight"""
+    return value.hour * 60 + value.minute
+
+
+def from_minutes(minutes):
+    """Convert minutes since midnight to a time object"""
+    return time(minutes // 60, minutes % 60)
+
+
+def working_hours(profile, day):
+    """Return the (start, end) working times of a barber profile for a date"""
+    start_field, end_field = WEEKDAY_FIELDS[day.weekday()]
+    return getattr(profile, start_field), getattr(profile, end_field)
+
+
+def merge_intervals(intervals):
+    """Sort (start, end) intervals and merge the overlapping ones"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def busy_intervals(rows):
+    """Build merged busy intervals from (appointment_time, duration) rows"""
+    return merge_intervals(
+        (to_minutes(start), to_minutes(start) + duration)
+        for start, duration in rows
+    )
+
+
+def load_busy_intervals(barber_id, day):
+    """Load the busy intervals of a barber for a date in a single query"""
+    rows = Appointment.objects.filter(
+        barber_id=barber_id,
+        appointment_date=day,
+        status__in=Appointment.ACTIVE_STATUSES
+    ).values_list('appointment_time', 'service__duration')
+    return busy_intervals(rows)
+
+
+def load_busy_intervals_for_range(barber_ids, date_from, date_to):
+    """
+    Load the busy intervals of several barbers over a date range in a
+    single query, keyed by (barber_id, date)
+    """
+    rows = Appointment.objects.filter(
+        barber_id__in=barber_ids,
+        appointment_date__range=(date_from, date_to),
+        status__in=Appointment.ACTIVE_STATUSES
+    ).values_list(
+        'barber_id', 'appointment_date', 'appointment_time', 'service__duration'
+    )
+
+    grouped = {}
+    for barber_id, day, start, duration in rows:
+        grouped.setdefault((barber_id, day), []).append((start, duration))
+    return {key: busy_intervals(value) for key, value in grouped.items()}
+
+
+def iter_slots(start, end, busy, duration=SLOT_MINUTES, step=SLOT_MINUTES):
+    """
+    Sweep the working window in steps and yield (minutes, is_available)
+    for each slot. A slot is available when a service of the given
+    duration fits before the end of the day without overlapping any busy
+    interval.
+
+    ``busy`` must be sorted and merged (see ``merge_intervals``), so a
+    single pointer walk over it is enough for the whole day.
+    """
+    start_minutes = to_minutes(start)
+    end_minutes = to_minutes(end)
+    index = 0
+    current = start_minutes
+
+    while current < end_minutes:
+        slot_end = current + duration
+
+        # Skip appointments that finished before this slot starts
+        while index < len(busy) and busy[index][1] <= current:
+            index += 1
+
+        yield current, slot_end <= end_minutes and (
+            index == len(busy) or busy[index][0] >= slot_end
+        )
+
+        current += step
+
+
+def compute_slots(start, end, busy, duration=SLOT_MINUTES, step=SLOT_MINUTES):
+    """List the slots of a working window as {'time', 'available'} dicts"""
+    return [
+        {'time': from_minutes(minutes).strftime('%H:%M'), 'available': is_available}
+        for minutes, is_available in iter_slots(start, end, busy, duration, step)
+    ]
+
+
+def slot_bitmap(start, end, busy, duration=SLOT_MINUTES, step=SLOT_MINUTES):
+    """Compact form of compute_slots: one '1' (free) or '0' per slot"""
+    return ''.join(
+        '1' if is_available else '0'
+        for _, is_available in iter_slots(start, end, busy, duration, step)
+    )
+
+
+def build_index_entry(barber_id, day, profile, busy):
+    """Unsaved AvailabilityIndex row for a barber's day"""
+    start_time, end_time = working_hours(profile, day) if profile else (None, None)
+    return AvailabilityIndex(
+        barber_id=barber_id,
+        date=day,
+        work_start=start_time,
+        work_end=end_time,
+        busy=busy
+    )
+
+
+def save_index_entries(entries):
+    """Insert or update index rows in a single statement"""
+    AvailabilityIndex.objects.bulk_create(
+        entries,
+        update_conflicts=True,
+        unique_fields=['barber', 'date'],
+        update_fields=['work_start', 'work_end', 'busy', 'updated_at']
+    )
+
+
+def refresh_availability_index(barber_id, day, profile=None):
+    """Recompute and store the index row of a barber's day"""
+    if profile is None:
+        profile = BarberProfile.objects.filter(user_id=barber_id).first()
+    entry = build_index_entry(
+        barber_id, day, profile, load_busy_intervals(barber_id, day)
+    )
+    save_index_entries([entry])
+    return entry
+
+
+def refresh_busy_intervals(barber_id, day):
+    """
+    Recompute the busy intervals of an existing index row. Unlike
+    refresh_availability_index it never creates rows, so it is safe while
+    the barber itself is being deleted.
+    """
+    AvailabilityIndex.objects.filter(barber_id=barber_id, date=day).update(
+        busy=load_busy_intervals(barber_id, day)
+    )
+
+
+def refresh_busy_intervals_many(keys):
+    """
+    refresh_busy_intervals for several (barber_id, date) keys, with one
+    query to load the appointments and one UPDATE for all the rows
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    busy = load_busy_intervals_for_range(
+        {barber_id for barber_id, _ in keys},
+        min(day for _, day in keys),
+        max(day for _, day in keys)
+    )
+    
+    table = connection.ops.quote_name(AvailabilityIndex._meta.db_table)
+    placeholders = ', '.join(['(%s, %s::date, %s::jsonb)'] * len(keys))
+    params = []
+    for barber_id, day in sorted(keys):
+        params += [barber_id, day, json.dumps(busy.get((barber_id, day), []))]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {table} AS i SET busy = v.busy, updated_at = NOW()
+            FROM (VALUES {placeholders}) AS v (barber_id, date, busy)
+            WHERE i.barber_id = v.barber_id AND i.date = v.date
+            """,
+            params
+        )
+
+
+def get_availability_index(profile, day):
+    """Return the index row of a barber's day, building it on first read"""
+    try:
+        index = AvailabilityIndex.objects.get(barber_id=profile.user_id, date=day)
+    except AvailabilityIndex.DoesNotExist:
+        metrics.cache_lookup('availability_index', False)
+        return refresh_availability_index(profile.user_id, day, profile=profile)
+    metrics.cache_lookup('availability_index', True)
+    return index
+
+
+async def aget_availability_index(profile, day):
+    """Async version of get_availability_index"""
+    try:
+        index = await AvailabilityIndex.objects.aget(barber_id=profile.user_id, date=day)
+    except AvailabilityIndex.DoesNotExist:
+        metrics.cache_lookup('availability_index', False)
+        return await sync_to_async(refresh_availability_index)(
+            profile.user_id, day, profile=profile
+        )
+    metrics.cache_lookup('availability_index', True)
+    return index
+
+
+def refresh_working_hours(profile, since):
+    """Copy a profile's weekly hours into its index rows from a date on"""
+    rows = AvailabilityIndex.objects.filter(barber_id=profile.user_id, date__gte=since)
+    for weekday, (start_field, end_field) in WEEKDAY_FIELDS.items():
+        rows.filter(date__iso_week_day=weekday + 1).update(
+            work_start=getattr(profile, start_field),
+            work_end=getattr(profile, end_field)
+        )
+
+
+def compute_index_entries(date_from, date_to, barber_ids=None):
+    """
+    Compute the expected index rows of a date range for every barber with
+    a profile (or only ``barber_ids``) with one schedule and one
+    appointment query
+    """
+    profiles = BarberProfile.objects.all()
+    if barber_ids:
+        profiles = profiles.filter(user_id__in=barber_ids)
+    profiles = list(profiles)
+
+    busy = load_busy_intervals_for_range(
+        [profile.user_id for profile in profiles], date_from, date_to
+    )
+    days = (date_to - date_from).days + 1
+    return [
+        build_index_entry(
+            profile.user_id, day, profile, busy.get((profile.user_id, day), [])
+        )
+        for profile in profiles
+        for day in (date_from + timedelta(days=offset) for offset in range(days))
+    ]
@@ -0,0 +1,191 @@
+"""
+Bulk appointment writes.
+
+bulk_create() and UPDATE statements skip the per-row signal handlers in
+``users.signals``, so these helpers bring the derived data (availability
+index, daily rollup, cached dashboard stats) up to date themselves, with a
+fixed number of statements whatever the number of appointments. They also
+queue the notifications of the changes in the outbox (see ``users.outbox``).
+"""
+from django.db import connection
+from django.utils import timezone
+
+from .availability import refresh_busy_intervals_many
+from .models import Appointment, Service
+from .outbox import enqueue_booked, enqueue_status_changes
+from .rollup import appointment_key, apply_rollup_changes
+from .stats import invalidate_dashboard_stats
+
+
+def create_appointments(appointments):
+    """
+    Insert unsaved appointments (with their service set) in one statement.
+    Overlaps with active bookings still raise the exclusion constraint's
+    IntegrityError.
+    """
+    for appointment in appointments:
+        appointment.time_range = appointment.compute_time_range()
+    Appointment.objects.bulk_create(appointments)
+
+    refresh_busy_intervals_many(
+        (appointment.barber_id, appointment.appointment_date)
+        for appointment in appointments
+        if appointment.status in Appointment.ACTIVE_STATUSES
+    )
+    apply_rollup_changes(
+        (appointment_key(appointment), 1, appointment.service.duration, appointment.service.price)
+        for appointment in appointments
+    )
+    invalidate_dashboard_stats(*{
+        user_id
+        for appointment in appointments
+        for user_id in (appointment.client_id, appointment.barber_id)
+    })
+    enqueue_booked(appointments)
+    return appointments
+
+
+def set_status(queryset, new_status, limit=None):
+    """
+    Move every appointment of ``queryset``, or its first ``limit`` by id, to
+    ``new_status`` with a single UPDATE. The rows are locked in id order and
+    their previous status read in the same statement, so concurrent changes
+    are never overwritten unseen and overlapping bulk changes cannot
+    deadlock.
+
+    Returns the changed rows as dicts with the id, barber_id, client_id,
+    service_id, appointment_date and old_status of each appointment.
+    """
+    locked = queryset.order_by('pk').select_for_update(of=('self',))
+    if limit is not None:
+        locked = locked[:limit]
+    select_sql, params = locked.values('id', 'status').query.sql_with_params()
+    table = connection.ops.quote_name(Appointment._meta.db_table)
+    service_table = connection.ops.quote_name(Service._meta.db_table)
+    columns = ['id', 'barber_id', 'client_id', 'service_id', 'appointment_date', 'old_status']
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {table} AS a SET status = %s, updated_at = %s
+            FROM ({select_sql}) AS old (id, status), {service_table} AS s
+            WHERE a.id = old.id AND s.id = a.service_id
+            RETURNING a.id, a.barber_id, a.client_id, a.service_id,
+                      a.appointment_date, old.status, s.duration, s.price
+            """,
+            [new_status, timezone.now(), *params]
+        )
+        rows = cursor.fetchall()
+
+    status_changed(rows, new_status)
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def transition(queryset, action, ids=None, limit=None):
+    """
+    Apply a status action (see Appointment.TRANSITIONS) to the appointments
+    of ``queryset``, or to those of ``ids`` in it, as one compare-and-set
+    UPDATE that only matches the statuses the action may be applied to.
+    ``limit`` caps the number of appointments changed, first ids first.
+
+    Returns {id: result} where result['outcome'] is 'updated' or, for the
+    other ``ids``, 'invalid_transition' (with the current status) or
+    'not_found' when outside the queryset.
+    """
+    new_status, from_statuses = Appointment.TRANSITIONS[action]
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+
+    results = {
+        row['id']: {'outcome': 'updated', 'from': row['old_status'], 'status': new_status}
+        for row in set_status(queryset.filter(status__in=from_statuses), new_status, limit)
+    }
+    missing = set(ids or ()) - results.keys()
+    if not missing:
+        return results
+
+    for pk, current in queryset.filter(pk__in=missing).values_list('id', 'status'):
+        results[pk] = {'outcome': 'invalid_transition', 'status': current}
+    for pk in missing:
+        results.setdefault(pk, {'outcome': 'not_found'})
+    return results
+
+
+def duration_conflicts(service, duration):
+    """
+    Ids of the upcoming active appointments of ``service`` that would
+    overlap another active booking of their barber if the service lasted
+    ``duration`` minutes
+    """
+    table = connection.ops.quote_name(Appointment._meta.db_table)
+    active = list(Appointment.ACTIVE_STATUSES)
+    # Same-day pairs only, like the overlap constraint of each partition
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT DISTINCT a.id FROM {table} AS a
+            JOIN {table} AS b
+              ON b.barber_id = a.barber_id AND b.appointment_date = a.appointment_date
+             AND b.id <> a.id AND b.status = ANY(%s)
+            WHERE a.service_id = %s AND a.status = ANY(%s) AND a.appointment_date >= %s
+              AND tstzrange(lower(a.time_range), lower(a.time_range) + %s * interval '1 minute', '[)')
+                  && CASE WHEN b.service_id = a.service_id
+                     THEN tstzrange(lower(b.time_range), lower(b.time_range) + %s * interval '1 minute', '[)')
+                     ELSE b.time_range END
+            ORDER BY a.id
+            """,
+            [active, service.pk, active, timezone.now().date(), duration, duration]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def retime_appointments(service):
+    """
+    Recompute the time range of the upcoming active appointments of
+    ``service`` from its duration, in one UPDATE. Bookings the new ranges
+    overlap raise the exclusion constraint's IntegrityError.
+
+    Returns the (barber_id, date) keys of the changed appointments.
+    """
+    table = connection.ops.quote_name(Appointment._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {table} SET time_range = tstzrange(
+                lower(time_range), lower(time_range) + %s * interval '1 minute', '[)'
+            )
+            WHERE service_id = %s AND status = ANY(%s) AND appointment_date >= %s
+            RETURNING barber_id, appointment_date
+            """,
+            [service.duration, service.pk, list(Appointment.ACTIVE_STATUSES), timezone.now().date()]
+        )
+        return set(cursor.fetchall())
+
+
+def status_changed(rows, new_status):
+    """
+    Update the derived data after a bulk status change, from (id,
+    barber_id, client_id, service_id, date, old_status, duration, price)
+    rows
+    """
+    active = set(Appointment.ACTIVE_STATUSES)
+    changes = []
+    slots = set()
+    users = set()
+    changed = []
+    for appointment_id, barber_id, client_id, service_id, day, old_status, duration, price in rows:
+        if old_status == new_status:
+            continue
+        changed.append((appointment_id, new_status))
+        changes.append(((day, barber_id, service_id, old_status), -1, duration, price))
+        changes.append(((day, barber_id, service_id, new_status), 1, duration, price))
+        if (old_status in active) != (new_status in active):
+            slots.add((barber_id, day))
+        users.update((client_id, barber_id))
+
+    if not changes:
+        return
+    refresh_busy_intervals_many(slots)
+    apply_rollup_changes(changes)
+    invalidate_dashboard_stats(*users)
+    enqueue_status_changes(changed)
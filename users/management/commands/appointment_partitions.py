@@ -0,0 +1,80 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.partitions import (
+    ARCHIVE_TABLE, add_months, archive_partitions, ensure_partitions, month_start, partitions
+)
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}'. Use YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly appointment partitions ahead of time and move "
+        "old months to the archive table. Run it monthly, e.g. from cron"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int, default=3,
+            help="Months after the current one that must have a partition"
+        )
+        parser.add_argument(
+            '--keep-months', type=int,
+            help="Archive the months ending more than this many months before "
+                 "the current one (default: archive nothing)"
+        )
+        parser.add_argument(
+            '--archive-before', type=parse_date,
+            help="Archive the months ending on or before this date instead (at most the first day of the current month)"
+        )
+        parser.add_argument(
+            '--list', action='store_true',
+            help="Only list the live and archived partitions"
+        )
+
+    def handle(self, *args, **options):
+        if options['list']:
+            self.list_partitions()
+            return
+        if options['months_ahead'] < 0 or (options['keep_months'] or 0) < 0:
+            raise CommandError("--months-ahead and --keep-months must not be negative")
+        if options['keep_months'] is not None and options['archive_before']:
+            raise CommandError("Use either --keep-months or --archive-before")
+
+        current = month_start(timezone.now().date())
+        if options['archive_before'] and options['archive_before'] > current:
+            raise CommandError(
+                f"--archive-before must not be after {current}: only past months can be archived"
+            )
+        created = ensure_partitions(current, add_months(current, options['months_ahead']))
+        for month in created:
+            self.stdout.write(f"Created the partition of {month:%Y-%m}")
+
+        before = options['archive_before']
+        if options['keep_months'] is not None:
+            before = add_months(current, -options['keep_months'])
+        archived = archive_partitions(before) if before else []
+        for month in archived:
+            self.stdout.write(f"Archived the partition of {month:%Y-%m}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(created)} partitions, archived {len(archived)}"
+        ))
+
+    def list_partitions(self):
+        for label, parent in (('live', None), ('archived', ARCHIVE_TABLE)):
+            months = sorted(partitions(parent))
+            if months:
+                self.stdout.write(
+                    f"{len(months)} {label}: {months[0]:%Y-%m} to {months[-1]:%Y-%m}"
+                )
+            else:
+                self.stdout.write(f"0 {label}")
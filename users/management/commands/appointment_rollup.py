@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.rollup import appointment_date_bounds, rebuild_rollup
+
+
+# Days rebuilt per transaction, bounds how long the rollup stays locked
+CHUNK_DAYS = 31
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}'. Use YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily appointment rollup for a date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from', dest='date_from', type=parse_date,
+            help="First date (default: first appointment date)"
+        )
+        parser.add_argument(
+            '--to', dest='date_to', type=parse_date,
+            help="Last date (default: last appointment date)"
+        )
+
+    def handle(self, *args, **options):
+        first, last = appointment_date_bounds()
+        date_from = options['date_from'] or first
+        date_to = options['date_to'] or last
+        if date_from is None or date_to is None:
+            self.stdout.write("No appointments, nothing to rebuild")
+            return
+        if date_to < date_from:
+            raise CommandError("--to must not be before --from")
+
+        rows = 0
+        chunk_start = date_from
+        while chunk_start <= date_to:
+            chunk_end = min(chunk_start + timedelta(days=CHUNK_DAYS - 1), date_to)
+            rows += rebuild_rollup(chunk_start, chunk_end)
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {rows} rollup rows from {date_from} to {date_to}"
+        ))
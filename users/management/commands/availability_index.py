@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from users.availability import compute_index_entries, save_index_entries
+from users.models import AvailabilityIndex
+
+
+# Days processed per batch, bounds memory on long ranges
+CHUNK_DAYS = 31
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}'. Use YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify the availability index for a date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument('mode', choices=['rebuild', 'verify'])
+        parser.add_argument(
+            '--from', dest='date_from', type=parse_date,
+            help="First date (default: today)"
+        )
+        parser.add_argument(
+            '--to', dest='date_to', type=parse_date,
+            help="Last date (default: 30 days after --from)"
+        )
+        parser.add_argument(
+            '--barber', dest='barber_ids', type=int, action='append',
+            help="Only this barber user id (repeatable)"
+        )
+
+    def handle(self, *args, **options):
+        date_from = options['date_from'] or timezone.now().date()
+        date_to = options['date_to'] or date_from + timedelta(days=30)
+        if date_to < date_from:
+            raise CommandError("--to must not be before --from")
+
+        totals = {'rows': 0, 'missing': 0, 'stale': 0}
+        chunk_start = date_from
+        while chunk_start <= date_to:
+            chunk_end = min(chunk_start + timedelta(days=CHUNK_DAYS - 1), date_to)
+            entries = compute_index_entries(
+                chunk_start, chunk_end, options['barber_ids']
+            )
+            totals['rows'] += len(entries)
+
+            if options['mode'] == 'rebuild':
+                with transaction.atomic():
+                    save_index_entries(entries)
+            else:
+                self.verify(entries, chunk_start, chunk_end, totals)
+
+            chunk_start = chunk_end + timedelta(days=1)
+
+        if options['mode'] == 'rebuild':
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt {totals['rows']} index rows from {date_from} to {date_to}"
+            ))
+            return
+
+        summary = (
+            f"Checked {totals['rows']} index rows from {date_from} to {date_to}: "
+            f"{totals['missing']} missing, {totals['stale']} stale"
+        )
+        if totals['stale']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def verify(self, entries, date_from, date_to, totals):
+        stored = {
+            (row.barber_id, row.date): row
+            for row in AvailabilityIndex.objects.filter(
+                date__range=(date_from, date_to),
+                barber_id__in={entry.barber_id for entry in entries}
+            )
+        }
+        for entry in entries:
+            row = stored.get((entry.barber_id, entry.date))
+            if row is None:
+                # Rows are also built lazily on first read
+                totals['missing'] += 1
+            elif (row.work_start, row.work_end, row.busy) != (
+                entry.work_start, entry.work_end, entry.busy
+            ):
+                totals['stale'] += 1
+                self.stdout.write(self.style.WARNING(
+                    f"Stale row for barber {entry.barber_id} on {entry.date}"
+                ))
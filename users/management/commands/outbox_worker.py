@@ -0,0 +1,117 @@
+import signal
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from users.models import OutboxMessage
+from users.outbox import deliver
+
+
+# Seconds between purges of old messages while idle
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = (
+        "Send the due notifications of the outbox in batches. Run as many "
+        "workers as needed: each batch is locked with SKIP LOCKED"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--poll-interval', type=float, default=5,
+            help="Seconds to wait when no message is due"
+        )
+        parser.add_argument('--max-attempts', type=int, default=8)
+        parser.add_argument(
+            '--retry-delay', type=float, default=30,
+            help="Seconds before the first retry, doubled on each failure"
+        )
+        parser.add_argument(
+            '--max-retry-delay', type=float, default=3600,
+            help="Longest wait between two attempts, in seconds"
+        )
+        parser.add_argument(
+            '--keep-days', type=int, default=30,
+            help="Days sent, skipped and failed messages are kept"
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit when no message is due instead of waiting for more"
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['max_attempts'] < 1:
+            raise CommandError("--batch-size and --max-attempts must be at least 1")
+
+        self.stopping = False
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.stop)
+
+        purged_at = 0
+        totals = {'sent': 0, 'skipped': 0, 'failed': 0, 'retried': 0}
+        while not self.stopping:
+            close_old_connections()
+            batch = self.drain_batch(options)
+            for status, count in batch.items():
+                totals[status] += count
+            if any(batch.values()):
+                self.stdout.write(
+                    ', '.join(f"{count} {status}" for status, count in batch.items() if count)
+                )
+                continue
+
+            if time.monotonic() - purged_at > PURGE_INTERVAL:
+                self.purge(options['keep_days'])
+                purged_at = time.monotonic()
+            if options['once']:
+                break
+            close_old_connections()
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f"{count} {status}" for status, count in totals.items())
+        ))
+
+    def stop(self, signum, frame):
+        """Finish the current batch, then exit"""
+        self.stopping = True
+
+    def drain_batch(self, options):
+        """
+        Lock, send and update one batch of due messages in a transaction.
+        Rows locked by other workers are skipped, and a worker that dies
+        mid-batch releases its rows to the others.
+        """
+        with transaction.atomic():
+            messages = list(
+                OutboxMessage.objects.select_for_update(skip_locked=True).filter(
+                    status='pending', available_at__lte=timezone.now()
+                ).order_by('available_at')[:options['batch_size']]
+            )
+            if not messages:
+                return {}
+            deliver(
+                messages, options['max_attempts'], options['retry_delay'],
+                options['max_retry_delay']
+            )
+            OutboxMessage.objects.bulk_update(
+                messages, ['status', 'available_at', 'attempts', 'last_error', 'sent_at']
+            )
+
+        counts = {'sent': 0, 'skipped': 0, 'failed': 0, 'retried': 0}
+        for message in messages:
+            # Messages still pending failed and wait for their retry
+            counts['retried' if message.status == 'pending' else message.status] += 1
+        return counts
+
+    def purge(self, keep_days):
+        deleted, _ = OutboxMessage.objects.filter(
+            created_at__lt=timezone.now() - timedelta(days=keep_days)
+        ).exclude(status='pending').delete()
+        if deleted:
+            self.stdout.write(f"Purged {deleted} old messages")
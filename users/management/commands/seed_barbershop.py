@@ -0,0 +1,268 @@
+import io
+import random
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from users.availability import WEEKDAY_FIELDS
+from users.models import Appointment, BarberProfile, CustomUser, Service
+from users.partitions import ensure_partitions
+from users.rollup import rebuild_rollup
+from users.stats import invalidate_dashboard_stats
+
+
+# Appointments sent per COPY, bounds memory
+COPY_BATCH = 100000
+
+# Days rebuilt per rollup transaction
+CHUNK_DAYS = 31
+
+# Weekly hours: (start hour, end hour) per weekday, None for days off
+SCHEDULES = [
+    [(9, 18)] * 5 + [None, None],
+    [(9, 18)] * 5 + [(9, 13), None],
+    [None] + [(10, 19)] * 5 + [None],
+    [(8, 17)] * 3 + [None] + [(8, 17)] * 2 + [None],
+    [(12, 21)] * 4 + [(12, 21), (10, 16), None],
+]
+
+SERVICES = [
+    ('Haircut', 30, '35.00'), ('Beard trim', 20, '20.00'), ('Haircut and beard', 50, '50.00'),
+    ('Kids haircut', 30, '25.00'), ('Hot towel shave', 40, '40.00'), ('Hair coloring', 90, '90.00'),
+    ('Buzz cut', 20, '18.00'), ('Fade', 45, '40.00'), ('Hair wash', 15, '10.00'),
+    ('Eyebrow trim', 15, '10.00'), ('Scalp treatment', 60, '60.00'), ('Styling', 30, '30.00'),
+]
+
+# Status weights of past and upcoming appointments
+PAST_STATUSES = {'completed': 80, 'cancelled': 12, 'no_show': 8}
+UPCOMING_STATUSES = {'scheduled': 60, 'confirmed': 30, 'cancelled': 10}
+
+FIRST_NAMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Felipe', 'Gabriela', 'Hugo',
+               'Iara', 'João', 'Lara', 'Marcos', 'Nina', 'Otávio', 'Paula', 'Rafael']
+LAST_NAMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa',
+              'Almeida', 'Ferreira', 'Rodrigues', 'Gomes', 'Martins']
+
+APPOINTMENT_COLUMNS = [
+    'client_id', 'barber_id', 'service_id', 'appointment_date', 'appointment_time',
+    'status', 'notes', 'time_range', 'created_at', 'updated_at',
+]
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}'. Use YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate barbers, clients, services and appointments for benchmarks, "
+        "deterministically from --seed and --start"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--barbers', type=int, default=1000)
+        parser.add_argument('--clients', type=int, default=20000)
+        parser.add_argument('--services', type=int, default=len(SERVICES))
+        parser.add_argument('--appointments', type=int, default=1000000)
+        parser.add_argument(
+            '--start', type=parse_date,
+            help="Day the generated history runs up to (default: today)"
+        )
+        parser.add_argument('--past-days', type=int, default=180)
+        parser.add_argument('--future-days', type=int, default=30)
+        parser.add_argument(
+            '--password', default='barbershop',
+            help="Password of every generated user, hashed once"
+        )
+        parser.add_argument(
+            '--prefix', default='seed',
+            help="Prefix of the generated usernames and service names"
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help="Delete the data generated earlier with the same prefix first"
+        )
+
+    def handle(self, *args, **options):
+        if not 1 <= options['services'] <= len(SERVICES):
+            raise CommandError(f"--services must be between 1 and {len(SERVICES)}")
+        if options['barbers'] < 1 or options['clients'] < 1:
+            raise CommandError("--barbers and --clients must be at least 1")
+
+        prefix = options['prefix']
+        if options['clear']:
+            self.clear(prefix)
+        elif CustomUser.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(f"Data with prefix '{prefix}' exists, use --clear or another --prefix")
+
+        rng = random.Random(options['seed'])
+        start = options['start'] or timezone.now().date()
+        date_from = start - timedelta(days=options['past_days'])
+        date_to = start + timedelta(days=options['future_days'])
+        # Rows of months without a partition would pile up in the default one
+        ensure_partitions(date_from, date_to)
+
+        # One hash for every user: hashing is what makes creating users slow
+        password = make_password(options['password'])
+        with transaction.atomic():
+            barbers, schedules = self.create_barbers(rng, prefix, password, options['barbers'])
+            client_ids = self.create_clients(rng, prefix, password, options['clients'])
+            services = Service.objects.bulk_create([
+                Service(name=f'{prefix}-{name}', duration=duration, price=price)
+                for name, duration, price in SERVICES[:options['services']]
+            ])
+            count = self.copy_appointments(
+                generate_appointments(
+                    rng, barbers, schedules, client_ids, services,
+                    date_from, date_to, start, options['appointments']
+                )
+            )
+        self.stdout.write(f"Inserted {count} appointments, rebuilding the rollup")
+
+        chunk_start = date_from
+        while chunk_start <= date_to:
+            chunk_end = min(chunk_start + timedelta(days=CHUNK_DAYS - 1), date_to)
+            rebuild_rollup(chunk_start, chunk_end)
+            chunk_start = chunk_end + timedelta(days=1)
+        with connection.cursor() as cursor:
+            for model in (CustomUser, BarberProfile, Appointment):
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+        invalidate_dashboard_stats(*CustomUser.objects.filter(
+            user_type='admin'
+        ).values_list('id', flat=True))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(barbers)} barbers, {len(client_ids)} clients, {len(services)} "
+            f"services and {count} appointments from {date_from} to {date_to}"
+        ))
+
+    def clear(self, prefix):
+        """Delete seeded data; appointments go first in one statement, without signals"""
+        seeded = CustomUser.objects.filter(username__startswith=f'{prefix}-')
+        table = connection.ops.quote_name(Appointment._meta.db_table)
+        user_table = connection.ops.quote_name(CustomUser._meta.db_table)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE barber_id IN '
+                    f'(SELECT id FROM {user_table} WHERE username LIKE %s) '
+                    f'OR client_id IN (SELECT id FROM {user_table} WHERE username LIKE %s)',
+                    [f'{prefix}-%', f'{prefix}-%']
+                )
+            seeded.delete()
+            Service.objects.filter(name__startswith=f'{prefix}-').delete()
+
+    def create_barbers(self, rng, prefix, password, count):
+        """Barber users with profiles; returns them and their weekly hours"""
+        users = CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f'{prefix}-barber-{n:06d}',
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                password=password,
+                user_type='barber',
+            )
+            for n in range(count)
+        ], batch_size=5000)
+
+        schedules = [rng.choice(SCHEDULES) for _ in users]
+        profiles = []
+        for user, schedule in zip(users, schedules):
+            hours = {}
+            for weekday, (start_field, end_field) in WEEKDAY_FIELDS.items():
+                if schedule[weekday]:
+                    hours[start_field] = time(schedule[weekday][0])
+                    hours[end_field] = time(schedule[weekday][1])
+            profiles.append(BarberProfile(
+                user=user, is_approved=rng.random() < 0.95, **hours
+            ))
+        BarberProfile.objects.bulk_create(profiles, batch_size=5000)
+        return users, schedules
+
+    def create_clients(self, rng, prefix, password, count):
+        return [user.pk for user in CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f'{prefix}-client-{n:07d}',
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                password=password,
+            )
+            for n in range(count)
+        ], batch_size=5000)]
+
+    def copy_appointments(self, rows):
+        """Stream the generated rows to COPY in batches; returns the row count"""
+        table = connection.ops.quote_name(Appointment._meta.db_table)
+        sql = f"COPY {table} ({', '.join(APPOINTMENT_COLUMNS)}) FROM STDIN"
+        count = 0
+        buffer = io.StringIO()
+        with connection.cursor() as cursor:
+            for row in rows:
+                buffer.write('\t'.join(row))
+                buffer.write('\n')
+                count += 1
+                if count % COPY_BATCH == 0:
+                    buffer.seek(0)
+                    cursor.copy_expert(sql, buffer)
+                    buffer = io.StringIO()
+                    self.stdout.write(f"  {count} appointments")
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+        return count
+
+
+def generate_appointments(rng, barbers, schedules, client_ids, services, date_from, date_to,
+                          today, total):
+    """
+    COPY rows of ``total`` appointments spread over the working days of the
+    barbers; the appointments of a barber's day never overlap
+    """
+    tz = timezone.get_default_timezone()
+    now = timezone.now().isoformat()
+    working_days = [
+        (barber, date_from + timedelta(days=offset), hours)
+        for offset in range((date_to - date_from).days + 1)
+        for barber, schedule in zip(barbers, schedules)
+        for hours in [schedule[(date_from + timedelta(days=offset)).weekday()]]
+        if hours
+    ]
+    if not working_days:
+        return
+    per_day = total / len(working_days)
+    past_statuses, past_weights = zip(*PAST_STATUSES.items())
+    upcoming_statuses, upcoming_weights = zip(*UPCOMING_STATUSES.items())
+
+    made = 0
+    for n, (barber, day, (start_hour, end_hour)) in enumerate(working_days, 1):
+        # Days that could not fit their share pass the rest on
+        quota = round(per_day * n) - made
+        cursor = start_hour * 60
+        end = end_hour * 60
+        day_text = day.isoformat()
+        for _ in range(quota):
+            if made == total:
+                return
+            service = rng.choice(services)
+            # Leave some gaps between bookings
+            cursor += 15 * rng.choice((0, 0, 0, 1, 2))
+            if cursor + service.duration > end:
+                break
+            if day < today:
+                status = rng.choices(past_statuses, past_weights)[0]
+            else:
+                status = rng.choices(upcoming_statuses, upcoming_weights)[0]
+            start = datetime.combine(day, time(cursor // 60, cursor % 60), tz)
+            range_end = start + timedelta(minutes=service.duration)
+            yield (
+                str(rng.choice(client_ids)), str(barber.pk), str(service.pk), day_text,
+                f'{cursor // 60:02d}:{cursor % 60:02d}', status, '',
+                f'[{start.isoformat()},{range_end.isoformat()})', now, now,
+            )
+            made += 1
+            cursor += service.duration
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_add_is_approved_to_barberprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('work_start', models.TimeField(blank=True, null=True)),
+                ('work_end', models.TimeField(blank=True, null=True)),
+                ('busy', models.JSONField(default=list, help_text='Merged [start, end] intervals in minutes since midnight')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('barber', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_index', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='availabilityindex',
+            constraint=models.UniqueConstraint(fields=('barber', 'date'), name='unique_availability_index_per_day'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:28
+
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.conf import settings
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+def fill_time_range(apps, schema_editor):
+    """Derive the range of the existing appointments from their service"""
+    schema_editor.execute(
+        """
+        UPDATE users_appointment AS a
+        SET time_range = tstzrange(
+            (a.appointment_date + a.appointment_time) AT TIME ZONE %s,
+            (a.appointment_date + a.appointment_time) AT TIME ZONE %s
+                + s.duration * interval '1 minute',
+            '[)'
+        )
+        FROM users_service AS s
+        WHERE s.id = a.service_id
+        """,
+        [settings.TIME_ZONE, settings.TIME_ZONE]
+    )
+
+
+# Overlapping pairs listed when the constraint cannot be added
+MAX_LISTED_OVERLAPS = 50
+
+
+def check_overlaps(apps, schema_editor):
+    """
+    Stop before adding the constraint when active appointments already
+    overlap, listing them, rather than failing on an IntegrityError. Cancel
+    or move one appointment of each pair, then migrate again.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT a.id, b.id, a.barber_id FROM users_appointment AS a
+            JOIN users_appointment AS b
+              ON b.barber_id = a.barber_id AND b.id > a.id AND b.time_range && a.time_range
+            WHERE a.status IN ('scheduled', 'confirmed', 'in_progress')
+              AND b.status IN ('scheduled', 'confirmed', 'in_progress')
+            ORDER BY a.id, b.id
+            """
+        )
+        overlaps = cursor.fetchall()
+    if overlaps:
+        pairs = '\n'.join(
+            f"  appointments {first} and {second} (barber {barber})"
+            for first, second, barber in overlaps[:MAX_LISTED_OVERLAPS]
+        )
+        more = len(overlaps) - MAX_LISTED_OVERLAPS
+        raise RuntimeError(
+            f"{len(overlaps)} pairs of active appointments overlap, cancel or move one of each:\n"
+            + pairs + (f"\n  and {more} more" if more > 0 else "")
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_availability_index'),
+    ]
+
+    operations = [
+        # GiST support for the equality check on barber_id
+        BtreeGistExtension(),
+        migrations.AddField(
+            model_name='appointment',
+            name='time_range',
+            field=django.contrib.postgres.fields.ranges.DateTimeRangeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_time_range, migrations.RunPython.noop),
+        migrations.RunPython(check_overlaps, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status__in', ['scheduled', 'confirmed', 'in_progress'])), expressions=[('barber', '='), ('time_range', '&&')], name='exclude_overlapping_appointments', violation_error_message='This time slot is already booked.'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_appointment_time_range_exclusion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['-appointment_date', '-appointment_time'], name='appointment_ordering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['barber', '-appointment_date', '-appointment_time'], include=('status', 'client'), name='appointment_barber_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['client', '-appointment_date', '-appointment_time'], include=('status',), name='appointment_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status', '-appointment_date'], name='appointment_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status__in', ['scheduled', 'confirmed', 'in_progress'])), fields=['barber', 'appointment_date', 'appointment_time'], include=('service',), name='appointment_active_slot_idx'),
+        ),
+    ]
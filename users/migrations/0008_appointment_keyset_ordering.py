@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_appointment_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='appointment',
+            options={'ordering': ['-appointment_date', '-appointment_time', '-id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appointment_ordering_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appointment_barber_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appointment_client_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['-appointment_date', '-appointment_time', '-id'], name='appointment_ordering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['barber', '-appointment_date', '-appointment_time', '-id'], include=('status', 'client'), name='appointment_barber_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['client', '-appointment_date', '-appointment_time', '-id'], include=('status',), name='appointment_client_date_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_rollup(apps, schema_editor):
+    """Aggregate the existing appointments into the rollup"""
+    schema_editor.execute(
+        """
+        INSERT INTO users_appointmentrollup
+            (date, barber_id, service_id, status, count, booked_minutes, revenue)
+        SELECT a.appointment_date, a.barber_id, a.service_id, a.status,
+               COUNT(*), SUM(s.duration), SUM(s.price)
+        FROM users_appointment AS a
+        JOIN users_service AS s ON s.id = a.service_id
+        GROUP BY a.appointment_date, a.barber_id, a.service_id, a.status
+        """
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_appointment_keyset_ordering'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('confirmed', 'Confirmed'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('no_show', 'No Show')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('booked_minutes', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('barber', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_rollups', to=settings.AUTH_USER_MODEL)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.service')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='appointmentrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'barber', 'service', 'status'), name='unique_appointment_rollup'),
+        ),
+        migrations.RunPython(fill_rollup, migrations.RunPython.noop),
+    ]
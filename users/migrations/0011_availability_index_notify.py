@@ -0,0 +1,46 @@
+"""
+NOTIFY 'availability_changed' with 'barber_id:date' when an availability
+index row is created or its hours or busy intervals change, whatever
+the code path (signals, bulk refreshes, rebuilds). Notifications are
+sent at commit and duplicates within a transaction are folded, so
+api.streams hears of each changed day once per transaction.
+"""
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_appointment_series'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            CREATE FUNCTION users_availabilityindex_notify() RETURNS trigger AS $$
+            BEGIN
+                PERFORM pg_notify('availability_changed', NEW.barber_id || ':' || to_char(NEW.date, 'YYYY-MM-DD'));
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql;
+
+            CREATE TRIGGER users_availabilityindex_notify_insert
+            AFTER INSERT ON users_availabilityindex
+            FOR EACH ROW EXECUTE FUNCTION users_availabilityindex_notify();
+
+            CREATE TRIGGER users_availabilityindex_notify_update
+            AFTER UPDATE ON users_availabilityindex
+            FOR EACH ROW WHEN (
+                OLD.busy IS DISTINCT FROM NEW.busy
+                OR OLD.work_start IS DISTINCT FROM NEW.work_start
+                OR OLD.work_end IS DISTINCT FROM NEW.work_end
+            )
+            EXECUTE FUNCTION users_availabilityindex_notify();
+            """,
+            """
+            DROP TRIGGER users_availabilityindex_notify_update ON users_availabilityindex;
+            DROP TRIGGER users_availabilityindex_notify_insert ON users_availabilityindex;
+            DROP FUNCTION users_availabilityindex_notify();
+            """
+        ),
+    ]
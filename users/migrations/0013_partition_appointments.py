@@ -0,0 +1,191 @@
+"""
+Partition users_appointment by month of appointment_date (see users.partitions).
+
+The table is rebuilt as a partitioned table with the same columns, foreign
+keys and indexes: one users_appointment_YYYY_MM partition per month that
+has appointments, the current month and the next three, plus a default
+partition for dates no month partition covers yet. The whole table is
+copied, so plan for the downtime on a large history.
+
+PostgreSQL requires the partition key in unique constraints, so the
+primary key becomes (id, appointment_date). id keeps its values and gets
+a plain sequence instead of an identity. Exclusion constraints cannot be
+declared on a partitioned table before PostgreSQL 17, so each partition
+gets its own, which only compares the bookings of its month. A booking
+that runs past midnight at the end of a month is not checked against the
+first bookings of the next one; bookings within working hours never do.
+
+Django's migration state is left as it was: it cannot describe the
+composite key nor constraints that only exist on the partitions, so it
+still lists the exclude_overlapping_appointments constraint and the
+primary key on id. Later schema changes to either must be written by hand
+(see the note on Appointment.Meta.constraints).
+
+users_appointment_add_partition(month) creates the partition of a month
+and moves its rows out of the default partition. users_appointment_archive
+receives the partitions detached by the appointment_partitions command.
+"""
+from datetime import date
+
+from django.db import migrations
+
+
+# Months created ahead of the current one
+MONTHS_AHEAD = 3
+
+ADD_PARTITION_FUNCTION = """
+CREATE FUNCTION users_appointment_add_partition(month date) RETURNS boolean AS $$
+DECLARE
+    first_day date := date_trunc('month', month);
+    next_month date := date_trunc('month', month) + interval '1 month';
+    partition_name text := 'users_appointment_' || to_char(month, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE users_appointment INCLUDING DEFAULTS)', partition_name);
+    EXECUTE format(
+        'ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist (barber_id WITH =, time_range WITH &&) '
+        'WHERE (status IN (''scheduled'', ''confirmed'', ''in_progress''))',
+        partition_name, partition_name || '_no_overlap'
+    );
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM users_appointment_default '
+        'WHERE appointment_date >= $1 AND appointment_date < $2 RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        partition_name
+    ) USING first_day, next_month;
+    EXECUTE format(
+        'ALTER TABLE users_appointment ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, first_day, next_month
+    );
+    RETURN true;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+EXCLUSION_CONSTRAINT = (
+    "EXCLUDE USING gist (barber_id WITH =, time_range WITH &&) "
+    "WHERE (status IN ('scheduled', 'confirmed', 'in_progress'))"
+)
+
+
+def table_definitions(cursor, table):
+    """Next id, foreign keys and plain indexes of a table, to recreate them"""
+    cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id'))", [table])
+    next_id = cursor.fetchone()[0]
+    cursor.execute(
+        """
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f'
+        """,
+        [table]
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT pg_get_indexdef(indexrelid) FROM pg_index
+        WHERE indrelid = %s::regclass AND NOT EXISTS (
+            SELECT 1 FROM pg_constraint WHERE conindid = indexrelid
+        )
+        """,
+        [table]
+    )
+    # Partitioned indexes read 'ON ONLY', which would skip the partitions
+    indexes = [row[0].replace(' ON ONLY ', ' ON ') for row in cursor.fetchall()]
+    return next_id, foreign_keys, indexes
+
+
+def restore_definitions(schema_editor, foreign_keys, indexes):
+    for name, definition in foreign_keys:
+        schema_editor.execute(f'ALTER TABLE users_appointment ADD CONSTRAINT "{name}" {definition}')
+    for definition in indexes:
+        schema_editor.execute(definition)
+
+
+def partition_appointments(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        next_id, foreign_keys, indexes = table_definitions(cursor, 'users_appointment')
+        cursor.execute(
+            "SELECT DISTINCT date_trunc('month', appointment_date)::date FROM users_appointment"
+        )
+        months = {row[0] for row in cursor.fetchall()}
+
+    today = date.today()
+    for offset in range(MONTHS_AHEAD + 1):
+        year, month = divmod(today.month - 1 + offset, 12)
+        months.add(date(today.year + year, month + 1, 1))
+
+    schema_editor.execute('ALTER TABLE users_appointment RENAME TO users_appointment_unpartitioned')
+    schema_editor.execute(
+        'CREATE TABLE users_appointment (LIKE users_appointment_unpartitioned) '
+        'PARTITION BY RANGE (appointment_date)'
+    )
+    schema_editor.execute('CREATE TABLE users_appointment_default PARTITION OF users_appointment DEFAULT')
+    schema_editor.execute(
+        'ALTER TABLE users_appointment_default ADD CONSTRAINT users_appointment_default_no_overlap '
+        + EXCLUSION_CONSTRAINT
+    )
+    # No parameters: the function body has its own % placeholders
+    schema_editor.execute(ADD_PARTITION_FUNCTION, None)
+    for month in sorted(months):
+        schema_editor.execute('SELECT users_appointment_add_partition(%s)', [month])
+
+    schema_editor.execute('INSERT INTO users_appointment SELECT * FROM users_appointment_unpartitioned')
+    schema_editor.execute('DROP TABLE users_appointment_unpartitioned')
+    schema_editor.execute(
+        'CREATE SEQUENCE users_appointment_id_seq START %s OWNED BY users_appointment.id', [next_id]
+    )
+    schema_editor.execute(
+        "ALTER TABLE users_appointment ALTER COLUMN id SET DEFAULT nextval('users_appointment_id_seq')"
+    )
+    schema_editor.execute(
+        'ALTER TABLE users_appointment ADD CONSTRAINT users_appointment_pkey '
+        'PRIMARY KEY (id, appointment_date)'
+    )
+    restore_definitions(schema_editor, foreign_keys, indexes)
+
+    schema_editor.execute(
+        'CREATE TABLE users_appointment_archive (LIKE users_appointment) '
+        'PARTITION BY RANGE (appointment_date)'
+    )
+
+
+def unpartition_appointments(apps, schema_editor):
+    """Back to one plain table, archived appointments included"""
+    with schema_editor.connection.cursor() as cursor:
+        next_id, foreign_keys, indexes = table_definitions(cursor, 'users_appointment')
+
+    schema_editor.execute('ALTER TABLE users_appointment RENAME TO users_appointment_partitioned')
+    schema_editor.execute('CREATE TABLE users_appointment (LIKE users_appointment_partitioned)')
+    schema_editor.execute('INSERT INTO users_appointment SELECT * FROM users_appointment_partitioned')
+    schema_editor.execute('INSERT INTO users_appointment SELECT * FROM users_appointment_archive')
+    schema_editor.execute('DROP TABLE users_appointment_partitioned, users_appointment_archive')
+    schema_editor.execute('DROP FUNCTION users_appointment_add_partition(date)')
+    schema_editor.execute(
+        'ALTER TABLE users_appointment ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY '
+        '(START %s)', [next_id]
+    )
+    schema_editor.execute('ALTER TABLE users_appointment ADD CONSTRAINT users_appointment_pkey PRIMARY KEY (id)')
+    schema_editor.execute(
+        'ALTER TABLE users_appointment ADD CONSTRAINT exclude_overlapping_appointments '
+        + EXCLUSION_CONSTRAINT
+    )
+    restore_definitions(schema_editor, foreign_keys, indexes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_outbox_message'),
+    ]
+
+    operations = [
+        # Database only: the state keeps the declared primary key and
+        # constraint (see the module docstring)
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(partition_appointments, unpartition_appointments),
+            ],
+        ),
+    ]
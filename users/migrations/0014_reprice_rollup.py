@@ -0,0 +1,27 @@
+"""
+Restate the booked minutes and revenue of every rollup row at the current
+duration and price of its service. Deltas used to subtract the current
+values from rows filled at older ones, which left rows off after a price
+or duration change (even rows with a count of 0).
+"""
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_partition_appointments'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            UPDATE users_appointmentrollup AS r
+            SET booked_minutes = r.count * s.duration, revenue = r.count * s.price
+            FROM users_service AS s
+            WHERE s.id = r.service_id
+              AND (r.booked_minutes <> r.count * s.duration OR r.revenue <> r.count * s.price)
+            """,
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -1,6 +1,40 @@
+from datetime import datetime, timedelta
+
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
 from django.db import models
 from django.core.validators import RegexValidator
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+
+# Statuses that keep the barber's time slot occupied
+ACTIVE_APPOINTMENT_STATUSES = ['scheduled', 'confirmed', 'in_progress']
+
+
+class LoadedValuesMixin:
+    """
+    Remember the values loaded from the database in ``_loaded_values``
+    so signal handlers can see what changed on save
+    """
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def loaded_value(self, attname):
+        """Value of a field as loaded from the database (None if unknown)"""
+        return getattr(self, '_loaded_values', {}).get(attname)
+    
+    def remember_values(self, *attnames):
+        """Mark the current values of the given fields as stored"""
+        if not hasattr(self, '_loaded_values'):
+            self._loaded_values = {}
+        for attname in attnames:
+            self._loaded_values[attname] = getattr(self, attname)
 
 
 class CustomUser(AbstractUser):
@@ -96,7 +130,7 @@ class BarberProfile(models.Model):
         return f"Profile of {self.user.username}"
 
 
-class Service(models.Model):
+class Service(LoadedValuesMixin, models.Model):
     """
     Services offered by the barbershop (haircut, beard, etc.)
     """
@@ -112,7 +146,43 @@ class Service(models.Model):
         return self.name
 
 
-class Appointment(models.Model):
+class AppointmentSeries(models.Model):
+    """
+    Recurring booking: the same barber, service and time every ``interval``
+    days or weeks. Each occurrence is an ordinary Appointment.
+    """
+    FREQUENCY_CHOICES = [
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+    ]
+    
+    client = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='client_series'
+    )
+    barber = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='barber_series'
+    )
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='weekly')
+    interval = models.PositiveSmallIntegerField(default=1)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    appointment_time = models.TimeField()
+    
+    notes = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Series {self.pk}: {self.client_id} with {self.barber_id} every {self.interval} {self.frequency}"
+
+
+class Appointment(LoadedValuesMixin, models.Model):
     """
     Appointment booking system for barbershop
     """
@@ -125,6 +195,16 @@ class Appointment(models.Model):
         ('no_show', 'No Show'),
     ]
     
+    ACTIVE_STATUSES = ACTIVE_APPOINTMENT_STATUSES
+    
+    # Status actions: action -> (new status, statuses it may be applied to)
+    TRANSITIONS = {
+        # Confirming again is a no-op, as it always succeeded
+        'confirm': ('confirmed', ['scheduled', 'confirmed']),
+        'complete': ('completed', ['scheduled', 'confirmed', 'in_progress', 'no_show']),
+        'cancel': ('cancelled', ['scheduled', 'confirmed', 'in_progress', 'no_show']),
+    }
+    
     client = models.ForeignKey(
         CustomUser,
         on_delete=models.CASCADE,
@@ -152,12 +232,219 @@ class Appointment(models.Model):
     
     notes = models.TextField(blank=True, help_text="Additional notes")
     
+    series = models.ForeignKey(
+        AppointmentSeries,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='appointments'
+    )
+    
+    # Derived from the date, time and service duration on save; the
+    # exclusion constraint below rejects overlapping active bookings
+    time_range = DateTimeRangeField(null=True, blank=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        ordering = ['-appointment_date', '-appointment_time']
+        # id breaks ties between appointments booked for the same time,
+        # which keeps keyset pagination stable
+        ordering = ['-appointment_date', '-appointment_time', '-id']
+        indexes = [
+            # Default ordering, used by the admin listing
+            models.Index(
+                fields=['-appointment_date', '-appointment_time', '-id'],
+                name='appointment_ordering_idx'
+            ),
+            # Barber listing and dashboard counts; the included columns
+            # allow index-only scans for status counts and client lookups
+            models.Index(
+                fields=['barber', '-appointment_date', '-appointment_time', '-id'],
+                include=['status', 'client'],
+                name='appointment_barber_date_idx'
+            ),
+            models.Index(
+                fields=['client', '-appointment_date', '-appointment_time', '-id'],
+                include=['status'],
+                name='appointment_client_date_idx'
+            ),
+            models.Index(
+                fields=['status', '-appointment_date'],
+                name='appointment_status_idx'
+            ),
+            # Availability lookups only read active appointments
+            models.Index(
+                fields=['barber', 'appointment_date', 'appointment_time'],
+                include=['service'],
+                condition=models.Q(status__in=ACTIVE_APPOINTMENT_STATUSES),
+                name='appointment_active_slot_idx'
+            ),
+        ]
+        # The table is partitioned by month (users.partitions): the
+        # database enforces this constraint on each partition, under other
+        # names, and the ORM still validates it as declared here. Bookings
+        # of different months are never compared with each other.
+        # Django's migration state still has this constraint on the table
+        # and a primary key on id alone, while the database has neither
+        # (its key is (id, appointment_date), see the users 0013 migration).
+        # Migrations generated for either one (changing or removing the
+        # constraint, altering id) fail: write them as RunSQL over the
+        # partitions, inside SeparateDatabaseAndState.
+        constraints = [
+            ExclusionConstraint(
+                name='exclude_overlapping_appointments',
+                expressions=[
+                    ('barber', RangeOperators.EQUAL),
+                    ('time_range', RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(status__in=ACTIVE_APPOINTMENT_STATUSES),
+                violation_error_message="This time slot is already booked.",
+            ),
+        ]
     
     def __str__(self):
         return f"{self.client.username} - {self.barber.username} - {self.appointment_date} {self.appointment_time}"
+    
+    def compute_time_range(self):
+        """Start and end of the appointment as a [start, end) range"""
+        start = timezone.make_aware(
+            datetime.combine(self.appointment_date, self.appointment_time)
+        )
+        return DateTimeTZRange(
+            start, start + timedelta(minutes=self.service.duration)
+        )
+    
+    def save(self, *args, **kwargs):
+        self.time_range = self.compute_time_range()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'time_range'}
+        super().save(*args, **kwargs)
+
+
+class AvailabilityIndex(models.Model):
+    """
+    Materialized availability of a barber for one day: working hours plus
+    the merged busy intervals of active appointments, kept up to date by
+    signals so availability reads are a single indexed lookup
+    """
+    barber = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='availability_index'
+    )
+    date = models.DateField()
+    
+    work_start = models.TimeField(null=True, blank=True)
+    work_end = models.TimeField(null=True, blank=True)
+    
+    busy = models.JSONField(
+        default=list,
+        help_text="Merged [start, end] intervals in minutes since midnight"
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['barber', 'date'],
+                name='unique_availability_index_per_day'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Availability of {self.barber_id} on {self.date}"
+
+
+
+class AppointmentRollup(models.Model):
+    """
+    Daily appointment totals per barber, service and status, maintained
+    incrementally as appointments change so reports never scan the
+    appointment table
+    """
+    date = models.DateField()
+    barber = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='appointment_rollups'
+    )
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    
+    count = models.IntegerField(default=0)
+    booked_minutes = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'barber', 'service', 'status'],
+                name='unique_appointment_rollup'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.barber_id}/{self.service_id} {self.status}: {self.count}"
 
+
+class OutboxMessage(models.Model):
+    """
+    Notification to one user about an appointment, written in the same
+    transaction as the change it announces and sent later by the
+    ``outbox_worker`` command (see users.outbox)
+    """
+    KIND_CHOICES = [
+        ('booked', 'Booked'),
+        ('confirmed', 'Confirmed'),
+        ('cancelled', 'Cancelled'),
+        ('reminder', 'Reminder'),
+    ]
+    
+    RECIPIENT_CHOICES = [
+        ('client', 'Client'),
+        ('barber', 'Barber'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    recipient = models.CharField(max_length=10, choices=RECIPIENT_CHOICES)
+    
+    # A plain id rather than a foreign key: messages are written by bulk
+    # paths that only know the id, and the worker skips the messages of
+    # appointments deleted meanwhile
+    appointment_id = models.BigIntegerField()
+    
+    payload = models.JSONField(default=dict, blank=True)
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Not sent before this time: reminder time or next retry"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            # Queue of the worker: pending messages by due time
+            models.Index(
+                fields=['available_at'],
+                condition=models.Q(status='pending'),
+                name='outbox_pending_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} to {self.recipient} of appointment {self.appointment_id}: {self.status}"
@@ -0,0 +1,203 @@
+"""
+Transactional outbox of appointment notifications.
+
+Appointment changes add OutboxMessage rows in their own transaction: one
+per recipient when an appointment is booked, confirmed or cancelled, plus
+a reminder due OUTBOX_REMINDER_HOURS before it starts. Nothing is sent on
+the request path. The ``outbox_worker`` command drains the due messages
+in batches locked with SKIP LOCKED, so several workers share the queue
+without a broker, and retries failures with exponential backoff.
+
+Delivery is at least once: a worker that dies after sending and before
+committing leaves the message to be sent again.
+"""
+import random
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import Appointment, OutboxMessage
+
+
+# Who hears of each kind of change
+RECIPIENTS = {
+    'booked': ('client', 'barber'),
+    'confirmed': ('client',),
+    'cancelled': ('client', 'barber'),
+    'reminder': ('client',),
+}
+
+# Kind of the messages announcing a status
+STATUS_MESSAGES = {'confirmed': 'confirmed', 'cancelled': 'cancelled'}
+
+# (kind, recipient): (subject, body)
+TEMPLATES = {
+    ('booked', 'client'): (
+        "Appointment booked: {service} on {date} at {time}",
+        "Hi {client},\n\nYour {service} with {barber} on {date} at {time} is booked.\n",
+    ),
+    ('booked', 'barber'): (
+        "New booking: {service} on {date} at {time}",
+        "Hi {barber},\n\n{client} booked a {service} with you on {date} at {time}.\n",
+    ),
+    ('confirmed', 'client'): (
+        "Appointment confirmed: {service} on {date} at {time}",
+        "Hi {client},\n\n{barber} confirmed your {service} on {date} at {time}.\n",
+    ),
+    ('cancelled', 'client'): (
+        "Appointment cancelled: {service} on {date} at {time}",
+        "Hi {client},\n\nYour {service} with {barber} on {date} at {time} was cancelled.\n",
+    ),
+    ('cancelled', 'barber'): (
+        "Appointment cancelled: {service} on {date} at {time}",
+        "Hi {barber},\n\nThe {service} of {client} on {date} at {time} was cancelled.\n",
+    ),
+    ('reminder', 'client'): (
+        "Reminder: {service} on {date} at {time}",
+        "Hi {client},\n\nThis is a reminder of your {service} with {barber} on {date} at {time}.\n",
+    ),
+}
+
+
+def messages_for(kind, appointment_id, **fields):
+    """Unsaved messages of one change, one per recipient"""
+    return [
+        OutboxMessage(kind=kind, recipient=recipient, appointment_id=appointment_id, **fields)
+        for recipient in RECIPIENTS[kind]
+    ]
+
+
+def starts_at(appointment_date, appointment_time):
+    return timezone.make_aware(datetime.combine(appointment_date, appointment_time))
+
+
+def reminder_for(appointment):
+    """
+    Unsaved reminder of an appointment, or None when the reminder time has
+    passed. It carries the start it was planned for, so the worker skips it
+    if the appointment moves.
+    """
+    start = starts_at(appointment.appointment_date, appointment.appointment_time)
+    due = start - timedelta(hours=settings.OUTBOX_REMINDER_HOURS)
+    if due <= timezone.now():
+        return None
+    return OutboxMessage(
+        kind='reminder', recipient='client', appointment_id=appointment.pk,
+        available_at=due, payload={'starts_at': start.isoformat()}
+    )
+
+
+def enqueue_booked(appointments):
+    """Booking messages and reminders of new appointments, in one INSERT"""
+    messages = []
+    for appointment in appointments:
+        messages += messages_for('booked', appointment.pk)
+        if appointment.status in Appointment.ACTIVE_STATUSES:
+            reminder = reminder_for(appointment)
+            if reminder is not None:
+                messages.append(reminder)
+    OutboxMessage.objects.bulk_create(messages)
+
+
+def enqueue_status_changes(changes):
+    """Messages of (appointment id, new status) changes, in one INSERT"""
+    OutboxMessage.objects.bulk_create([
+        message
+        for appointment_id, new_status in changes
+        if new_status in STATUS_MESSAGES
+        for message in messages_for(STATUS_MESSAGES[new_status], appointment_id)
+    ])
+
+
+def enqueue_rescheduled(appointment):
+    """New reminder of an appointment moved to another day or time"""
+    reminder = reminder_for(appointment)
+    if reminder is not None and appointment.status in Appointment.ACTIVE_STATUSES:
+        reminder.save()
+
+
+def compose(message, appointment):
+    """The email of a message, or the reason it is not sent"""
+    if message.kind == 'reminder' and (
+        appointment.status not in Appointment.ACTIVE_STATUSES
+        or message.payload.get('starts_at') != starts_at(
+            appointment.appointment_date, appointment.appointment_time
+        ).isoformat()
+    ):
+        return None, "Appointment cancelled or moved"
+
+    user = appointment.client if message.recipient == 'client' else appointment.barber
+    if not user.email:
+        return None, f"The {message.recipient} has no email address"
+
+    context = {
+        'client': appointment.client.get_full_name() or appointment.client.username,
+        'barber': appointment.barber.get_full_name() or appointment.barber.username,
+        'service': appointment.service.name,
+        'date': appointment.appointment_date.strftime('%d/%m/%Y'),
+        'time': appointment.appointment_time.strftime('%H:%M'),
+    }
+    subject, body = TEMPLATES[message.kind, message.recipient]
+    return EmailMessage(subject.format(**context), body.format(**context), to=[user.email]), None
+
+
+def retry_delay(attempts, base, limit):
+    """Exponential backoff with jitter, so failed batches do not retry in step"""
+    return min(base * 2 ** (attempts - 1), limit) * random.uniform(0.75, 1.25)
+
+
+def deliver(messages, max_attempts, retry_base, retry_limit):
+    """
+    Send a batch of messages over one mail connection and record the
+    outcome of each on it (not saved). Returns the number sent.
+    """
+    appointments = Appointment.objects.select_related(
+        'client', 'barber', 'service'
+    ).in_bulk({message.appointment_id for message in messages})
+    now = timezone.now()
+    sent = 0
+    mail = get_connection()
+    try:
+        mail.open()
+    except Exception as exc:
+        for message in messages:
+            failed(message, exc, now, max_attempts, retry_base, retry_limit)
+        return 0
+
+    try:
+        for message in messages:
+            appointment = appointments.get(message.appointment_id)
+            if appointment is None:
+                email, reason = None, "Appointment deleted"
+            else:
+                email, reason = compose(message, appointment)
+            if email is None:
+                message.status = 'skipped'
+                message.last_error = reason
+                continue
+
+            try:
+                mail.send_messages([email])
+            except Exception as exc:
+                failed(message, exc, now, max_attempts, retry_base, retry_limit)
+            else:
+                message.status = 'sent'
+                message.sent_at = timezone.now()
+                message.attempts += 1
+                sent += 1
+    finally:
+        mail.close()
+    return sent
+
+
+def failed(message, exc, now, max_attempts, retry_base, retry_limit):
+    message.attempts += 1
+    message.last_error = f"{type(exc).__name__}: {exc}"[:1000]
+    if message.attempts >= max_attempts:
+        message.status = 'failed'
+    else:
+        message.available_at = now + timedelta(
+            seconds=retry_delay(message.attempts, retry_base, retry_limit)
+        )
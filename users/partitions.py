@@ -0,0 +1,129 @@
+"""
+Monthly partitions of the appointment table.
+
+Since the users 0013 migration, users_appointment is partitioned by range
+of appointment_date: one users_appointment_YYYY_MM table per month, and a
+default partition for the dates no month partition covers yet. The ORM
+and the admin read the parent table as before; queries filtered on the
+date only scan the matching months.
+
+ensure_partitions creates the partitions of a date range ahead of time
+and gives the months found in the default partition their own table.
+archive_partitions detaches old months and attaches them, without
+copying, to users_appointment_archive, which the application never reads.
+Their rows stay counted in the rollup, so reports keep the history, and
+rebuild_rollup reads them along with the live ones. Only past months can
+be archived.
+"""
+import re
+from datetime import date
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Appointment
+
+
+ARCHIVE_TABLE = 'users_appointment_archive'
+
+DEFAULT_PARTITION = 'users_appointment_default'
+
+# users_appointment_2026_10 -> (2026, 10)
+PARTITION_MONTH = re.compile(r'_(\d{4})_(\d{2})$')
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(month, count):
+    year, index = divmod(month.month - 1 + count, 12)
+    return date(month.year + year, index + 1, 1)
+
+
+def partitions(parent=None):
+    """{first day of the month: partition name} of a partitioned table"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_inherits AS i
+            JOIN pg_class AS c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            """,
+            [parent or Appointment._meta.db_table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = {}
+    for name in names:
+        match = PARTITION_MONTH.search(name)
+        if match:
+            months[date(int(match[1]), int(match[2]), 1)] = name
+    return months
+
+
+def ensure_partitions(date_from, date_to):
+    """
+    Create the missing month partitions from ``date_from`` to ``date_to``
+    and for every month with rows in the default partition, whose rows
+    move to the new table. Returns the months created.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', appointment_date)::date FROM {DEFAULT_PARTITION}"
+        )
+        months = {row[0] for row in cursor.fetchall()}
+    month = month_start(date_from)
+    while month <= date_to:
+        months.add(month)
+        month = add_months(month, 1)
+
+    created = []
+    for month in sorted(months - partitions().keys()):
+        # One transaction per month: moving rows out of the default
+        # partition locks it until the partition is attached
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SELECT users_appointment_add_partition(%s)', [month])
+            if cursor.fetchone()[0]:
+                created.append(month)
+    return created
+
+
+def archive_partitions(before):
+    """
+    Move the month partitions ending on or before ``before`` to the
+    archive table. Their foreign keys and overlap constraint are dropped:
+    archived rows no longer hold back deleting a user or a service.
+    Returns the months archived.
+
+    ``before`` may not be after the first day of the current month: the
+    bookings of an archived month leave availability and the overlap
+    constraint, so archiving upcoming months would free booked slots.
+    """
+    if before > month_start(timezone.now().date()):
+        raise ValueError("Only months before the current one can be archived")
+    quote = connection.ops.quote_name
+    table = quote(Appointment._meta.db_table)
+    archived = []
+    for month, name in sorted(partitions().items()):
+        if add_months(month, 1) > before:
+            break
+        archive_name = f'{ARCHIVE_TABLE}_{month:%Y_%m}'
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {quote(name)}')
+            cursor.execute(
+                """
+                SELECT conname FROM pg_constraint
+                WHERE conrelid = %s::regclass AND contype IN ('f', 'x')
+                """,
+                [name]
+            )
+            for (constraint,) in cursor.fetchall():
+                cursor.execute(f'ALTER TABLE {quote(name)} DROP CONSTRAINT {quote(constraint)}')
+            cursor.execute(f'ALTER TABLE {quote(name)} RENAME TO {quote(archive_name)}')
+            cursor.execute(
+                f'ALTER TABLE {ARCHIVE_TABLE} ATTACH PARTITION {quote(archive_name)} '
+                'FOR VALUES FROM (%s) TO (%s)',
+                [month, add_months(month, 1)]
+            )
+        archived.append(month)
+    return archived
@@ -0,0 +1,159 @@
+"""
+Daily appointment rollup.
+
+AppointmentRollup rows hold, per (date, barber, service, status), the number
+of appointments, the booked minutes and the revenue. Signal handlers and bulk
+operations apply +1/-1 deltas with a single upsert; rebuild_rollup recomputes
+a date range from the appointment table and its archive (using the current
+service duration and price).
+
+Every row therefore holds count times the current duration and price of its
+service, which is what the -1 deltas subtract. When a service's duration or
+price changes, reprice_rollup restates its rows at the new values.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Appointment, AppointmentRollup, CustomUser, Service
+from .partitions import ARCHIVE_TABLE
+
+
+# Appointment fields that make up a rollup key, in key order
+ROLLUP_KEY_FIELDS = ('appointment_date', 'barber_id', 'service_id', 'status')
+
+
+def appointment_key(appointment):
+    """Rollup key (date, barber_id, service_id, status) of an appointment"""
+    return tuple(getattr(appointment, field) for field in ROLLUP_KEY_FIELDS)
+
+
+def apply_rollup_changes(changes, create=True):
+    """
+    Add (key, sign, duration, price) changes to the rollup in a single
+    upsert. Changes to the same key are summed first, and keys are written
+    in a fixed order so concurrent updates cannot deadlock.
+
+    With ``create=False`` only existing rows are updated, which is safe
+    while the barber or the service is being deleted.
+    """
+    totals = defaultdict(lambda: [0, 0, 0])
+    for key, sign, duration, price in changes:
+        total = totals[key]
+        total[0] += sign
+        total[1] += sign * duration
+        total[2] += sign * price
+
+    rows = [key + tuple(total) for key, total in sorted(totals.items()) if total[0]]
+    if not rows:
+        return
+
+    if not create:
+        for day, barber_id, service_id, status, count, minutes, revenue in rows:
+            AppointmentRollup.objects.filter(
+                date=day, barber_id=barber_id, service_id=service_id, status=status
+            ).update(
+                count=F('count') + count,
+                booked_minutes=F('booked_minutes') + minutes,
+                revenue=F('revenue') + revenue
+            )
+        return
+
+    table = connection.ops.quote_name(AppointmentRollup._meta.db_table)
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table}
+                (date, barber_id, service_id, status, count, booked_minutes, revenue)
+            VALUES {placeholders}
+            ON CONFLICT (date, barber_id, service_id, status) DO UPDATE SET
+                count = {table}.count + EXCLUDED.count,
+                booked_minutes = {table}.booked_minutes + EXCLUDED.booked_minutes,
+                revenue = {table}.revenue + EXCLUDED.revenue
+            """,
+            [value for row in rows for value in row]
+        )
+
+
+def appointment_sources():
+    """
+    FROM clause of every appointment: the live table and the archive, whose
+    months stay counted in the rollup (see users.partitions)
+    """
+    table = connection.ops.quote_name(Appointment._meta.db_table)
+    columns = ', '.join(ROLLUP_KEY_FIELDS)
+    return (
+        f'(SELECT {columns} FROM {table} '
+        f'UNION ALL SELECT {columns} FROM {ARCHIVE_TABLE})'
+    )
+
+
+def appointment_date_bounds():
+    """First and last appointment dates, archived appointments included"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT MIN(appointment_date), MAX(appointment_date) FROM {appointment_sources()} AS a'
+        )
+        return cursor.fetchone()
+
+
+def rebuild_rollup(date_from, date_to):
+    """
+    Recompute the rollup rows of a date range from the appointments,
+    archived ones included. Archived rows have no foreign keys: those of
+    a deleted barber or service are left out, like their rollup rows.
+
+    The rollup table is locked against concurrent incremental updates
+    while the range is replaced; those resume once the transaction
+    commits and apply on top of the rebuilt rows.
+    """
+    rollup_table = connection.ops.quote_name(AppointmentRollup._meta.db_table)
+    service_table = connection.ops.quote_name(Service._meta.db_table)
+    user_table = connection.ops.quote_name(CustomUser._meta.db_table)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {rollup_table} IN SHARE ROW EXCLUSIVE MODE')
+        cursor.execute(
+            f'DELETE FROM {rollup_table} WHERE date BETWEEN %s AND %s',
+            [date_from, date_to]
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {rollup_table}
+                (date, barber_id, service_id, status, count, booked_minutes, revenue)
+            SELECT a.appointment_date, a.barber_id, a.service_id, a.status,
+                   COUNT(*), SUM(s.duration), SUM(s.price)
+            FROM {appointment_sources()} AS a
+            JOIN {service_table} AS s ON s.id = a.service_id
+            JOIN {user_table} AS b ON b.id = a.barber_id
+            WHERE a.appointment_date BETWEEN %s AND %s
+            GROUP BY a.appointment_date, a.barber_id, a.service_id, a.status
+            """,
+            [date_from, date_to]
+        )
+        return cursor.rowcount
+
+
+def reprice_rollup(service):
+    """
+    Restate the booked minutes and revenue of a service's rollup rows at
+    its current duration and price, locking the rows in key order like
+    apply_rollup_changes so concurrent upserts cannot deadlock with it
+    """
+    table = connection.ops.quote_name(AppointmentRollup._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {table} AS r
+            SET booked_minutes = r.count * %s, revenue = r.count * %s
+            FROM (
+                SELECT id FROM {table} WHERE service_id = %s
+                ORDER BY date, barber_id, service_id, status
+                FOR UPDATE
+            ) AS locked
+            WHERE r.id = locked.id
+            """,
+            [service.duration, service.price, service.pk]
+        )
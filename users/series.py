@@ -0,0 +1,93 @@
+"""
+Recurring appointment series.
+
+All occurrences of a series are checked against the barber's weekly hours
+(already loaded with the profile) and against the existing bookings,
+which are loaded for the whole date range with a single query. The free
+occurrences are then inserted with one bulk INSERT.
+"""
+from datetime import timedelta
+
+from .availability import load_busy_intervals_for_range, to_minutes, working_hours
+from .bulk import create_appointments, set_status
+from .models import Appointment
+
+
+# Most occurrences a single series may create
+MAX_SERIES_OCCURRENCES = 52
+
+# Latest end date of a series, in days after its first occurrence
+MAX_SERIES_DAYS = 366
+
+FREQUENCY_DAYS = {'daily': 1, 'weekly': 7}
+
+
+def occurrence_dates(start_date, frequency, interval, end_date=None, count=None):
+    """Dates of a recurrence rule, up to ``end_date`` or ``count`` dates"""
+    step = timedelta(days=FREQUENCY_DAYS[frequency] * interval)
+    last_date = start_date + timedelta(days=MAX_SERIES_DAYS)
+    if end_date is not None:
+        last_date = min(last_date, end_date)
+    limit = min(count or MAX_SERIES_OCCURRENCES, MAX_SERIES_OCCURRENCES)
+
+    dates = []
+    day = start_date
+    while day <= last_date and len(dates) < limit:
+        dates.append(day)
+        day += step
+    return dates
+
+
+def check_occurrences(profile, service, start_time, dates):
+    """
+    Return {date: reason} for the dates on which the booking cannot be
+    made: 'not_working', 'outside_working_hours' or 'booked'
+    """
+    if not dates:
+        return {}
+    busy = load_busy_intervals_for_range([profile.user_id], dates[0], dates[-1])
+    start = to_minutes(start_time)
+    end = start + service.duration
+
+    conflicts = {}
+    for day in dates:
+        work_start, work_end = working_hours(profile, day)
+        if not work_start or not work_end:
+            conflicts[day] = 'not_working'
+        elif start < to_minutes(work_start) or end > to_minutes(work_end):
+            conflicts[day] = 'outside_working_hours'
+        elif any(
+            busy_start < end and start < busy_end
+            for busy_start, busy_end in busy.get((profile.user_id, day), [])
+        ):
+            conflicts[day] = 'booked'
+    return conflicts
+
+
+def create_series(series, dates, conflicts):
+    """Save the series and bulk insert its occurrences free of conflicts"""
+    series.save()
+    return create_appointments([
+        Appointment(
+            client=series.client,
+            barber=series.barber,
+            service=series.service,
+            appointment_date=day,
+            appointment_time=series.appointment_time,
+            notes=series.notes,
+            series=series,
+        )
+        for day in dates if day not in conflicts
+    ])
+
+
+def cancel_upcoming(series, since):
+    """Cancel the active occurrences of a series from a date on"""
+    return set_status(
+        Appointment.objects.filter(
+            series=series,
+            appointment_date__gte=since,
+            status__in=Appointment.ACTIVE_STATUSES
+        ),
+        'cancelled'
+    )
@@ -0,0 +1,136 @@
+"""
+Signal handlers keeping derived data in sync with appointments
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    Appointment, AvailabilityIndex, BarberProfile, CustomUser, Service
+)
+from .availability import (
+    refresh_availability_index, refresh_busy_intervals, refresh_busy_intervals_many,
+    refresh_working_hours
+)
+from .bulk import retime_appointments
+from .outbox import enqueue_booked, enqueue_rescheduled, enqueue_status_changes
+from .rollup import ROLLUP_KEY_FIELDS, appointment_key, apply_rollup_changes, reprice_rollup
+from .stats import invalidate_dashboard_stats
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, **kwargs):
+    """Refresh the availability index and the dashboard stats, queue notifications"""
+    refresh_availability_index(instance.barber_id, instance.appointment_date)
+    
+    # A rescheduled appointment also frees its previous slot
+    old_key = (
+        instance.loaded_value('barber_id'),
+        instance.loaded_value('appointment_date')
+    )
+    if not created and None not in old_key and old_key != (
+        instance.barber_id, instance.appointment_date
+    ):
+        refresh_availability_index(*old_key)
+    
+    invalidate_dashboard_stats(
+        instance.client_id, instance.barber_id,
+        instance.loaded_value('client_id'), old_key[0]
+    )
+    
+    update_rollup(instance, created)
+    queue_notifications(instance, created)
+    
+    instance.remember_values('client_id', 'appointment_time', *ROLLUP_KEY_FIELDS)
+
+
+def queue_notifications(instance, created):
+    """Outbox messages of a booking, a status change or a new date or time"""
+    if created:
+        enqueue_booked([instance])
+        return
+    
+    old_status = instance.loaded_value('status')
+    if old_status is not None and old_status != instance.status:
+        enqueue_status_changes([(instance.pk, instance.status)])
+    
+    old_start = (
+        instance.loaded_value('appointment_date'),
+        instance.loaded_value('appointment_time')
+    )
+    if None not in old_start and old_start != (
+        instance.appointment_date, instance.appointment_time
+    ):
+        enqueue_rescheduled(instance)
+
+
+def update_rollup(instance, created):
+    """Move the appointment's contribution to its new rollup key"""
+    service = instance.service
+    new_key = appointment_key(instance)
+    changes = [(new_key, 1, service.duration, service.price)]
+    
+    if not created:
+        old_key = tuple(instance.loaded_value(field) for field in ROLLUP_KEY_FIELDS)
+        if None in old_key or old_key == new_key:
+            return
+        if old_key[2] != service.pk:
+            service = Service.objects.get(pk=old_key[2])
+        changes.append((old_key, -1, service.duration, service.price))
+    
+    apply_rollup_changes(changes)
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    """Free the slot of a deleted appointment and refresh the stats"""
+    refresh_busy_intervals(instance.barber_id, instance.appointment_date)
+    invalidate_dashboard_stats(instance.client_id, instance.barber_id)
+    apply_rollup_changes([(
+        appointment_key(instance), -1,
+        instance.service.duration, instance.service.price
+    )], create=False)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_changed(sender, instance, **kwargs):
+    """User counts are part of the admin stats"""
+    invalidate_dashboard_stats()
+
+
+@receiver(post_save, sender=BarberProfile)
+def barber_profile_saved(sender, instance, **kwargs):
+    """Propagate changed working hours to the upcoming index rows"""
+    refresh_working_hours(instance, timezone.now().date())
+
+
+@receiver(post_delete, sender=BarberProfile)
+def barber_profile_deleted(sender, instance, **kwargs):
+    """A barber without profile has no working hours"""
+    AvailabilityIndex.objects.filter(
+        barber_id=instance.user_id,
+        date__gte=timezone.now().date()
+    ).update(work_start=None, work_end=None)
+
+
+@receiver(post_save, sender=Service)
+def service_saved(sender, instance, created, **kwargs):
+    """
+    A new duration changes the time ranges and busy intervals of the
+    upcoming bookings, and a new duration or price the rollup rows of the
+    service
+    """
+    duration_changed = instance.loaded_value('duration') != instance.duration
+    price_changed = instance.loaded_value('price') != instance.price
+    instance.remember_values('duration', 'price')
+    if created or not (duration_changed or price_changed):
+        return
+    
+    reprice_rollup(instance)
+    if not duration_changed:
+        return
+    
+    # Overlaps created by the longer bookings raise the exclusion
+    # constraint's IntegrityError, which rolls the whole change back
+    refresh_busy_intervals_many(retime_appointments(instance))
@@ -0,0 +1,109 @@
+"""
+Dashboard statistics.
+
+Each role's figures come from a single conditional aggregate per table
+(the admin's appointment totals from the daily rollup) and are cached per
+user (shared by all admins) for a short time. Changes to an appointment
+drop the cached stats of its client, its barber and the admins.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from barbershop import metrics
+from .models import CustomUser, Appointment, AppointmentRollup
+
+
+ADMIN_CACHE_KEY = 'dashboard_stats:admin'
+
+
+def user_cache_key(user_id):
+    return f'dashboard_stats:{user_id}'
+
+
+def stats_cache_key(user):
+    return ADMIN_CACHE_KEY if user.user_type == 'admin' else user_cache_key(user.pk)
+
+
+def dashboard_queries(user):
+    """(queryset, aggregates) pairs that make up the user's statistics"""
+    today = timezone.now().date()
+    
+    if user.user_type == 'admin':
+        return [
+            (CustomUser.objects.all(), {
+                'total_users': Count('id'),
+                'total_clients': Count('id', filter=Q(user_type='client')),
+                'total_barbers': Count('id', filter=Q(user_type='barber')),
+            }),
+            (AppointmentRollup.objects.all(), {
+                'total_appointments': Sum('count'),
+                'pending_appointments': Sum('count', filter=Q(status='scheduled')),
+            }),
+        ]
+    elif user.user_type == 'barber':
+        return [(Appointment.objects.filter(barber=user), {
+            'total_appointments': Count('id'),
+            'today_appointments': Count('id', filter=Q(appointment_date=today)),
+            'pending_appointments': Count('id', filter=Q(status='scheduled')),
+            'completed_appointments': Count('id', filter=Q(status='completed')),
+        })]
+    else:  # client
+        return [(Appointment.objects.filter(client=user), {
+            'total_appointments': Count('id'),
+            'upcoming_appointments': Count('id', filter=Q(
+                appointment_date__gte=today,
+                status__in=['scheduled', 'confirmed']
+            )),
+            'past_appointments': Count('id', filter=Q(appointment_date__lt=today)),
+        })]
+
+
+def compute_dashboard_stats(user):
+    """Statistics for the user's dashboard, straight from the database"""
+    stats = {}
+    for queryset, aggregates in dashboard_queries(user):
+        stats.update(queryset.aggregate(**aggregates))
+    # Sums over an empty rollup are None
+    return {name: value or 0 for name, value in stats.items()}
+
+
+async def acompute_dashboard_stats(user):
+    """Async version of compute_dashboard_stats"""
+    stats = {}
+    for queryset, aggregates in dashboard_queries(user):
+        stats.update(await queryset.aaggregate(**aggregates))
+    return {name: value or 0 for name, value in stats.items()}
+
+
+def get_dashboard_stats(user):
+    """Cached statistics for the user's dashboard"""
+    key = stats_cache_key(user)
+    stats = cache.get(key)
+    metrics.cache_lookup('dashboard_stats', stats is not None)
+    if stats is None:
+        stats = compute_dashboard_stats(user)
+        cache.set(key, stats, settings.DASHBOARD_STATS_CACHE_TTL)
+    return stats
+
+
+async def aget_dashboard_stats(user):
+    """Async version of get_dashboard_stats"""
+    key = stats_cache_key(user)
+    stats = await cache.aget(key)
+    metrics.cache_lookup('dashboard_stats', stats is not None)
+    if stats is None:
+        stats = await acompute_dashboard_stats(user)
+        await cache.aset(key, stats, settings.DASHBOARD_STATS_CACHE_TTL)
+    return stats
+
+
+def invalidate_dashboard_stats(*user_ids):
+    """
+    Drop the cached stats of the given users and of the admins once the
+    current transaction commits, so no reader caches uncommitted state
+    """
+    keys = [ADMIN_CACHE_KEY] + [user_cache_key(pk) for pk in user_ids if pk]
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,309 @@
+"""
+The slot engine, recurring series, and the database-level guarantees of
+the appointments:
+the overlap constraint under concurrent bookings and after a service's
+duration changes, and the rollup of archived months.
+
+The database tests run in real transactions (TransactionTestCase), one
+connection per thread, so the exclusion constraint is what arbitrates.
+"""
+import threading
+from collections import Counter
+from datetime import date, time, timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .availability import WEEKDAY_FIELDS, compute_slots
+from .models import (
+    Appointment, AppointmentRollup, AvailabilityIndex, BarberProfile, CustomUser, Service
+)
+from .partitions import ARCHIVE_TABLE, archive_partitions, ensure_partitions
+from .rollup import rebuild_rollup
+from .series import MAX_SERIES_OCCURRENCES, check_occurrences, occurrence_dates
+
+
+class SlotTests(SimpleTestCase):
+
+    def slots(self, start, end, busy, duration=30):
+        return [
+            (slot['time'], slot['available'])
+            for slot in compute_slots(start, end, busy, duration=duration)
+        ]
+
+    def test_free_day(self):
+        self.assertEqual(self.slots(time(9), time(10, 30), []), [
+            ('09:00', True), ('09:30', True), ('10:00', True),
+        ])
+
+    def test_busy_at_the_day_boundaries(self):
+        # 8:30-9:15 started before opening, 10:00-10:45 runs past closing
+        self.assertEqual(self.slots(time(9), time(10, 30), [[510, 555], [600, 645]]), [
+            ('09:00', False), ('09:30', True), ('10:00', False),
+        ])
+
+    def test_busy_interval_ending_at_slot_start(self):
+        self.assertEqual(self.slots(time(9), time(10), [[540, 570]]), [
+            ('09:00', False), ('09:30', True),
+        ])
+
+    def test_service_longer_than_the_remaining_time(self):
+        self.assertEqual(self.slots(time(9), time(10), [], duration=45), [
+            ('09:00', True), ('09:30', False),
+        ])
+        self.assertEqual(self.slots(time(9), time(10), [], duration=90), [
+            ('09:00', False), ('09:30', False),
+        ])
+
+    def test_empty_working_window(self):
+        self.assertEqual(self.slots(time(9), time(9), []), [])
+
+
+class AvailabilityEndpointTests(TestCase):
+
+    def setUp(self):
+        # A Monday, the only working day
+        self.day = timezone.now().date() + timedelta(days=7 - timezone.now().weekday())
+        self.barber = CustomUser.objects.create_user('barber', password=None, user_type='barber')
+        self.profile = BarberProfile.objects.create(
+            user=self.barber, is_approved=True, monday_start=time(9), monday_end=time(11)
+        )
+        self.service = Service.objects.create(name='Haircut', duration=45, price=10)
+        client = CustomUser.objects.create_user('client', password=None)
+        Appointment.objects.create(
+            client=client, barber=self.barber, appointment_date=self.day, appointment_time=time(10),
+            service=Service.objects.create(name='Beard', duration=30, price=5)
+        )
+        self.api = APIClient()
+
+    def get(self, day, **params):
+        response = self.api.get(
+            f'/api/barbers/{self.profile.id}/availability/', {'date': day.isoformat(), **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_slots_of_a_service(self):
+        data = self.get(self.day, service_id=self.service.id)
+        self.assertEqual(data['service_duration'], 45)
+        self.assertEqual(
+            [(slot['time'], slot['available']) for slot in data['available_slots']],
+            [('09:00', True), ('09:30', False), ('10:00', False), ('10:30', False)]
+        )
+
+    def test_default_slots(self):
+        data = self.get(self.day)
+        self.assertEqual(
+            [slot['available'] for slot in data['available_slots']], [True, True, False, True]
+        )
+
+    def test_day_off(self):
+        data = self.get(self.day + timedelta(days=1), service_id=self.service.id)
+        self.assertEqual(data['available'], False)
+
+
+class OccurrenceDateTests(SimpleTestCase):
+
+    def test_weekly_across_a_month(self):
+        self.assertEqual(occurrence_dates(date(2026, 1, 26), 'weekly', 1, count=3), [
+            date(2026, 1, 26), date(2026, 2, 2), date(2026, 2, 9),
+        ])
+
+    def test_interval_and_end_date(self):
+        self.assertEqual(
+            occurrence_dates(date(2026, 1, 30), 'daily', 2, end_date=date(2026, 2, 4)),
+            [date(2026, 1, 30), date(2026, 2, 1), date(2026, 2, 3)]
+        )
+
+    def test_occurrence_limit(self):
+        dates = occurrence_dates(date(2026, 1, 1), 'daily', 1, count=MAX_SERIES_OCCURRENCES + 10)
+        self.assertEqual(len(dates), MAX_SERIES_OCCURRENCES)
+        dates = occurrence_dates(date(2026, 1, 1), 'daily', 1, end_date=date(2027, 1, 1))
+        self.assertEqual(len(dates), MAX_SERIES_OCCURRENCES)
+
+
+class SeriesBookingTests(TestCase):
+
+    def setUp(self):
+        # The last Monday of next month: weekly series cross into the month after
+        today = timezone.now().date()
+        self.start = date(today.year + today.month // 12, today.month % 12 + 1, 28)
+        self.start -= timedelta(days=self.start.weekday())
+        self.barber = CustomUser.objects.create_user('barber', password=None, user_type='barber')
+        self.profile = BarberProfile.objects.create(
+            user=self.barber, is_approved=True, monday_start=time(9), monday_end=time(18)
+        )
+        self.service = Service.objects.create(name='Haircut', duration=45, price=10)
+        self.client_user = CustomUser.objects.create_user('client', password=None)
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+
+    def book_series(self, **data):
+        return self.api.post('/api/appointments/series/', {
+            'barber_id': self.barber.id, 'service_id': self.service.id, 'frequency': 'weekly',
+            'start_date': self.start.isoformat(), 'appointment_time': '10:00', 'count': 3, **data
+        }, format='json')
+
+    def test_weekly_series_across_months(self):
+        response = self.book_series()
+        self.assertEqual(response.status_code, 201)
+        dates = [self.start + timedelta(weeks=week) for week in range(3)]
+        self.assertNotEqual(dates[0].month, dates[-1].month)
+        self.assertEqual(
+            sorted(Appointment.objects.values_list('appointment_date', flat=True)), dates
+        )
+
+    def test_conflict_in_the_middle_books_nothing(self):
+        middle = self.start + timedelta(weeks=1)
+        Appointment.objects.create(
+            client=self.client_user, barber=self.barber, service=self.service,
+            appointment_date=middle, appointment_time=time(10, 30)
+        )
+        response = self.book_series()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            [occurrence['conflict'] for occurrence in response.data['occurrences']],
+            [None, 'booked', None]
+        )
+        self.assertEqual(Appointment.objects.count(), 1)
+        self.assertFalse(self.client_user.client_series.exists())
+
+    def test_conflict_reasons(self):
+        dates = [self.start, self.start + timedelta(days=1)]
+        self.assertEqual(check_occurrences(self.profile, self.service, time(17, 30), dates), {
+            dates[0]: 'outside_working_hours', dates[1]: 'not_working',
+        })
+
+
+class AppointmentOverlapTests(TransactionTestCase):
+
+    def setUp(self):
+        self.day = timezone.now().date() + timedelta(days=1)
+        self.barber = CustomUser.objects.create_user('barber', password=None, user_type='barber')
+        start_field, end_field = WEEKDAY_FIELDS[self.day.weekday()]
+        BarberProfile.objects.create(
+            user=self.barber, is_approved=True,
+            **{start_field: time(9), end_field: time(18)}
+        )
+        self.service = Service.objects.create(name='Haircut', duration=45, price=10)
+        self.client_user = CustomUser.objects.create_user('client', password=None)
+
+    def book(self, start, service=None):
+        return Appointment.objects.create(
+            client=self.client_user, barber=self.barber, service=service or self.service,
+            appointment_date=self.day, appointment_time=start
+        )
+
+    def test_concurrent_bookings_of_one_slot(self):
+        threads = 10
+        users = [
+            CustomUser.objects.create_user(f'client-{n}', password=None)
+            for n in range(threads)
+        ]
+        barrier = threading.Barrier(threads)
+        results = []
+
+        def post(user, minute):
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(user)
+            try:
+                barrier.wait()
+                response = client.post('/api/appointments/', {
+                    'barber_id': self.barber.id,
+                    'service_id': self.service.id,
+                    'appointment_date': self.day.isoformat(),
+                    'appointment_time': f'10:{minute:02d}',
+                }, format='json')
+                results.append(response.status_code)
+            finally:
+                connection.close()
+
+        # Different but overlapping start times
+        workers = [
+            threading.Thread(target=post, args=(user, 3 * n))
+            for n, user in enumerate(users)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(Counter(results), {201: 1, 409: threads - 1})
+        self.assertEqual(Appointment.objects.filter(barber=self.barber).count(), 1)
+
+    def test_longer_duration_retimes_upcoming_appointments(self):
+        appointment = self.book(time(10))
+
+        self.service.duration = 60
+        self.service.save()
+
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.time_range.upper - appointment.time_range.lower, timedelta(minutes=60))
+        busy = AvailabilityIndex.objects.get(barber=self.barber, date=self.day).busy
+        self.assertEqual(busy, [[600, 660]])
+        # The longer booking now holds the slot it covers
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.book(time(10, 50), Service.objects.create(name='Beard', duration=15, price=5))
+
+    def test_longer_duration_overlapping_bookings_is_refused(self):
+        first = self.book(time(10))
+        self.book(time(10, 45), Service.objects.create(name='Beard', duration=15, price=5))
+
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(CustomUser.objects.create_user('admin', password=None, user_type='admin'))
+        response = client.patch(f'/api/services/{self.service.id}/', {'duration': 60}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(first.id), str(response.data['duration']))
+
+        # Without the validation, the overlap constraint rolls the change back
+        self.service.duration = 60
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.service.save()
+        self.service.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual(self.service.duration, 45)
+        self.assertEqual(first.time_range.upper - first.time_range.lower, timedelta(minutes=45))
+
+
+class ArchivedRollupTests(TransactionTestCase):
+
+    def setUp(self):
+        self.barber = CustomUser.objects.create_user('barber', password=None, user_type='barber')
+        client = CustomUser.objects.create_user('client', password=None)
+        service = Service.objects.create(name='Haircut', duration=45, price=10)
+        self.day = date(2001, 1, 15)
+        Appointment.objects.create(
+            client=client, barber=self.barber, service=service,
+            appointment_date=self.day, appointment_time=time(10), status='completed'
+        )
+        ensure_partitions(self.day, self.day)
+        self.assertEqual(archive_partitions(date(2001, 2, 1)), [date(2001, 1, 1)])
+        self.addCleanup(self.drop_archive, f'{ARCHIVE_TABLE}_2001_01')
+
+    def drop_archive(self, name):
+        # TransactionTestCase only flushes the tables of the models
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {name}')
+
+    def test_rebuild_keeps_archived_months(self):
+        self.assertFalse(Appointment.objects.filter(appointment_date=self.day).exists())
+
+        rebuild_rollup(date(2001, 1, 1), date(2001, 1, 31))
+
+        row = AppointmentRollup.objects.get(date=self.day)
+        self.assertEqual((row.count, row.booked_minutes, row.revenue), (1, 45, 10))
+
+    def test_rebuild_skips_deleted_barbers(self):
+        self.barber.delete()
+
+        rebuild_rollup(date(2001, 1, 1), date(2001, 1, 31))
+
+        self.assertFalse(AppointmentRollup.objects.exists())
+
+    def test_upcoming_months_are_not_archived(self):
+        next_month = date.today().replace(day=1) + timedelta(days=31)
+        with self.assertRaises(ValueError):
+            archive_partitions(next_month)
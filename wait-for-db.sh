@@ -4,7 +4,7 @@ set -e
 echo "Waiting for database to be ready..."
 
 # Wait for database to be ready
-until nc -z db 5432; do
+until nc -z "${DB_HOST:-db}" "${DB_PORT:-5432}"; do
   echo "Database is unavailable - sleeping"
   sleep 1
 done
@@ -12,10 +12,19 @@ done
 echo "Database is up - continuing..."
 
 # Run migrations
-python manage.py makemigrations
+if [ "${SERVER_MODE:-development}" != "production" ]; then
+  python manage.py makemigrations
+fi
 python manage.py migrate
+# Only does something with CACHE_BACKEND set to the database cache
+python manage.py createcachetable
 python manage.py collectstatic --noinput
 
-# Start server
-python manage.py runserver 0.0.0.0:8000
-
+# Start server; exec so the server receives the container's signals
+# (SIGHUP reloads the gunicorn workers gracefully)
+if [ "${SERVER_MODE:-development}" = "production" ]; then
+  # Settings in gunicorn.conf.py
+  exec gunicorn
+else
+  exec python manage.py runserver 0.0.0.0:8000
+fi